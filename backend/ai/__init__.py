@@ -8,16 +8,24 @@ from .llm_client import (
     CadQueryLLMClient, 
     SchemdrawLLMClient,
     ErrorAnalysisLLMClient,
+    get_openai_client,
+    llm_metrics,
     clean_code
 )
 from .error_analyzer import analyze_errors_with_ai, generate_friendly_error_message
+from .completion_cache import CompletionCache, completion_cache, make_completion_key
 
 __all__ = [
     'LLMClient',
     'CadQueryLLMClient',
     'SchemdrawLLMClient', 
     'ErrorAnalysisLLMClient',
+    'get_openai_client',
+    'llm_metrics',
     'clean_code',
     'analyze_errors_with_ai',
-    'generate_friendly_error_message'
+    'generate_friendly_error_message',
+    'CompletionCache',
+    'completion_cache',
+    'make_completion_key'
 ] 
\ No newline at end of file
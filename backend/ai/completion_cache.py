@@ -0,0 +1,160 @@
+"""
+大模型补全结果缓存
+以"模型 + 本轮需求 + 规范化消息列表 + 错误提示"的哈希为键，将执行成功的清理后代码持久化到SQLite，
+相同请求再次出现时直接复用代码，跳过大模型调用；按最近使用时间(LRU)和TTL淘汰
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from app.config import CacheConfig
+
+def normalize_messages(messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """规范化消息列表：统一换行符并去除每行首尾空白"""
+    normalized = []
+    for message in messages:
+        content = (message.get("content") or "").replace("\r\n", "\n").replace("\r", "\n")
+        content = "\n".join(line.strip() for line in content.split("\n")).strip()
+        normalized.append({"role": message.get("role", ""), "content": content})
+    return normalized
+
+def make_completion_key(model: str, query: str, messages: List[Dict[str, str]],
+                        error_message: Optional[str] = None) -> str:
+    """
+    计算补全请求的缓存键
+
+    本轮的用户需求单独计入键中，不依赖调用方是否已将其追加到消息列表：
+    后续轮次中历史相同而需求不同的请求不会命中同一条缓存
+    """
+    payload = {
+        "model": model,
+        "query": normalize_messages([{"content": query}])[0]["content"],
+        "messages": normalize_messages(messages),
+        "error": (error_message or "").strip(),
+    }
+    return hashlib.sha256(json.dumps(payload, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+class CompletionCache:
+    """基于SQLite的持久化补全缓存（线程安全）"""
+
+    def __init__(self, db_path: str, max_entries: int, ttl: int):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        """首次使用时打开数据库并建表"""
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS completions (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    code TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used_at REAL NOT NULL,
+                    hit_count INTEGER NOT NULL DEFAULT 0
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_completions_last_used ON completions (last_used_at)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str) -> Optional[str]:
+        """获取缓存的代码，过期条目视为未命中并删除"""
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT code, created_at FROM completions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            code, created_at = row
+            if self.ttl and now - created_at > self.ttl:
+                conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                conn.commit()
+                self.misses += 1
+                self.evictions += 1
+                return None
+
+            conn.execute(
+                "UPDATE completions SET last_used_at = ?, hit_count = hit_count + 1 WHERE key = ?",
+                (now, key)
+            )
+            conn.commit()
+            self.hits += 1
+            return code
+
+    def put(self, key: str, model: str, code: str) -> None:
+        """写入代码，超出条目上限时淘汰最久未使用的条目"""
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                """
+                INSERT INTO completions (key, model, code, created_at, last_used_at) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET code = excluded.code, created_at = excluded.created_at,
+                                               last_used_at = excluded.last_used_at
+                """,
+                (key, model, code, now, now)
+            )
+            if self.ttl:
+                cursor = conn.execute("DELETE FROM completions WHERE created_at < ?", (now - self.ttl,))
+                self.evictions += cursor.rowcount
+            cursor = conn.execute(
+                """
+                DELETE FROM completions WHERE key IN (
+                    SELECT key FROM completions ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,)
+            )
+            self.evictions += cursor.rowcount
+            conn.commit()
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM completions")
+            conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息（命中计数为本进程启动以来的值）"""
+        with self._lock:
+            entries = 0
+            if self._conn is not None or os.path.exists(self.db_path):
+                entries = self._connection().execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+# 进程内共享的缓存实例
+completion_cache = CompletionCache(
+    db_path=CacheConfig.COMPLETION_CACHE_PATH,
+    max_entries=CacheConfig.COMPLETION_CACHE_MAX_ENTRIES,
+    ttl=CacheConfig.COMPLETION_CACHE_TTL,
+)
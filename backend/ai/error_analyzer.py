@@ -3,19 +3,19 @@ AI错误分析器
 使用DeepSeek-V3分析错误并生成用户友好的错误信息
 """
 
-import os
-import openai
 from dotenv import load_dotenv
+from functools import lru_cache
 from typing import List, Dict, Any
 import traceback
 
+from .llm_client import ErrorAnalysisLLMClient
+
 load_dotenv()
 
-# 错误分析客户端（使用DeepSeek-V3）
-error_analysis_client = openai.OpenAI(
-    api_key=os.environ["SILICONFLOW_API_KEY"],
-    base_url="https://api.siliconflow.cn/v1",
-)
+@lru_cache(maxsize=None)
+def get_error_analysis_client():
+    """获取错误分析客户端（使用DeepSeek-V3，所有客户端共享连接池与限流）"""
+    return ErrorAnalysisLLMClient()
 
 def analyze_errors_with_ai(user_query: str, error_attempts: List[Dict[str, Any]]) -> str:
     """
@@ -68,17 +68,14 @@ def analyze_errors_with_ai(user_query: str, error_attempts: List[Dict[str, Any]]
         print(f"Sending error analysis request to DeepSeek-V3...")
         print(f"Error attempts count: {len(error_attempts)}")
         
-        response = error_analysis_client.chat.completions.create(
-            model="deepseek-ai/DeepSeek-V3",
+        ai_analysis = get_error_analysis_client().chat_completion(
             messages=[
                 {"role": "system", "content": "你是一个专业的CAD软件技术支持专家，擅长将技术问题转化为用户容易理解的解决方案。"},
                 {"role": "user", "content": error_analysis_prompt}
             ],
             max_tokens=800,
             temperature=0.3,
-        )
-        
-        ai_analysis = response.choices[0].message.content.strip()
+        ).strip()
         print(f"AI analysis completed successfully: {ai_analysis[:100]}...")
         return ai_analysis
         
@@ -102,7 +99,9 @@ def generate_friendly_error_message(user_query: str, error_attempts: List[Dict[s
     base_message = f"抱歉，尝试了{error_count}次都无法完成您的请求 \"{user_query}\"。"
     
     # 根据错误类型提供建议
-    if 'TessellationError' in common_error_types:
+    if 'ExecutionTimeout' in common_error_types or 'WorkerCrashed' in common_error_types:
+        suggestion = "生成的模型过于复杂，执行超时或占用资源过多，建议您简化模型结构或减少细节特征。"
+    elif 'TessellationError' in common_error_types:
         suggestion = "这可能是因为生成的是2D内容，建议您尝试切换到'2D渲染'模式，或者在描述中明确指出需要3D立体模型。"
     elif 'SyntaxError' in common_error_types:
         suggestion = "代码语法有问题，建议您简化描述，使用更基础的几何形状术语。"
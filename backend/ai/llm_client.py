@@ -1,70 +1,249 @@
 """
 LLM客户端封装
 负责与大语言模型的通信
+
+所有模型调用共享一个带keep-alive的HTTP连接池，并统一经过：
+全局与按模型的并发限制、令牌桶速率限制、429/5xx指数退避重试、请求超时，
+每次调用的延迟与token用量记录在 llm_metrics 中
 """
 
 import os
-import openai
+import random
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional
+
 from dotenv import load_dotenv
-from typing import List, Dict, Any
+
+from app.config import AIConfig
+from app.startup import lazy_import
 
 load_dotenv()
 
+class TokenBucket:
+    """令牌桶速率限制器（线程安全）"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """获取一个令牌，令牌不足时阻塞等待"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+class LLMMetrics:
+    """按模型汇总的调用延迟与token用量"""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._models: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, model: str, latency: float, success: bool, retries: int = 0,
+               prompt_tokens: int = 0, completion_tokens: int = 0):
+        """记录一次调用"""
+        with self._lock:
+            entry = self._models.setdefault(model, {
+                "calls": 0,
+                "errors": 0,
+                "retries": 0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "latencies": deque(maxlen=self.window),
+            })
+            entry["calls"] += 1
+            entry["errors"] += 0 if success else 1
+            entry["retries"] += retries
+            entry["prompt_tokens"] += prompt_tokens
+            entry["completion_tokens"] += completion_tokens
+            entry["latencies"].append(latency)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取各模型的统计信息（延迟分位数基于最近的调用，单位: 秒）"""
+        with self._lock:
+            result = {}
+            for model, entry in self._models.items():
+                latencies = sorted(entry["latencies"])
+                result[model] = {
+                    key: value for key, value in entry.items() if key != "latencies"
+                }
+                result[model].update({
+                    "latency_avg": sum(latencies) / len(latencies) if latencies else 0.0,
+                    "latency_p50": latencies[len(latencies) // 2] if latencies else 0.0,
+                    "latency_p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else 0.0,
+                })
+            return result
+
+# 进程内共享的限流器与指标
+llm_metrics = LLMMetrics()
+_rate_limiter = TokenBucket(AIConfig.RATE_LIMIT_PER_SECOND, AIConfig.RATE_LIMIT_BURST)
+_global_semaphore = threading.BoundedSemaphore(AIConfig.MAX_CONCURRENT_REQUESTS)
+_model_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+_model_semaphores_lock = threading.Lock()
+
+def _get_model_semaphore(model: str) -> threading.BoundedSemaphore:
+    """获取模型的并发限制信号量"""
+    with _model_semaphores_lock:
+        if model not in _model_semaphores:
+            limit = AIConfig.MODEL_CONCURRENCY.get(model, AIConfig.DEFAULT_MODEL_CONCURRENCY)
+            _model_semaphores[model] = threading.BoundedSemaphore(limit)
+        return _model_semaphores[model]
+
+@lru_cache(maxsize=None)
+def get_openai_client():
+    """获取共享的OpenAI兼容客户端（首次使用时创建，所有模型共用一个HTTP连接池）"""
+    openai = lazy_import("openai")
+    httpx = lazy_import("httpx")
+    http_client = openai.DefaultHttpxClient(
+        limits=httpx.Limits(
+            max_connections=AIConfig.MAX_CONNECTIONS,
+            max_keepalive_connections=AIConfig.MAX_KEEPALIVE_CONNECTIONS,
+        ),
+        timeout=httpx.Timeout(AIConfig.REQUEST_TIMEOUT, connect=AIConfig.CONNECT_TIMEOUT),
+    )
+    return openai.OpenAI(
+        api_key=os.environ["SILICONFLOW_API_KEY"],
+        base_url=AIConfig.SILICONFLOW_BASE_URL,
+        http_client=http_client,
+        # 重试由本模块统一处理
+        max_retries=0,
+    )
+
+def _retry_delay(error: Exception, attempt: int) -> Optional[float]:
+    """返回可重试错误的等待时间（秒），不可重试时返回None"""
+    openai = lazy_import("openai")
+    if isinstance(error, openai.APIStatusError):
+        if error.status_code != 429 and error.status_code < 500:
+            return None
+        retry_after = error.response.headers.get("retry-after") if error.response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), AIConfig.BACKOFF_MAX)
+            except ValueError:
+                pass
+    elif not isinstance(error, openai.APIConnectionError):
+        # APITimeoutError 是 APIConnectionError 的子类
+        return None
+    delay = min(AIConfig.BACKOFF_BASE * (2 ** attempt), AIConfig.BACKOFF_MAX)
+    return delay * random.uniform(0.5, 1.0)
+
+def _usage_tokens(usage) -> Dict[str, int]:
+    """从响应的usage中提取token数"""
+    if not usage:
+        return {"prompt_tokens": 0, "completion_tokens": 0}
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+    }
+
 class LLMClient:
-    """LLM客户端基类"""
-    
-    def __init__(self, api_key: str = None, base_url: str = None):
-        self.api_key = api_key or os.environ["SILICONFLOW_API_KEY"]
-        self.base_url = base_url or "https://api.siliconflow.cn/v1"
-        self.client = openai.OpenAI(
-            api_key=self.api_key,
-            base_url=self.base_url
-        )
-    
-    def chat_completion(self, model: str, messages: List[Dict[str, str]], **kwargs) -> str:
-        """通用的聊天完成方法"""
-        response = self.client.chat.completions.create(
-            model=model,
-            messages=messages,
-            **kwargs
-        )
+    """LLM客户端基类（绑定一个模型）"""
+
+    def __init__(self, model: str):
+        self.model = model
+
+    def create(self, messages: List[Dict[str, str]], stream: bool = False, **kwargs):
+        """
+        发送聊天补全请求
+
+        受全局/模型并发限制和速率限制，429、5xx和连接错误按指数退避重试。
+        stream=True 时返回分块迭代器，并发名额在迭代结束或关闭后释放
+
+        Returns:
+            非流式时为完整响应对象，流式时为分块迭代器
+        """
+        model_semaphore = _get_model_semaphore(self.model)
+        _global_semaphore.acquire()
+        model_semaphore.acquire()
+
+        def release():
+            model_semaphore.release()
+            _global_semaphore.release()
+
+        started_at = time.perf_counter()
+        attempt = 0
+        while True:
+            _rate_limiter.acquire()
+            try:
+                response = get_openai_client().chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    stream=stream,
+                    **kwargs
+                )
+                break
+            except Exception as e:
+                delay = _retry_delay(e, attempt) if attempt < AIConfig.BACKOFF_RETRIES else None
+                if delay is None:
+                    release()
+                    llm_metrics.record(self.model, time.perf_counter() - started_at, False, attempt)
+                    raise
+                print(f"LLM request to {self.model} failed ({type(e).__name__}), retrying in {delay:.1f}s")
+                attempt += 1
+                time.sleep(delay)
+
+        if stream:
+            return self._iterate_stream(response, release, started_at, attempt)
+
+        release()
+        llm_metrics.record(self.model, time.perf_counter() - started_at, True, attempt,
+                           **_usage_tokens(getattr(response, "usage", None)))
+        return response
+
+    def _iterate_stream(self, response, release, started_at: float, retries: int) -> Iterator[Any]:
+        """迭代流式响应，结束（或被关闭）时释放并发名额并记录指标"""
+        usage = None
+        success = False
+        try:
+            for chunk in response:
+                if getattr(chunk, "usage", None):
+                    usage = chunk.usage
+                yield chunk
+            success = True
+        finally:
+            close = getattr(response, "close", None)
+            if close:
+                close()
+            release()
+            llm_metrics.record(self.model, time.perf_counter() - started_at, success, retries,
+                               **_usage_tokens(usage))
+
+    def chat_completion(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        """通用的聊天完成方法，返回回复内容"""
+        response = self.create(messages, **kwargs)
         return response.choices[0].message.content
 
 class CadQueryLLMClient(LLMClient):
     """CadQuery代码生成专用客户端"""
-    
+
     def __init__(self):
-        super().__init__()
-        self.model = "Qwen/Qwen2.5-72B-Instruct-128K"
-    
-    def generate_code(self, user_msg: str, conversation_history: List[Dict[str, str]] = None, error_message: str = None) -> str:
-        """生成CadQuery代码"""
-        # 这里先保持原有逻辑，稍后从codex.py复制具体实现
-        pass
+        super().__init__(AIConfig.CODE_GENERATION_MODEL)
 
 class SchemdrawLLMClient(LLMClient):
     """Schemdraw代码生成专用客户端"""
-    
+
     def __init__(self):
-        super().__init__()
-        self.model = "Qwen/Qwen2.5-72B-Instruct-128K"
-    
-    def generate_code(self, user_msg: str, conversation_history: List[Dict[str, str]] = None, error_message: str = None) -> str:
-        """生成Schemdraw代码"""
-        # 这里先保持原有逻辑，稍后从schemdraw_codegen.py复制具体实现
-        pass
+        super().__init__(AIConfig.CODE_GENERATION_MODEL)
 
 class ErrorAnalysisLLMClient(LLMClient):
     """错误分析专用客户端"""
-    
+
     def __init__(self):
-        super().__init__()
-        self.model = "deepseek-ai/DeepSeek-V3"
-    
-    def analyze_errors(self, user_query: str, error_attempts: List[Dict[str, Any]]) -> str:
-        """分析错误并生成友好的错误消息"""
-        # 这里先保持原有逻辑，稍后从codex.py复制具体实现
-        pass
+        super().__init__(AIConfig.ERROR_ANALYSIS_MODEL)
 
 # 工具函数
 def clean_code(code_text: str) -> str:
@@ -74,4 +253,4 @@ def clean_code(code_text: str) -> str:
     for line in lines:
         if line.strip() and not line.startswith('```') and not line.endswith('```'):
             clean_lines.append(line)
-    return '\n'.join(clean_lines) 
\ No newline at end of file
+    return '\n'.join(clean_lines)
@@ -5,8 +5,10 @@ API路由模块
 
 from .cad_routes import cad_bp
 from .conversation_routes import conversation_bp
+from .job_routes import job_bp
 
 __all__ = [
     'cad_bp',
-    'conversation_bp'
+    'conversation_bp',
+    'job_bp'
 ] 
\ No newline at end of file
@@ -3,11 +3,29 @@ CAD相关的API路由
 处理CAD生成、文件下载等请求
 """
 import os
+import queue
+import threading
 
-from flask import Blueprint, request, jsonify, send_file, current_app
+from flask import Blueprint, Response, request, jsonify, send_file
 from flask_cors import cross_origin
-from services import CADService
-from utils import validate_api_request_data, get_download_path
+from services import CADService, job_manager, JobQueueFullError
+from processors import (
+    tessellation_cache, get_mesh_artifact_path, ensure_mesh_artifact, get_refinement_status,
+    wait_for_mesh_refinement, iter_export_bundle
+)
+from ai import completion_cache
+from models import query_index, get_conversation_store
+from app.config import ExportConfig, PathUtils, TessellationConfig
+from utils import (
+    validate_api_request_data, validate_object_id, validate_conversation_id, validate_quality, get_download_path,
+    id_timestamp, MESH_MIMETYPE, DEFAULT_MESH_ENCODING
+)
+from utils.binary_utils import encode_binary_payload, load_binary_payload
+from .http_cache import current_etag, immutable_response, skip_immutable_caching
+from .transport import (
+    make_result_response, format_sse, wants_binary_transport, get_mesh_encoding_options,
+    uses_default_mesh_encoding, apply_mesh_encoding
+)
 
 # 创建CAD蓝图
 cad_bp = Blueprint('cad', __name__)
@@ -15,44 +33,75 @@ allowed_3d_formats = ["stl", "step", "amf", "svg", "tjs", "dxf", "vrml", "vtp",
 # 创建CAD服务实例
 cad_service = CADService()
 
+def _parse_generation_request():
+    """
+    读取并验证 /cad 与 /cad/stream 共用的请求体
+
+    Returns:
+        (传给 CADService.generate_cad 的参数, 验证失败时的错误响应)，其中一个为None
+    """
+    data = request.get_json()
+    
+    validation_result = validate_api_request_data(data)
+    if not validation_result["valid"]:
+        return None, (jsonify({
+            "error": "请求数据验证失败",
+            "details": validation_result["errors"]
+        }), 400)
+    
+    return {
+        "query": data.get("query"),
+        "conversation_id": data.get("conversation_id"),
+        "render_mode": data.get("render_mode", "3d"),
+        "mesh_payload": data.get("mesh_payload", "resolved"),
+        "reuse_similar": data.get("reuse_similar"),
+        "candidates": data.get("candidates"),
+        "quality": data.get("quality"),
+        "progressive": bool(data.get("progressive")),
+    }, None
+
 @cad_bp.route("/cad", methods=["POST"])
 @cross_origin()
 def generate_cad():
     """
     生成CAD对象的API端点
+
+    成功结果默认以JSON返回，?transport=binary 时返回二进制网格格式；
+    ?async=1 时加入后台任务队列，立即返回任务ID（202），通过 /jobs/<id> 获取结果
     """
     try:
-        # 获取请求数据
-        data = request.get_json()
-        
-        # 验证请求数据
-        validation_result = validate_api_request_data(data)
-        if not validation_result["valid"]:
-            return jsonify({
-                "error": "请求数据验证失败",
-                "details": validation_result["errors"]
-            }), 400
-        
-        # 提取参数
-        query = data.get("query")
-        conversation_id = data.get("conversation_id")
-        render_mode = data.get("render_mode", "3d")
+        # 获取并验证请求参数
+        generation_args, error_response = _parse_generation_request()
+        if error_response:
+            return error_response
         
         print(f"=== API /cad called ===")
-        print(f"Query: '{query}'")
-        print(f"Conversation ID: {conversation_id}")
-        print(f"Render Mode: {render_mode}")
+        print(f"Query: '{generation_args['query']}'")
+        print(f"Conversation ID: {generation_args['conversation_id']}")
+        print(f"Render Mode: {generation_args['render_mode']}")
+        
+        # 异步模式：加入任务队列并立即返回任务ID
+        if request.args.get("async") in ("1", "true"):
+            try:
+                job = job_manager.submit(cad_service.generate_cad, **generation_args)
+            except JobQueueFullError as e:
+                return jsonify({
+                    "error": "服务繁忙",
+                    "message": str(e)
+                }), 503
+            
+            return jsonify({
+                "job_id": job["job_id"],
+                "status": job["status"],
+                "status_url": f"/jobs/{job['job_id']}"
+            }), 202
         
         # 调用服务层生成CAD
-        result = cad_service.generate_cad(
-            query=query,
-            conversation_id=conversation_id,
-            render_mode=render_mode
-        )
+        result = cad_service.generate_cad(**generation_args)
         
         # 根据结果返回响应
         if result["success"]:
-            return jsonify(result)
+            return make_result_response(result)
         else:
             # 错误情况
             status_code = 500
@@ -68,8 +117,167 @@ def generate_cad():
             "message": str(e)
         }), 500
 
+@cad_bp.route("/cad/stream", methods=["POST"])
+@cross_origin()
+def generate_cad_stream():
+    """
+    以Server-Sent Events流式推送CAD生成过程的API端点
+    
+    请求体与 /cad 相同。依次推送 conversation、generating、plan、token、executing、
+    tessellating、retry、analyzing_errors 等事件，最后推送 result 事件（内容与 /cad 的响应相同）。
+    ?transport=binary 时 result 事件不包含网格数据，改为给出 mesh_url 供客户端获取二进制网格。
+    渐进模式（progressive）下 result 事件带有粗网格，目标质量的网格细分完成后再推送 refined 事件。
+    生成在后台线程中进行，客户端断开连接不会中断生成和对话记录。
+    """
+    generation_args, error_response = _parse_generation_request()
+    if error_response:
+        return error_response
+    binary_mesh = wants_binary_transport()
+    try:
+        mesh_encoding, mesh_attributes = get_mesh_encoding_options()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    # 二进制传输时网格通过 mesh_url 单独获取，编码选项附加在地址上
+    mesh_query = "" if uses_default_mesh_encoding(mesh_encoding, mesh_attributes) else \
+        f"&mesh_encoding={mesh_encoding}" + (f"&mesh_attributes={','.join(mesh_attributes)}" if mesh_attributes else "")
+    
+    print(f"=== API /cad/stream called ===")
+    print(f"Query: '{generation_args['query']}'")
+    
+    events = queue.Queue()
+    
+    def emit(event, event_data):
+        events.put((event, event_data))
+    
+    def run_generation():
+        try:
+            result = cad_service.generate_cad(progress_callback=emit, **generation_args)
+            if binary_mesh and result.get("success") and result.get("render_mode") == "3d":
+                result.pop("shapes", None)
+                result["mesh_url"] = f"/cad/{result['id']}/mesh?quality={result['quality']}{mesh_query}"
+            emit("result", apply_mesh_encoding(result, mesh_encoding, mesh_attributes))
+            
+            refinement = result.get("refinement")
+            if refinement:
+                emit("refined", refine_result(result["id"], refinement["quality"]))
+        except Exception as e:
+            print(f"API Stream Error: {e}")
+            emit("result", {
+                "success": False,
+                "error": "服务器内部错误",
+                "message": str(e)
+            })
+        finally:
+            events.put(None)
+    
+    def refine_result(object_id, target_quality):
+        """等待后台细分完成，返回精细网格（二进制传输时只返回 mesh_url）"""
+        if not wait_for_mesh_refinement(object_id, target_quality):
+            return {"success": False, "id": object_id, "quality": target_quality, "error": "网格细化失败"}
+        if binary_mesh:
+            return {"success": True, "id": object_id, "quality": target_quality,
+                    "mesh_url": f"/cad/{object_id}/mesh?quality={target_quality}{mesh_query}"}
+        refined = cad_service.conversation_manager.get_object_result(
+            object_id, "3d", generation_args["mesh_payload"], target_quality
+        )
+        refined["success"] = "error" not in refined
+        return apply_mesh_encoding(refined, mesh_encoding, mesh_attributes)
+    
+    threading.Thread(target=run_generation, daemon=True).start()
+    
+    def event_stream():
+        while True:
+            try:
+                item = events.get(timeout=15)
+            except queue.Empty:
+                # 保持连接，防止代理在长时间执行期间断开
+                yield ": keepalive\n\n"
+                continue
+            if item is None:
+                break
+            yield format_sse(*item)
+    
+    return Response(
+        event_stream(),
+        mimetype="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+def _split_param(name: str):
+    """读取以逗号分隔的查询参数（也支持重复的参数），去重并保持顺序"""
+    values = []
+    for raw in request.args.getlist(name):
+        for value in raw.split(","):
+            value = value.strip()
+            if value and value not in values:
+                values.append(value)
+    return values
+
+@cad_bp.route("/download/bundle", methods=["GET"])
+@cross_origin()
+def download_bundle():
+    """
+    打包下载多个CAD对象的API端点
+
+    ?ids=<对象ID,...>&conversation_ids=<对话ID,...>&formats=step,stl
+    对话ID取该对话当前的对象。3D对象按 formats 导出（格式白名单与单文件下载相同），
+    2D对象打包其SVG。ZIP边导出边输出，不在内存中缓存整个压缩包
+    """
+    object_ids = _split_param("ids")
+    formats = _split_param("formats") or ["step"]
+
+    unsupported = [file_format for file_format in formats if file_format not in allowed_3d_formats]
+    if unsupported:
+        return jsonify({
+            "error": "3D模型不支持该文件格式",
+            "unsupported_formats": unsupported,
+            "supported_formats": allowed_3d_formats
+        }), 400
+
+    for conversation_id in _split_param("conversation_ids"):
+        if not validate_conversation_id(conversation_id):
+            return jsonify({"error": "无效的对话ID格式", "conversation_id": conversation_id}), 400
+        conversation = cad_service.conversation_manager.get_conversation_detail(conversation_id)
+        if conversation is None:
+            return jsonify({"error": "对话不存在", "conversation_id": conversation_id}), 404
+        current_object_id = conversation.get("current_object_id")
+        if current_object_id and current_object_id not in object_ids:
+            object_ids.append(current_object_id)
+
+    if not object_ids:
+        return jsonify({"error": "缺少要下载的对象（ids 或 conversation_ids）"}), 400
+    if len(object_ids) > ExportConfig.BUNDLE_MAX_OBJECTS:
+        return jsonify({
+            "error": f"单次最多打包 {ExportConfig.BUNDLE_MAX_OBJECTS} 个对象",
+            "count": len(object_ids)
+        }), 400
+
+    entries = []
+    for object_id in object_ids:
+        if not validate_object_id(object_id):
+            return jsonify({"error": "无效的对象ID格式", "object_id": object_id}), 400
+        if os.path.exists(PathUtils.get_svg_file_path(object_id)):
+            entries.append((object_id, "svg"))
+        elif os.path.exists(PathUtils.get_generated_file_path(object_id)):
+            entries.extend((object_id, file_format) for file_format in formats)
+        else:
+            return jsonify({"error": "对象不存在", "object_id": object_id}), 404
+
+    return Response(
+        iter_export_bundle(entries),
+        mimetype="application/zip",
+        headers={
+            "Content-Disposition": "attachment; filename=cqask-bundle.zip",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
 @cad_bp.route("/download/<object_id>", methods=["GET"])
 @cross_origin()
+@immutable_response("format", binary_aware=False)
 def download_cad_file(object_id):
     """
     下载CAD文件的API端点 (带调试信息)
@@ -77,13 +285,15 @@ def download_cad_file(object_id):
     print("--- [调试开始] ---")
     print(f"请求的 Object ID: {object_id}")
 
+    if not validate_object_id(object_id):
+        return jsonify({"error": "无效的对象ID格式", "object_id": object_id}), 400
+
     try:
-        generated_folder_abs = os.path.join(current_app.root_path, '..', 'data', 'generated')
         file_format = request.args.get("format", "step")
         print(f"请求的文件格式 (format): {file_format}")
         print(f"原始请求参数: {request.args}")
 
-        svg_file = os.path.join(generated_folder_abs, f"{object_id}.svg")
+        svg_file = PathUtils.get_svg_file_path(object_id)
         print(f"检查2D文件是否存在: {svg_file}")
         is_2d = os.path.exists(svg_file)
         print(f"是 2D 对象吗? {is_2d}")
@@ -95,7 +305,8 @@ def download_cad_file(object_id):
                 svg_file,
                 as_attachment=True,
                 download_name=f"{object_id}.svg",
-                mimetype="image/svg+xml"
+                mimetype="image/svg+xml",
+                etag=current_etag()
             )
         else:
             print("正在处理 3D 模型下载...")
@@ -108,7 +319,7 @@ def download_cad_file(object_id):
                 }), 400
 
             print("调用 get_download_path...")
-            file_path = get_download_path(object_id, file_format, generated_folder_abs)
+            file_path = get_download_path(object_id, file_format)
             print(f"get_download_path 返回的文件路径: {file_path}")
             print(f"检查最终文件是否存在: {os.path.exists(file_path)}")
 
@@ -116,7 +327,8 @@ def download_cad_file(object_id):
             return send_file(
                 file_path,
                 as_attachment=True,
-                download_name=f"{object_id}.{file_format}"
+                download_name=f"{object_id}.{file_format}",
+                etag=current_etag()
             )
 
     except FileNotFoundError as e:
@@ -137,15 +349,18 @@ def download_cad_file(object_id):
 
 @cad_bp.route("/cad/<object_id>/info", methods=["GET"])
 @cross_origin()
+@immutable_response(binary_aware=False)
 def get_cad_info(object_id):
     """
     获取CAD对象信息的API端点
     """
+    if not validate_object_id(object_id):
+        return jsonify({"error": "无效的对象ID格式", "object_id": object_id}), 400
+
     try:
         # 检查生成的代码文件是否存在
-        import os
-        code_file = f"data/generated/{object_id}.py"
-        svg_file = f"data/generated/{object_id}.svg"
+        code_file = PathUtils.get_generated_file_path(object_id)
+        svg_file = PathUtils.get_svg_file_path(object_id)
         
         if not os.path.exists(code_file):
             return jsonify({
@@ -173,6 +388,12 @@ def get_cad_info(object_id):
         render_mode = "2d" if has_svg else "3d"
         supported_formats = ["svg"] if has_svg else allowed_3d_formats
         
+        # 3D对象的网格产物通过独立端点按需获取，这里只返回其元信息
+        mesh_file = None if has_svg else get_mesh_artifact_path(object_id)
+        if not has_svg and not mesh_file:
+            # 旧对象的网格产物稍后才会生成，信息会变化
+            skip_immutable_caching()
+        
         return jsonify({
             "object_id": object_id,
             "render_mode": render_mode,
@@ -182,7 +403,10 @@ def get_cad_info(object_id):
             "svg": svg_content,
             "svg_size": svg_size,
             "supported_formats": supported_formats,
-            "created_at": object_id  # object_id就是时间戳
+            "has_mesh": mesh_file is not None,
+            "mesh_size": get_file_size(mesh_file) if mesh_file else None,
+            "mesh_url": f"/cad/{object_id}/mesh" if mesh_file else None,
+            "created_at": id_timestamp(object_id).isoformat()  # 生成时间记录在ID中
         })
         
     except Exception as e:
@@ -190,4 +414,71 @@ def get_cad_info(object_id):
         return jsonify({
             "error": "获取对象信息失败",
             "message": str(e)
-        }), 500 
\ No newline at end of file
+        }), 500 
+
+@cad_bp.route("/cad/<object_id>/mesh", methods=["GET"])
+@cross_origin()
+@immutable_response("quality", "mesh_encoding", "mesh_attributes", binary_aware=False,
+                    defaults={"quality": TessellationConfig.DEFAULT_QUALITY, "mesh_encoding": DEFAULT_MESH_ENCODING})
+def get_cad_mesh(object_id):
+    """
+    获取3D对象网格产物的API端点
+    
+    ?quality= 指定细分质量（默认 TessellationConfig.DEFAULT_QUALITY）。直接发送二进制网格文件，
+    支持Range分段请求和ETag/Last-Modified条件请求；该质量的网格正在后台细分时返回202，
+    尚未生成时当场细分。指定 mesh_encoding / mesh_attributes 时按选项重新编码后发送
+    """
+    try:
+        mesh_encoding, mesh_attributes = get_mesh_encoding_options()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    quality = request.args.get("quality", TessellationConfig.DEFAULT_QUALITY)
+    if not validate_quality(quality):
+        return jsonify({
+            "error": "无效的细分质量",
+            "supported_qualities": list(TessellationConfig.QUALITY_LEVELS)
+        }), 400
+    
+    if not validate_object_id(object_id):
+        return jsonify({"error": "无效的对象ID格式", "object_id": object_id}), 400
+    
+    mesh_file = get_mesh_artifact_path(object_id, quality)
+    if not mesh_file:
+        if get_refinement_status(object_id, quality) == "pending":
+            return jsonify({"status": "pending", "object_id": object_id, "quality": quality}), 202
+        
+        if not os.path.exists(PathUtils.get_generated_file_path(object_id)) or \
+                os.path.exists(PathUtils.get_svg_file_path(object_id)):
+            return jsonify({
+                "error": "网格产物不存在",
+                "object_id": object_id
+            }), 404
+        
+        _, error_info = ensure_mesh_artifact(object_id, quality)
+        if error_info:
+            return jsonify({
+                "error": "网格细分失败",
+                "message": f"{error_info['type']}: {error_info['message']}"
+            }), 500
+        mesh_file = get_mesh_artifact_path(object_id, quality)
+    
+    if not uses_default_mesh_encoding(mesh_encoding, mesh_attributes):
+        result = apply_mesh_encoding(load_binary_payload(mesh_file), mesh_encoding, mesh_attributes)
+        return Response(encode_binary_payload(result), mimetype=MESH_MIMETYPE)
+    
+    return send_file(mesh_file, mimetype=MESH_MIMETYPE, conditional=True, etag=current_etag())
+
+@cad_bp.route("/cache/stats", methods=["GET"])
+@cross_origin()
+def get_cache_stats():
+    """
+    获取缓存命中率等统计信息的API端点
+    """
+    return jsonify({
+        "tessellation": tessellation_cache.stats(),
+        "completion": completion_cache.stats(),
+        "query_index": query_index.stats(),
+        "search_index": get_conversation_store().search_stats(),
+        "conversation": get_conversation_store().cache_stats()
+    })
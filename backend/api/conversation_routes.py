@@ -4,10 +4,21 @@
 import json
 import traceback
 
-from flask import Blueprint, jsonify, Response
+from flask import Blueprint, jsonify, Response, request, send_file
 from flask_cors import cross_origin
+from app.config import StorageConfig, TessellationConfig
 from services.conversation_service import ConversationService
 from utils.json_utils import NumpyEncoder
+from utils.binary_utils import MESH_MIMETYPE
+from utils.validation import validate_mesh_payload, validate_quality
+from .transport import (
+    wants_binary_transport, make_result_response, get_mesh_encoding_options, uses_default_mesh_encoding,
+    apply_mesh_encoding
+)
+from .http_cache import (
+    make_etag, etag_matches, not_modified, immutable_cache_control, set_immutable_headers, to_http_datetime,
+    not_modified_since, set_revalidate_headers
+)
 
 conversation_bp = Blueprint('conversation', __name__)
 conversation_service = ConversationService()
@@ -15,23 +26,62 @@ conversation_service = ConversationService()
 @conversation_bp.route("/conversations", methods=["GET"])
 @cross_origin()
 def get_conversations():
-    """获取所有对话历史摘要"""
+    """获取对话历史摘要（支持 ?limit=&cursor= 游标分页，下一页游标在 next_cursor 中返回）"""
     try:
-        conversations = conversation_service.get_recent_conversations()
-        return jsonify({"conversations": conversations})
+        limit = request.args.get("limit", StorageConfig.CONVERSATION_PAGE_SIZE, type=int)
+        max_limit = StorageConfig.MAX_CONVERSATION_PAGE_SIZE
+        if not 1 <= limit <= max_limit:
+            return jsonify({"error": f"limit 必须是 1 到 {max_limit} 之间的整数"}), 400
+
+        try:
+            page = conversation_service.get_recent_conversations(limit, request.args.get("cursor") or None)
+        except ValueError:
+            return jsonify({"error": "无效的分页游标"}), 400
+        return jsonify(page)
     except Exception as e:
         print(f"Error getting conversations: {e}")
         return jsonify({"error": str(e)}), 500
 
+@conversation_bp.route("/conversations/search", methods=["GET"])
+@cross_origin()
+def search_conversations():
+    """全文搜索对话（?q=&limit=&offset=，下一页偏移量在 next_offset 中返回）"""
+    try:
+        query = (request.args.get("q") or "").strip()
+        if not query:
+            return jsonify({"error": "搜索内容不能为空"}), 400
+        if len(query) > 200:
+            return jsonify({"error": "搜索内容过长"}), 400
+
+        limit = request.args.get("limit", StorageConfig.CONVERSATION_PAGE_SIZE, type=int)
+        offset = request.args.get("offset", 0, type=int)
+        max_limit = StorageConfig.MAX_CONVERSATION_PAGE_SIZE
+        if not 1 <= limit <= max_limit:
+            return jsonify({"error": f"limit 必须是 1 到 {max_limit} 之间的整数"}), 400
+        if offset < 0:
+            return jsonify({"error": "offset 不能为负数"}), 400
+
+        return jsonify(conversation_service.search_conversations(query, limit, offset))
+    except Exception as e:
+        print(f"Error searching conversations: {e}")
+        return jsonify({"error": str(e)}), 500
+
 @conversation_bp.route("/conversation/<conversation_id>", methods=["GET"])
 @cross_origin()
 def get_conversation_detail(conversation_id):
-    """获取特定对话的详细信息"""
+    """获取特定对话的详细信息（支持 If-None-Match / If-Modified-Since 条件请求）"""
     try:
         conversation = conversation_service.get_conversation_detail(conversation_id)
         if not conversation:
             return jsonify({"error": "Conversation not found"}), 404
-        return jsonify(conversation)
+
+        # 对话只会追加消息：最后一条消息的时间与消息数决定是否变化
+        messages = conversation["messages"]
+        last_modified = to_http_datetime(messages[-1]["timestamp"] if messages else conversation["created_at"])
+        etag = make_etag("conversation", conversation_id, len(messages))
+        if etag_matches(etag, weak=True) or not_modified_since(last_modified):
+            return not_modified(etag, "no-cache", weak=True, last_modified=last_modified)
+        return set_revalidate_headers(jsonify(conversation), last_modified, etag)
     except Exception as e:
         print(f"Error getting conversation detail: {e}")
         return jsonify({"error": str(e)}), 500
@@ -39,16 +89,67 @@ def get_conversation_detail(conversation_id):
 @conversation_bp.route("/conversation/<conversation_id>/message/<int:message_index>", methods=["GET"])
 @cross_origin()
 def get_message_result(conversation_id, message_index):
-    """获取特定消息的结果"""
+    """获取特定消息的结果（支持 ?transport=binary 二进制网格格式，?quality= 指定3D网格细分质量，结果可长期缓存）"""
     try:
-        result = conversation_service.get_message_result(conversation_id, message_index)
+        mesh_payload = request.args.get("mesh_payload", "resolved")
+        if not validate_mesh_payload(mesh_payload):
+            return jsonify({"error": "无效的网格负载模式，必须是 'resolved' 或 'ref'"}), 400
+
+        quality = request.args.get("quality")
+        if quality is not None and not validate_quality(quality):
+            return jsonify({"error": "无效的细分质量"}), 400
+        # 与 ConversationManager.get_object_result 一致：省略质量与显式指定默认质量是同一个表示
+        quality = quality or TessellationConfig.DEFAULT_QUALITY
+
+        try:
+            mesh_encoding, mesh_attributes = get_mesh_encoding_options()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        message = conversation_service.get_message(conversation_id, message_index)
+        if not message:
+            return jsonify({"error": "Message or result not found"}), 404
+
+        # 消息写入后不再变化，其对象的产物也不可变：在读取产物之前即可处理条件请求
+        etag = make_etag(
+            "message", conversation_id, message_index, message.get("object_id"),
+            mesh_payload, quality, mesh_encoding, mesh_attributes, wants_binary_transport()
+        )
+        last_modified = to_http_datetime(message.get("timestamp"))
+        if etag_matches(etag):
+            return not_modified(etag, immutable_cache_control(), last_modified=last_modified)
+
+        if wants_binary_transport() and mesh_payload == "ref" and \
+                uses_default_mesh_encoding(mesh_encoding, mesh_attributes):
+            mesh_path = conversation_service.get_message_mesh_artifact(conversation_id, message_index, quality)
+            if mesh_path:
+                # 网格产物本身就是 ref 模式的二进制结果，直接发送文件（支持Range请求）
+                response = send_file(mesh_path, mimetype=MESH_MIMETYPE, conditional=True, etag=etag)
+                return _set_message_cache_headers(response, etag, last_modified)
+
+        result = conversation_service.get_message_result(conversation_id, message_index, mesh_payload, quality)
         if not result:
             return jsonify({"error": "Message or result not found"}), 404
 
+        if "error" in result:
+            # 错误结果（例如代码重新执行失败）不缓存
+            return Response(json.dumps(result, cls=NumpyEncoder), mimetype='application/json')
+
+        if wants_binary_transport():
+            return _set_message_cache_headers(make_result_response(result), etag, last_modified)
+
+        result = apply_mesh_encoding(result, mesh_encoding, mesh_attributes)
         serialized_data = json.dumps(result, cls=NumpyEncoder)
-        return Response(serialized_data, mimetype='application/json')
+        response = Response(serialized_data, mimetype='application/json')
+        return _set_message_cache_headers(response, etag, last_modified)
 
     except Exception as e:
         print(f"Error getting message result: {e}")
         traceback.print_exc()
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500
+
+def _set_message_cache_headers(response: Response, etag: str, last_modified) -> Response:
+    response = set_immutable_headers(response, etag)
+    if response.status_code in (200, 206) and last_modified:
+        response.last_modified = last_modified
+    return response
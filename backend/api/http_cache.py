@@ -0,0 +1,142 @@
+"""
+HTTP缓存
+对象ID对应的产物写入后不再变化，对象端点的ETag是对象ID和表示参数（取默认值后）的哈希，
+而不是响应内容的哈希，因此在读取任何文件或执行代码之前即可处理 If-None-Match 并返回304；
+对话会随新消息变化，对话端点使用 Last-Modified 与基于消息数的弱ETag重新验证
+"""
+
+import hashlib
+import json
+from datetime import datetime, timezone
+from functools import wraps
+from typing import Any, Callable, Dict, Optional
+
+from flask import Response, g, request
+
+from app.config import CacheConfig
+
+# 压缩后的表示在ETag后附加编码后缀（见 transport.compress_response），比较时视为同一资源
+CONTENT_ENCODING_SUFFIXES = ("-br", "-gzip")
+
+def make_etag(*parts: Any) -> str:
+    """根据资源标识和表示参数计算ETag值（不含引号）"""
+    raw = json.dumps([CacheConfig.HTTP_ETAG_VERSION, *parts], ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+def etag_matches(etag: str, weak: bool = False) -> bool:
+    """
+    当前请求的 If-None-Match 是否包含该ETag（包括其压缩表示），weak 为 True 时使用弱比较
+
+    If-None-Match: * 不视为匹配：ETag在确认对象存在之前就已计算，对 * 返回304（并带长期缓存头）
+    会让不存在或无效的对象ID也被缓存；GET 请求忽略 * 并返回完整响应总是正确的
+    """
+    if_none_match = request.if_none_match
+    # werkzeug 的 contains/contains_weak 对 * 也返回True，需要单独排除
+    if not if_none_match or if_none_match.star_tag:
+        return False
+    candidates = [etag] + [etag + suffix for suffix in CONTENT_ENCODING_SUFFIXES]
+    if weak:
+        return any(if_none_match.contains_weak(candidate) for candidate in candidates)
+    return any(if_none_match.contains(candidate) for candidate in candidates)
+
+def not_modified(etag: Optional[str] = None, cache_control: Optional[str] = None, weak: bool = False,
+                 last_modified: Optional[datetime] = None) -> Response:
+    """构建304响应（带与200响应相同的验证器和缓存头）"""
+    response = Response(status=304)
+    if etag:
+        response.set_etag(etag, weak=weak)
+    if last_modified:
+        response.last_modified = last_modified
+    if cache_control:
+        response.headers["Cache-Control"] = cache_control
+    return response
+
+def immutable_cache_control() -> str:
+    return f"public, max-age={CacheConfig.HTTP_IMMUTABLE_MAX_AGE}, immutable"
+
+def _vary(response: Response):
+    # 表示随 Accept（二进制传输）和 Accept-Encoding（压缩）变化
+    response.vary.add("Accept")
+    response.vary.add("Accept-Encoding")
+
+def set_immutable_headers(response: Response, etag: str) -> Response:
+    """为不可变资源的成功响应设置强ETag和长期缓存头"""
+    if response.status_code in (200, 206):
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = immutable_cache_control()
+        _vary(response)
+    return response
+
+def skip_immutable_caching():
+    """由视图调用：本次响应包含之后可能变化的内容，不设置ETag和长期缓存头"""
+    g.skip_immutable_caching = True
+
+def current_etag() -> Optional[str]:
+    """immutable_response 为当前请求计算的ETag，传给 send_file 使 Range/If-Range 使用同一验证器"""
+    return g.get("immutable_etag")
+
+def immutable_response(*variant_args: str, binary_aware: bool = True,
+                       defaults: Optional[Dict[str, str]] = None) -> Callable:
+    """
+    对象端点装饰器：对象ID + 路由参数 + 影响表示的查询参数（variant_args）决定强ETag
+
+    请求带有匹配的 If-None-Match 时直接返回304，不调用视图函数；
+    成功响应设置ETag与 Cache-Control: immutable，错误响应和调用了 skip_immutable_caching 的响应不缓存
+
+    Args:
+        variant_args: 影响响应内容的查询参数名称
+        binary_aware: 响应是否随二进制传输选择（?transport=binary / Accept）变化
+        defaults: 查询参数未指定时视图使用的默认值，省略参数与显式指定默认值得到相同的ETag
+    """
+    defaults = defaults or {}
+
+    def decorator(view: Callable) -> Callable:
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            from .transport import wants_binary_transport
+
+            etag = make_etag(
+                request.endpoint,
+                kwargs,
+                [request.args.get(name) or defaults.get(name) for name in variant_args],
+                wants_binary_transport() if binary_aware else None,
+            )
+            g.immutable_etag = etag
+            if etag_matches(etag):
+                response = not_modified(etag, immutable_cache_control())
+                _vary(response)
+                return response
+
+            result = view(*args, **kwargs)
+            if isinstance(result, Response) and not g.get("skip_immutable_caching"):
+                return set_immutable_headers(result, etag)
+            return result
+        return wrapper
+    return decorator
+
+def to_http_datetime(timestamp: Optional[str]) -> Optional[datetime]:
+    """将存储中的ISO时间戳（本地时间）转换为UTC时间，用于 Last-Modified"""
+    if not timestamp:
+        return None
+    try:
+        value = datetime.fromisoformat(timestamp)
+    except ValueError:
+        return None
+    return value.astimezone(timezone.utc).replace(microsecond=0)
+
+def not_modified_since(last_modified: Optional[datetime]) -> bool:
+    """当前请求的 If-Modified-Since 是否不早于 last_modified（请求带 If-None-Match 时以ETag为准）"""
+    if last_modified is None or request.if_none_match or request.if_modified_since is None:
+        return False
+    return request.if_modified_since >= last_modified
+
+def set_revalidate_headers(response: Response, last_modified: Optional[datetime],
+                           etag: Optional[str] = None, weak: bool = True) -> Response:
+    """为会变化的资源设置验证器：Last-Modified、（弱）ETag 与 Cache-Control: no-cache"""
+    if response.status_code == 200:
+        if last_modified:
+            response.last_modified = last_modified
+        if etag:
+            response.set_etag(etag, weak=weak)
+        response.headers["Cache-Control"] = "no-cache"
+    return response
@@ -0,0 +1,29 @@
+"""
+异步任务相关的API路由
+查询后台CAD生成任务的状态和结果
+"""
+
+from flask import Blueprint, jsonify
+from flask_cors import cross_origin
+from services import job_manager
+from .transport import make_result_response
+
+job_bp = Blueprint('job', __name__)
+
+@job_bp.route("/jobs/<job_id>", methods=["GET"])
+@cross_origin()
+def get_job(job_id):
+    """
+    获取异步任务状态的API端点
+    
+    status 为 queued / running / succeeded / failed，progress 为最近一次进度事件，
+    任务完成后 result 与 /cad 的响应内容相同（?transport=binary 时以二进制网格格式返回）
+    """
+    job = job_manager.get(job_id)
+    if not job:
+        return jsonify({
+            "error": "任务不存在或已过期",
+            "job_id": job_id
+        }), 404
+    
+    return make_result_response(job)
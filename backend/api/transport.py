@@ -0,0 +1,143 @@
+"""
+响应传输格式选择
+根据请求决定结果以JSON还是二进制网格格式返回、网格采用何种编码，并按客户端支持压缩响应体
+"""
+
+import gzip
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from flask import Response, jsonify, request
+
+from app.config import TransportConfig
+from utils.binary_utils import MESH_MIMETYPE, encode_binary_payload, get_binary_payload_stats
+from utils.json_utils import NumpyEncoder
+from utils.mesh_encoding import DEFAULT_MESH_ENCODING, MESH_ATTRIBUTES, MESH_ENCODINGS, encode_result_meshes
+from utils.validation import validate_mesh_attributes, validate_mesh_encoding
+
+try:
+    import brotli
+except ImportError:  # brotli 为可选依赖，未安装时只使用gzip
+    brotli = None
+
+def wants_binary_transport() -> bool:
+    """
+    判断当前请求是否选择了二进制网格传输
+
+    通过查询参数 ?transport=binary 或 Accept 头中包含二进制网格MIME类型来启用
+    """
+    if request.args.get("transport") == "binary":
+        return True
+    return MESH_MIMETYPE in request.headers.get("Accept", "")
+
+def get_mesh_encoding_options() -> Tuple[str, Optional[List[str]]]:
+    """
+    读取请求选择的网格编码: ?mesh_encoding=raw|compact&mesh_attributes=vertices,triangles,normals
+
+    Returns:
+        (编码方式, 保留的属性列表)，未指定属性时为None（全部保留）
+
+    Raises:
+        ValueError: 参数无效
+    """
+    mesh_encoding = request.args.get("mesh_encoding", DEFAULT_MESH_ENCODING)
+    if not validate_mesh_encoding(mesh_encoding):
+        raise ValueError(f"无效的网格编码，必须是 {', '.join(MESH_ENCODINGS)} 之一")
+
+    raw_attributes = request.args.get("mesh_attributes")
+    if raw_attributes is None:
+        return mesh_encoding, None
+    attributes = [attribute.strip() for attribute in raw_attributes.split(",") if attribute.strip()]
+    if not validate_mesh_attributes(attributes):
+        raise ValueError(f"无效的网格属性，可选: {', '.join(MESH_ATTRIBUTES)}")
+    return mesh_encoding, attributes
+
+def uses_default_mesh_encoding(mesh_encoding: str, attributes: Optional[List[str]]) -> bool:
+    """是否为默认编码（原始数组且保留全部属性），此时网格产物文件可以直接发送"""
+    return mesh_encoding == DEFAULT_MESH_ENCODING and attributes is None
+
+def apply_mesh_encoding(data: Dict[str, Any], mesh_encoding: str, attributes: Optional[List[str]]) -> Dict[str, Any]:
+    """对结果（或异步任务中的 result）中的网格应用编码选项"""
+    if uses_default_mesh_encoding(mesh_encoding, attributes):
+        return data
+    if isinstance(data.get("result"), dict):
+        return dict(data, result=encode_result_meshes(data["result"], mesh_encoding, attributes))
+    return encode_result_meshes(data, mesh_encoding, attributes)
+
+def make_result_response(result: Dict[str, Any], status_code: int = 200) -> Response:
+    """
+    按请求选择的传输格式和网格编码构建结果响应
+
+    Args:
+        result: 服务层返回的结果字典
+        status_code: HTTP状态码
+
+    Returns:
+        Flask响应对象
+    """
+    try:
+        mesh_encoding, attributes = get_mesh_encoding_options()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    result = apply_mesh_encoding(result, mesh_encoding, attributes)
+
+    if not wants_binary_transport():
+        response = jsonify(result)
+        response.status_code = status_code
+        return response
+
+    payload = encode_binary_payload(result)
+    header_size, body_size = get_binary_payload_stats(payload)
+    print(f"Binary transport: header {header_size} bytes, buffers {body_size} bytes")
+    return Response(payload, status=status_code, mimetype=MESH_MIMETYPE)
+
+def compress_response(response: Response) -> Response:
+    """
+    按 Accept-Encoding 压缩响应体（after_request 钩子）
+
+    只压缩已完整生成的响应：流式响应（SSE、打包下载）和直接发送的文件（支持Range请求）保持原样
+    """
+    if not TransportConfig.COMPRESSION_ENABLED:
+        return response
+    if response.direct_passthrough or response.is_streamed or response.status_code != 200:
+        return response
+    if "Content-Encoding" in response.headers:
+        return response
+    if response.mimetype not in TransportConfig.COMPRESSIBLE_MIMETYPES:
+        return response
+
+    response.vary.add("Accept-Encoding")
+    body = response.get_data()
+    if len(body) < TransportConfig.COMPRESSION_MIN_SIZE:
+        return response
+
+    if brotli is not None and request.accept_encodings["br"]:
+        content_encoding = "br"
+        compressed = brotli.compress(body, quality=TransportConfig.BROTLI_QUALITY)
+    elif request.accept_encodings["gzip"]:
+        content_encoding = "gzip"
+        compressed = gzip.compress(body, compresslevel=TransportConfig.GZIP_LEVEL)
+    else:
+        return response
+
+    response.set_data(compressed)
+    response.headers["Content-Encoding"] = content_encoding
+    # 压缩后的表示与原表示字节不同，强ETag需要区分（If-None-Match 比较时去掉后缀）
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f"{etag}-{content_encoding}", weak=weak)
+    return response
+
+def format_sse(event: str, data: Any) -> str:
+    """
+    格式化一条Server-Sent Events消息
+
+    Args:
+        event: 事件名称
+        data: 事件数据（序列化为单行JSON）
+
+    Returns:
+        SSE文本帧
+    """
+    payload = json.dumps(data, cls=NumpyEncoder, ensure_ascii=False)
+    return f"event: {event}\ndata: {payload}\n\n"
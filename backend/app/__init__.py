@@ -4,16 +4,32 @@
 
 from .config import (
     StoragePaths,
+    StorageConfig,
     PathUtils,
     AIConfig,
+    ExecutorConfig,
+    JobConfig,
+    CacheConfig,
+    TessellationConfig,
+    TransportConfig,
+    ExportConfig,
+    CodeCheckConfig,
     AppConfig,
     init_config
 )
 
 __all__ = [
     'StoragePaths',
+    'StorageConfig',
     'PathUtils', 
     'AIConfig',
+    'ExecutorConfig',
+    'JobConfig',
+    'CacheConfig',
+    'TessellationConfig',
+    'TransportConfig',
+    'ExportConfig',
+    'CodeCheckConfig',
     'AppConfig',
     'init_config'
 ] 
\ No newline at end of file
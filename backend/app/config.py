@@ -5,6 +5,7 @@
 
 import os
 from pathlib import Path
+from typing import Optional
 
 # 获取backend目录的绝对路径
 BACKEND_DIR = Path(__file__).parent.parent
@@ -18,6 +19,10 @@ class StoragePaths:
     GENERATED_DIR = DATA_DIR / "generated"
     CONVERSATIONS_DIR = DATA_DIR / "conversations"
     ASSETS_DIR = DATA_DIR / "assets"
+    CACHE_DIR = DATA_DIR / "cache"
+    # 跨进程文件锁（按产物路径的哈希命名，不放在产物的分片目录中）
+    LOCKS_DIR = DATA_DIR / "locks"
+    CONVERSATIONS_DB = DATA_DIR / "conversations.sqlite3"
     
     @classmethod
     def ensure_directories(cls):
@@ -26,15 +31,58 @@ class StoragePaths:
         cls.GENERATED_DIR.mkdir(exist_ok=True)
         cls.CONVERSATIONS_DIR.mkdir(exist_ok=True)
         cls.ASSETS_DIR.mkdir(exist_ok=True)
+        cls.CACHE_DIR.mkdir(exist_ok=True)
+        cls.LOCKS_DIR.mkdir(exist_ok=True)
+
+# 存储后端配置
+class StorageConfig:
+    """存储后端配置"""
+    
+    # 对话存储后端: 'sqlite'（WAL模式数据库）或 'json'（每个对话一个JSON文件）
+    # 旧的JSON对话可通过 python -m models.migrate_conversations 导入数据库
+    CONVERSATION_BACKEND = "sqlite"
+    
+    # 启动时数据库为空且 data/conversations 中存在JSON对话时自动导入（原JSON文件保留不删除）
+    AUTO_IMPORT_JSON_CONVERSATIONS = True
+    
+    # 进程内热对话缓存的最大对话数（0 表示禁用）
+    CONVERSATION_CACHE_SIZE = 256
+    
+    # 生成文件分片目录层数（每层256个子目录）
+    GENERATED_SHARD_DEPTH = 2
+    
+    # 对话历史列表分页
+    CONVERSATION_PAGE_SIZE = 50
+    MAX_CONVERSATION_PAGE_SIZE = 200
 
 # 文件路径工具函数
 class PathUtils:
-    """路径工具函数"""
+    """
+    路径工具函数
+
+    新对象（ULID）的生成文件按ID哈希前缀分片存放在 generated/ab/cd/ 子目录中，
+    旧的时间戳ID对象保留在原来的平铺目录中，两种ID通过同一组函数解析
+    """
+    
+    @staticmethod
+    def get_object_dir(object_id: str) -> Path:
+        """获取对象生成文件所在的目录"""
+        from utils.id_utils import is_legacy_id, shard_parts
+        if is_legacy_id(object_id):
+            return StoragePaths.GENERATED_DIR
+        return StoragePaths.GENERATED_DIR.joinpath(*shard_parts(object_id, StorageConfig.GENERATED_SHARD_DEPTH))
+    
+    @staticmethod
+    def ensure_object_dir(object_id: str) -> Path:
+        """确保对象的分片目录存在并返回"""
+        object_dir = PathUtils.get_object_dir(object_id)
+        object_dir.mkdir(parents=True, exist_ok=True)
+        return object_dir
     
     @staticmethod
     def get_generated_file_path(file_id: str, extension: str = "py") -> str:
         """获取生成文件的路径"""
-        return str(StoragePaths.GENERATED_DIR / f"{file_id}.{extension}")
+        return str(PathUtils.get_object_dir(file_id) / f"{file_id}.{extension}")
     
     @staticmethod
     def get_conversation_file_path(conversation_id: str) -> str:
@@ -44,7 +92,14 @@ class PathUtils:
     @staticmethod
     def get_svg_file_path(file_id: str) -> str:
         """获取SVG文件的路径"""
-        return str(StoragePaths.GENERATED_DIR / f"{file_id}.svg")
+        return PathUtils.get_generated_file_path(file_id, "svg")
+    
+    @staticmethod
+    def get_mesh_file_path(file_id: str, quality: Optional[str] = None) -> str:
+        """获取网格产物文件（二进制网格格式）的路径，默认细分质量为 <id>.mesh，其余为 <id>.<质量>.mesh"""
+        if quality and quality != TessellationConfig.DEFAULT_QUALITY:
+            return PathUtils.get_generated_file_path(file_id, f"{quality}.mesh")
+        return PathUtils.get_generated_file_path(file_id, "mesh")
 
 # AI模型配置
 class AIConfig:
@@ -57,9 +112,177 @@ class AIConfig:
     CODE_GENERATION_MODEL = "Qwen/Qwen2.5-72B-Instruct-128K"
     ERROR_ANALYSIS_MODEL = "deepseek-ai/DeepSeek-V3"
     
+    # HTTP连接池与超时（秒）
+    MAX_CONNECTIONS = 20
+    MAX_KEEPALIVE_CONNECTIONS = 10
+    CONNECT_TIMEOUT = 10
+    REQUEST_TIMEOUT = 180
+    
+    # 并发限制：所有模型合计、单个模型（可按模型名单独配置）
+    MAX_CONCURRENT_REQUESTS = 16
+    DEFAULT_MODEL_CONCURRENCY = 8
+    MODEL_CONCURRENCY = {}
+    
+    # 令牌桶速率限制（每秒请求数、突发容量）
+    RATE_LIMIT_PER_SECOND = 5.0
+    RATE_LIMIT_BURST = 10
+    
+    # 429/5xx/连接错误的指数退避重试
+    BACKOFF_RETRIES = 4
+    BACKOFF_BASE = 1.0
+    BACKOFF_MAX = 30.0
+    
+    # 多轮对话历史的token预算（不含系统提示词和本轮查询）
+    HISTORY_TOKEN_BUDGET = 6000
+    # 超出预算的较早需求在摘要中每条保留的字符数
+    HISTORY_SUMMARY_ITEM_CHARS = 60
+    
     # 重试配置
     MAX_RETRIES = 3
     MAX_SCHEMDRAW_RETRIES = 3
+    
+    # 并行候选生成：首轮同时请求的候选数量（1 表示关闭，按顺序重试）
+    SPECULATIVE_CANDIDATES = 1
+    MAX_SPECULATIVE_CANDIDATES = 4
+    # 除第一个候选（模型默认温度，可命中补全缓存）外，其余候选依次使用的温度
+    SPECULATIVE_TEMPERATURES = [0.7, 1.0, 0.4]
+    
+    # 编辑模式：后续修改时模型只返回针对当前代码的修改（补丁无法应用时回退为完整生成）
+    EDIT_MODE_FOLLOW_UPS = True
+    # 当前代码少于该行数时直接完整生成
+    EDIT_MODE_MIN_CODE_LINES = 6
+
+# 代码执行器配置
+class ExecutorConfig:
+    """生成代码执行器配置"""
+    
+    # 工作进程数量
+    WORKERS = min(os.cpu_count() or 2, 4)
+    # 单个任务的墙钟超时（秒）
+    JOB_TIMEOUT = 60
+    # 工作进程地址空间上限（MB），None表示不限制
+    MEMORY_LIMIT_MB = 4096
+    # 工作进程启动（预加载CadQuery等依赖）的超时（秒）
+    STARTUP_TIMEOUT = 120
+
+# 异步任务配置
+class JobConfig:
+    """异步CAD生成任务配置"""
+    
+    # 执行生成任务的后台线程数量
+    WORKERS = 4
+    # 排队任务上限，超出时拒绝新任务（HTTP 503）
+    QUEUE_SIZE = 32
+    # 已完成任务的结果保留时间（秒）
+    RESULT_TTL = 3600
+
+# 缓存配置
+class CacheConfig:
+    """缓存配置"""
+    
+    # 细分网格(tessellation)结果的内存LRU缓存
+    TESSELLATION_CACHE_MAX_BYTES = 256 * 1024 * 1024
+    TESSELLATION_CACHE_MAX_ENTRIES = 512
+    
+    # 大模型补全结果（执行成功的代码）的持久化缓存
+    COMPLETION_CACHE_PATH = str(StoragePaths.CACHE_DIR / "completions.sqlite3")
+    COMPLETION_CACHE_MAX_ENTRIES = 5000
+    # 补全缓存条目的有效期（秒）
+    COMPLETION_CACHE_TTL = 30 * 24 * 3600
+    
+    # 相似查询：新对话的查询与历史成功查询的相似度（0~1）达到阈值时，在结果的 similar_result 中附带已有结果供前端提示
+    QUERY_MATCH_THRESHOLD = 0.9
+    # True 时对规范化后完全相同的查询直接返回已有结果（只差一个关键词的查询相似度也很高，不会自动复用）
+    QUERY_MATCH_AUTO_REUSE = False
+    
+    # HTTP缓存：对象产物（代码、SVG、网格、导出文件）写入后不再变化，响应带强ETag并允许长期缓存
+    HTTP_IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+    # 响应内容格式变化时递增，使客户端和代理已缓存的旧表示失效
+    HTTP_ETAG_VERSION = 1
+
+# 细分质量配置
+class TessellationConfig:
+    """3D网格细分质量配置"""
+    
+    # 细分质量等级: deviation 为相对弦高误差（越小越精细），angular_tolerance 为角度容差（弧度）
+    QUALITY_LEVELS = {
+        "preview": {"deviation": 0.5, "angular_tolerance": 0.5},
+        "normal": {"deviation": 0.1, "angular_tolerance": 0.2},
+        "fine": {"deviation": 0.02, "angular_tolerance": 0.1},
+    }
+    # 未指定质量时使用的等级（与 ocp-tessellate 的默认参数一致）
+    DEFAULT_QUALITY = "normal"
+    # 渐进模式下先返回的粗网格质量
+    PROGRESSIVE_PREVIEW_QUALITY = "preview"
+    # 渐进模式下后台细化网格的线程数（每个线程细分时占用一个执行器进程）
+    REFINE_WORKERS = 1
+
+# 响应传输配置
+class TransportConfig:
+    """HTTP响应传输配置"""
+    
+    # 响应体压缩：客户端支持时优先使用brotli（需要安装 brotli 包），否则使用gzip
+    COMPRESSION_ENABLED = True
+    # 小于该大小（字节）的响应不压缩
+    COMPRESSION_MIN_SIZE = 1024
+    GZIP_LEVEL = 6
+    BROTLI_QUALITY = 5
+    # 压缩的响应类型（文件下载、网格产物等直接发送的文件不压缩，以保留Range请求支持）
+    COMPRESSIBLE_MIMETYPES = [
+        "application/json",
+        "application/vnd.cqask.mesh",
+        "image/svg+xml",
+        "text/plain",
+    ]
+
+# 导出配置
+class ExportConfig:
+    """CAD文件导出配置"""
+    
+    # 3D生成成功后在后台预先导出的格式（空列表表示不预导出），用户下载时直接发送文件
+    PRE_EXPORT_FORMATS = ["step", "stl"]
+    # 后台预导出线程数（每个线程导出时占用一个执行器进程）
+    PRE_EXPORT_WORKERS = 1
+    # 打包下载（/download/bundle）单次请求的对象数量上限
+    BUNDLE_MAX_OBJECTS = 50
+    # 打包下载时并行导出的线程数（每个线程导出时占用一个执行器进程）
+    BUNDLE_EXPORT_WORKERS = ExecutorConfig.WORKERS
+    # 写入ZIP时每次读取的文件块大小（字节）
+    BUNDLE_CHUNK_SIZE = 64 * 1024
+
+# 生成代码静态检查配置
+class CodeCheckConfig:
+    """生成代码执行前的静态检查配置（按生成器区分: "cadquery"、"schemdraw"）"""
+    
+    # 在执行前解析代码的语法树，发现的问题直接作为错误信息进入重试，不再执行代码
+    ENABLED = True
+    # 生成代码必须定义的输出变量
+    OUTPUT_VARIABLES = {"cadquery": "obj", "schemdraw": "d"}
+    # 允许导入的模块（按顶层包名）
+    ALLOWED_IMPORTS = {
+        "cadquery": ["cadquery", "cq_gears", "math"],
+        "schemdraw": ["schemdraw", "math"],
+    }
+    # 执行器预先注入、无需导入即可使用的模块 {变量名: 模块名}
+    PREDEFINED_MODULES = {
+        "cadquery": {},
+        "schemdraw": {"schemdraw": "schemdraw", "elm": "schemdraw.elements"},
+    }
+    # 禁止调用的内置函数
+    FORBIDDEN_CALLS = [
+        "exec", "eval", "compile", "open", "__import__", "input", "breakpoint", "exit", "quit",
+        "globals", "locals", "vars", "getattr", "setattr", "delattr", "help", "memoryview",
+    ]
+    # 禁止调用的显示函数（提示词要求不显示对象）
+    DISPLAY_CALLS = ["show_object", "show", "display", "debug"]
+    # 按API名称检查模块属性和方法调用（名称在执行器进程中收集，主进程无需导入CadQuery）
+    CHECK_API_SURFACE = True
+    API_SURFACE_MODULES = [
+        "cadquery", "cadquery.selectors", "cadquery.occ_impl.shapes", "cadquery.occ_impl.geom",
+        "cq_gears", "schemdraw", "schemdraw.elements", "math",
+    ]
+    # 错误信息中最多列出的问题数量
+    MAX_REPORTED_ISSUES = 10
 
 # 应用配置
 class AppConfig:
@@ -70,6 +293,9 @@ class AppConfig:
     PORT = 5001
     DEBUG = True
     
+    # 启动时预热（创建LLM客户端、启动执行器进程池）后再接受请求
+    WARMUP_ON_START = True
+    
     # CORS配置
     CORS_ORIGINS = ["http://localhost:3000"]
 
@@ -3,6 +3,12 @@ Flask应用主入口
 整合所有模块，创建并配置Flask应用
 """
 
+import os
+import time
+
+from app.startup import get_startup_report, record_phase, warmup
+_IMPORT_START = time.perf_counter()
+
 from flask import Flask
 import json as std_json
 from flask.json.provider import JSONProvider
@@ -10,8 +16,15 @@ from flask_cors import CORS
 from dotenv import load_dotenv
 
 from app.config import AppConfig, init_config
-from api import cad_bp, conversation_bp
+from api import cad_bp, conversation_bp, job_bp
+from models import get_conversation_store
+from api.transport import compress_response
 from utils.json_utils import NumpyEncoder
+from executor import executor_pool
+from services import job_manager
+from ai import llm_metrics
+
+record_phase("app_imports", _IMPORT_START)
 
 # 加载环境变量
 load_dotenv()
@@ -30,8 +43,13 @@ def create_app():
     Returns:
         配置好的Flask应用实例
     """
+    start = time.perf_counter()
+
     # 初始化配置
     init_config()
+
+    # 打开对话存储（SQLite数据库为空且存在旧的JSON对话时在此自动导入）
+    get_conversation_store()
     
     # 创建Flask应用
     app = Flask(__name__)
@@ -45,6 +63,10 @@ def create_app():
     # 注册蓝图
     app.register_blueprint(cad_bp)
     app.register_blueprint(conversation_bp)
+    app.register_blueprint(job_bp)
+    
+    # 按 Accept-Encoding 压缩JSON与二进制网格响应
+    app.after_request(compress_response)
     
     # 添加健康检查端点
     @app.route("/health", methods=["GET"])
@@ -52,9 +74,17 @@ def create_app():
         return {
             "status": "healthy",
             "service": "CQAsk Backend",
-            "version": "2.0.0"
+            "version": "2.0.0",
+            "executor": executor_pool.stats(),
+            "jobs": job_manager.stats(),
+            "llm": llm_metrics.stats()
         }
     
+    # 启动耗时报告（各阶段与延迟导入的耗时）
+    @app.route("/health/startup", methods=["GET"])
+    def startup_report():
+        return get_startup_report()
+    
     # 添加根路径端点
     @app.route("/", methods=["GET"])
     def root():
@@ -64,11 +94,17 @@ def create_app():
             "docs": "/health",
             "endpoints": [
                 "/cad - CAD生成API",
+                "/cad/stream - CAD生成流式进度API (SSE)",
+                "/cad?async=1 - 异步CAD生成API（返回任务ID）",
+                "/jobs/<id> - 异步任务状态与结果API",
                 "/conversations - 对话管理API",
-                "/download/<id> - 文件下载API"
+                "/download/<id> - 文件下载API",
+                "/cache/stats - 缓存统计API",
+                "/health/startup - 启动耗时报告"
             ]
         }
     
+    record_phase("create_app", start)
     return app
 
 def run_app():
@@ -76,6 +112,10 @@ def run_app():
     运行Flask应用
     """
     app = create_app()
+
+    # debug模式下只在实际服务请求的重载子进程中预热
+    if AppConfig.WARMUP_ON_START and (not AppConfig.DEBUG or os.environ.get("WERKZEUG_RUN_MAIN") == "true"):
+        warmup()
     app.run(
         host=AppConfig.HOST,
         port=AppConfig.PORT,
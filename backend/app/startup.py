@@ -0,0 +1,141 @@
+"""
+启动性能管理
+提供重量级依赖的延迟导入、预热钩子和启动耗时报告
+
+命令行查看各模块的导入耗时:
+    python -m app.startup
+"""
+
+import importlib
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Dict, List
+
+# 进程启动基准时间（本模块通常在启动早期被导入）
+_PROCESS_START = time.perf_counter()
+
+_lock = threading.Lock()
+_import_costs: Dict[str, float] = {}
+_phase_costs: Dict[str, float] = {}
+_warmed_up = False
+
+def lazy_import(module_name: str):
+    """
+    延迟导入模块，并记录首次导入的耗时
+
+    Args:
+        module_name: 模块全名
+
+    Returns:
+        导入的模块对象
+    """
+    module = sys.modules.get(module_name)
+    if module is not None:
+        return module
+
+    start = time.perf_counter()
+    module = importlib.import_module(module_name)
+    with _lock:
+        _import_costs.setdefault(module_name, (time.perf_counter() - start) * 1000)
+    return module
+
+def record_phase(name: str, started_at: float):
+    """记录一个启动阶段的耗时（started_at 为 time.perf_counter() 的值）"""
+    with _lock:
+        _phase_costs[name] = (time.perf_counter() - started_at) * 1000
+
+def warmup():
+    """
+    预热钩子：在接受请求之前加载重量级依赖
+
+    生产环境的工作进程应在开始服务前调用（例如 gunicorn 的 post_fork 钩子），
+    使第一个请求不必承担LLM客户端创建和执行器进程启动的开销
+    """
+    global _warmed_up
+    if _warmed_up:
+        return
+
+    start = time.perf_counter()
+
+    from generators.cadquery_generator import get_client
+    from generators.schemdraw_generator import get_schemdraw_client
+    from ai.error_analyzer import get_error_analysis_client
+    from ai.llm_client import get_openai_client
+    get_client()
+    get_schemdraw_client()
+    get_error_analysis_client()
+    get_openai_client()
+    record_phase("llm_clients", start)
+
+    executor_start = time.perf_counter()
+    from executor import executor_pool
+    executor_pool.start()
+    executor_pool.wait_until_ready()
+    record_phase("executor_pool", executor_start)
+
+    # 静态检查使用的API名称在执行器进程中收集
+    surface_start = time.perf_counter()
+    from generators.code_checker import get_api_surface
+    get_api_surface()
+    record_phase("api_surface", surface_start)
+
+    # 对话存储连接和进程内索引（相似查询索引，以及JSON后端的对话摘要和全文搜索索引）
+    store_start = time.perf_counter()
+    from models import get_conversation_store
+    get_conversation_store().prepare_indexes()
+    record_phase("conversation_store", store_start)
+
+    record_phase("warmup", start)
+    _warmed_up = True
+
+def get_startup_report() -> Dict[str, Any]:
+    """获取启动耗时报告（单位: 毫秒）"""
+    with _lock:
+        return {
+            "warmed_up": _warmed_up,
+            "uptime_ms": (time.perf_counter() - _PROCESS_START) * 1000,
+            "phases": dict(_phase_costs),
+            "lazy_imports": dict(sorted(_import_costs.items(), key=lambda item: item[1], reverse=True)),
+        }
+
+def measure_import_costs(target: str = "app.main", top: int = 20) -> List[Dict[str, Any]]:
+    """
+    在子进程中使用 python -X importtime 测量导入 target 时各模块的累计耗时
+
+    Args:
+        target: 要测量的模块
+        top: 返回耗时最多的前N个模块
+
+    Returns:
+        [{"module": 模块名, "self_ms": 自身耗时, "cumulative_ms": 累计耗时}, ...]
+    """
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        cwd=backend_dir,
+        capture_output=True,
+        text=True,
+    )
+
+    pattern = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+    costs = []
+    for line in completed.stderr.splitlines():
+        match = pattern.match(line)
+        if match:
+            costs.append({
+                "module": match.group(4),
+                "self_ms": int(match.group(1)) / 1000,
+                "cumulative_ms": int(match.group(2)) / 1000,
+            })
+
+    costs.sort(key=lambda item: item["cumulative_ms"], reverse=True)
+    return costs[:top]
+
+if __name__ == "__main__":
+    print(f"{'module':<50} {'self(ms)':>10} {'cumulative(ms)':>15}")
+    for item in measure_import_costs():
+        print(f"{item['module']:<50} {item['self_ms']:>10.1f} {item['cumulative_ms']:>15.1f}")
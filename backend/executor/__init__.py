@@ -0,0 +1,11 @@
+"""
+代码执行器模块
+在预先启动的隔离进程中执行生成的CadQuery/schemdraw代码
+"""
+
+from .pool import ExecutorPool, executor_pool
+
+__all__ = [
+    'ExecutorPool',
+    'executor_pool'
+]
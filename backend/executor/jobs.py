@@ -0,0 +1,192 @@
+"""
+执行器任务
+在隔离的工作进程中运行生成的代码，只把可序列化的结果（网格数组、SVG、BREP和导出文件字节）传回主进程
+"""
+
+import io
+import os
+import tempfile
+from typing import Any, Callable, Dict, List, Optional
+
+def _exec_generated_code(code: str, exec_globals: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """在新的命名空间中执行生成的代码"""
+    exec_globals = exec_globals if exec_globals is not None else {}
+    exec(code, exec_globals)
+    return exec_globals
+
+def _build_cq_obj(code: str) -> Any:
+    """执行CadQuery代码并取出 obj 变量"""
+    exec_globals = _exec_generated_code(code)
+    if 'obj' not in exec_globals:
+        raise ValueError("Generated code does not define 'obj' variable")
+    return exec_globals['obj']
+
+def _to_shape(obj: Any) -> Any:
+    """将 obj（Shape、Workplane、Assembly 或形状序列）合并为单个Shape，与 cq.exporters.export 的处理一致"""
+    import cadquery as cq
+    from cadquery.occ_impl.shapes import compound
+
+    if isinstance(obj, cq.Shape):
+        return obj
+    if isinstance(obj, cq.Assembly):
+        return obj.toCompound()
+    return compound(*obj)
+
+def _serialize_brep(obj: Any) -> bytes:
+    """将对象序列化为BREP字节串"""
+    buffer = io.BytesIO()
+    _to_shape(obj).exportBrep(buffer)
+    return buffer.getvalue()
+
+def _brep_part_name(obj: Any, shapes: Dict[str, Any]) -> Optional[str]:
+    """
+    从BREP细分时沿用的部件名称；BREP无法还原对象的部件结构时返回None
+
+    BREP只保存合并后的单个形状：装配体的部件名称、颜色和层级都会丢失。
+    只有单个实体部件的对象以原部件名称细分BREP才能得到相同的部件结构
+    """
+    import cadquery as cq
+
+    if isinstance(obj, cq.Assembly):
+        return None
+    parts = shapes.get("parts", [])
+    if len(parts) != 1 or "parts" in parts[0] or parts[0].get("subtype") != "solid":
+        return None
+    return parts[0].get("name")
+
+def run_cadquery_job(code: str, tessellation_params: Optional[Dict[str, Any]] = None, include_brep: bool = False,
+                     progress: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    """
+    执行CadQuery代码并细分生成的对象，progress 用于报告当前阶段
+
+    Args:
+        include_brep: 是否同时返回对象的BREP序列化结果（供之后导出各种格式，无需再次执行代码）
+
+    Returns:
+        {"meshed_instances": [...], "shapes": {...}, "brep": bytes或None, "brep_part_name": str或None}，
+        shapes 保留 ref 引用；brep_part_name 为None时BREP只能用于导出，不能用于细分
+    """
+    from processors.tessellation_processor import tessellate_cad_objects
+
+    obj = _build_cq_obj(code)
+    if progress:
+        progress("tessellating")
+    # mapping 中含有OCP对象，无法跨进程传输，这里直接丢弃
+    meshed_instances, shapes, _ = tessellate_cad_objects(obj, resolve_refs=False, **(tessellation_params or {}))
+
+    brep = None
+    brep_part_name = None
+    if include_brep and meshed_instances:
+        try:
+            brep = _serialize_brep(obj)
+            brep_part_name = _brep_part_name(obj, shapes)
+        except Exception as e:
+            # 失败时导出和其他细分质量会回退为重新执行代码
+            print(f"Executor worker: failed to serialize BREP: {type(e).__name__}: {e}")
+    return {"meshed_instances": meshed_instances, "shapes": shapes, "brep": brep, "brep_part_name": brep_part_name}
+
+def run_brep_job(code: str, progress: Optional[Callable[[str], None]] = None) -> bytes:
+    """
+    执行CadQuery代码并将对象序列化为BREP（用于生成时没有保存BREP的旧对象）
+
+    Returns:
+        BREP字节串
+    """
+    return _serialize_brep(_build_cq_obj(code))
+
+def run_brep_tessellation_job(brep: bytes, tessellation_params: Optional[Dict[str, Any]] = None,
+                              part_name: Optional[str] = None,
+                              progress: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    """
+    从BREP加载对象并按细分参数细分（不执行生成的代码，用于其他细分质量的网格）
+
+    Args:
+        part_name: 执行代码时得到的部件名称（见 _brep_part_name），使部件结构与执行代码的结果一致
+
+    Returns:
+        {"meshed_instances": [...], "shapes": {...}}，shapes 保留 ref 引用
+    """
+    import cadquery as cq
+    from processors.tessellation_processor import tessellate_cad_objects
+
+    obj = cq.Shape.importBrep(io.BytesIO(brep))
+    if progress:
+        progress("tessellating")
+    names = [part_name] if part_name else None
+    meshed_instances, shapes, _ = tessellate_cad_objects(
+        obj, names=names, resolve_refs=False, **(tessellation_params or {})
+    )
+    return {"meshed_instances": meshed_instances, "shapes": shapes}
+
+def run_schemdraw_job(code: str, progress: Optional[Callable[[str], None]] = None) -> bytes:
+    """
+    执行schemdraw代码并渲染SVG
+
+    Returns:
+        SVG字节串
+    """
+    import schemdraw
+    import schemdraw.elements as elm
+
+    exec_globals = _exec_generated_code(code, {
+        'schemdraw': schemdraw,
+        'elm': elm
+    })
+    if 'd' not in exec_globals:
+        raise ValueError("Generated code does not define 'd' variable (schemdraw Drawing object)")
+    if progress:
+        progress("rendering")
+    return exec_globals['d'].get_imagedata('svg')
+
+def run_export_job(brep: bytes, export_type: str, progress: Optional[Callable[[str], None]] = None) -> bytes:
+    """
+    从BREP加载对象并导出为指定格式（不执行生成的代码）
+
+    Returns:
+        导出文件的字节内容
+    """
+    import cadquery as cq
+
+    obj = cq.Shape.importBrep(io.BytesIO(brep))
+    if progress:
+        progress("exporting")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        export_path = os.path.join(tmp_dir, f"export.{export_type}")
+        cq.exporters.export(obj, export_path, exportType=export_type.upper())
+        with open(export_path, "rb") as f:
+            return f.read()
+
+def run_api_surface_job(modules: List[str], progress: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    """
+    收集生成代码可以使用的API名称（供主进程静态检查，无需在主进程中导入CadQuery）
+
+    Returns:
+        {"modules": {模块名: 公开属性名列表}, "methods": 这些模块中所有类的公开属性名列表}，无法导入的模块被忽略
+    """
+    import importlib
+    import inspect
+
+    module_names = {}
+    methods = set()
+    for module_name in modules:
+        try:
+            module = importlib.import_module(module_name)
+        except ImportError:
+            continue
+        names = [name for name in dir(module) if not name.startswith("_")]
+        module_names[module_name] = names
+        for name in names:
+            value = getattr(module, name, None)
+            if inspect.isclass(value):
+                methods.update(attr for attr in dir(value) if not attr.startswith("_"))
+    return {"modules": module_names, "methods": sorted(methods)}
+
+# 任务名称到任务函数的映射
+JOBS = {
+    "cadquery": run_cadquery_job,
+    "schemdraw": run_schemdraw_job,
+    "brep": run_brep_job,
+    "brep_tessellation": run_brep_tessellation_job,
+    "export": run_export_job,
+    "api_surface": run_api_surface_job,
+}
@@ -0,0 +1,239 @@
+"""
+执行器进程池
+维护一组预先启动的工作进程执行生成的代码，
+每个任务有墙钟超时，超时、崩溃或任务被取消的工作进程会被杀死并替换
+"""
+
+import atexit
+import multiprocessing
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.config import ExecutorConfig
+from .worker import worker_main
+
+# 提供取消事件时轮询管道与等待空闲工作进程的时间片（秒）
+CANCEL_POLL_INTERVAL = 0.1
+
+class _Worker:
+    """单个工作进程及其通信管道"""
+
+    def __init__(self, ctx, memory_limit_mb: Optional[int]):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=worker_main,
+            args=(child_conn, memory_limit_mb),
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+
+    def wait_ready(self, timeout: float) -> bool:
+        """等待工作进程完成预加载"""
+        if not self.ready and self.conn.poll(timeout):
+            status, _ = self.conn.recv()
+            self.ready = status == "ready"
+        return self.ready
+
+    def kill(self):
+        """强制终止工作进程"""
+        try:
+            self.process.kill()
+            self.process.join(timeout=5)
+        finally:
+            self.conn.close()
+
+    def stop(self):
+        """通知工作进程正常退出"""
+        try:
+            self.conn.send(None)
+            self.process.join(timeout=5)
+        except (OSError, ValueError):
+            pass
+        if self.process.is_alive():
+            self.kill()
+
+class ExecutorPool:
+    """生成代码的进程池执行器"""
+
+    def __init__(self, size: int, job_timeout: float, memory_limit_mb: Optional[int], startup_timeout: float):
+        self.size = size
+        self.job_timeout = job_timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.startup_timeout = startup_timeout
+        # spawn: 工作进程不继承Flask进程的线程和锁状态
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = False
+        self._workers_replaced = 0
+
+    def start(self):
+        """启动所有工作进程（幂等）"""
+        with self._lock:
+            if self._started:
+                return
+            for _ in range(self.size):
+                self._idle.put(self._spawn_worker())
+            self._started = True
+            atexit.register(self.shutdown)
+        print(f"Executor pool started with {self.size} workers")
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        """等待所有空闲工作进程完成预加载，用于服务启动前的预热"""
+        timeout = timeout or self.startup_timeout
+        workers = []
+        while True:
+            try:
+                workers.append(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+        ready = True
+        for worker in workers:
+            ready = worker.wait_ready(timeout) and ready
+            self._idle.put(worker)
+        return ready
+
+    def _spawn_worker(self) -> _Worker:
+        return _Worker(self._ctx, self.memory_limit_mb)
+
+    def _replace_worker(self, worker: _Worker) -> _Worker:
+        """杀死异常的工作进程并启动新的进程替换它"""
+        worker.kill()
+        self._workers_replaced += 1
+        return self._spawn_worker()
+
+    def _acquire_worker(self, cancel_event: Optional[threading.Event]) -> Optional[_Worker]:
+        """取出一个空闲工作进程，等待期间取消事件被设置时返回None"""
+        if cancel_event is None:
+            return self._idle.get()
+        while not cancel_event.is_set():
+            try:
+                return self._idle.get(timeout=CANCEL_POLL_INTERVAL)
+            except queue.Empty:
+                continue
+        return None
+
+    @staticmethod
+    def _cancelled_error(job_name: str) -> Dict[str, Any]:
+        return {
+            "type": "ExecutionCancelled",
+            "message": f"Executor job '{job_name}' was cancelled",
+            "traceback": ""
+        }
+
+    def submit(self, job_name: str, *args, timeout: Optional[float] = None,
+               on_progress: Optional[Callable[[str], None]] = None,
+               cancel_event: Optional[threading.Event] = None) -> Tuple[Any, Optional[Dict[str, Any]]]:
+        """
+        在空闲的工作进程中同步执行任务
+
+        Args:
+            job_name: 任务名称，见 executor.jobs.JOBS
+            *args: 任务参数（需可pickle）
+            timeout: 墙钟超时秒数，默认使用配置值
+            on_progress: 接收任务阶段名称的回调（如 "tessellating"）
+            cancel_event: 被设置时放弃任务，杀死并替换正在执行任务的工作进程
+
+        Returns:
+            (结果, 错误信息)，成功时错误信息为None；
+            错误信息与生成器的格式一致，包含 type、message、traceback
+        """
+        self.start()
+        timeout = timeout or self.job_timeout
+
+        worker = self._acquire_worker(cancel_event)
+        if worker is None:
+            return None, self._cancelled_error(job_name)
+        try:
+            if not worker.wait_ready(self.startup_timeout):
+                worker = self._replace_worker(worker)
+                return None, {
+                    "type": "ExecutorError",
+                    "message": "Executor worker failed to start",
+                    "traceback": ""
+                }
+
+            worker.conn.send((job_name, args))
+            deadline = time.monotonic() + timeout
+            while True:
+                remaining = deadline - time.monotonic()
+                if cancel_event is not None and cancel_event.is_set():
+                    print(f"Executor job '{job_name}' cancelled, replacing worker")
+                    worker = self._replace_worker(worker)
+                    return None, self._cancelled_error(job_name)
+
+                # 有取消事件时分片等待，以便及时响应取消
+                wait = remaining if cancel_event is None else min(remaining, CANCEL_POLL_INTERVAL)
+                if not worker.conn.poll(max(wait, 0)):
+                    if remaining > wait:
+                        continue
+                    print(f"Executor job '{job_name}' timed out after {timeout}s, replacing worker")
+                    worker = self._replace_worker(worker)
+                    return None, {
+                        "type": "ExecutionTimeout",
+                        "message": f"Code execution exceeded {timeout}s and was terminated",
+                        "traceback": ""
+                    }
+
+                status, payload = worker.conn.recv()
+                if status != "progress":
+                    break
+                if on_progress:
+                    on_progress(payload)
+
+            if status == "ok":
+                return payload, None
+            return None, payload
+
+        except (EOFError, OSError) as e:
+            worker.process.join(timeout=1)
+            exitcode = worker.process.exitcode
+            print(f"Executor worker crashed during '{job_name}' (exit code {exitcode}): {e}")
+            worker = self._replace_worker(worker)
+            return None, {
+                "type": "WorkerCrashed",
+                "message": f"Code execution crashed the worker process (exit code {exitcode})",
+                "traceback": ""
+            }
+        except BaseException:
+            # 工作进程可能仍在执行任务或管道中残留消息，不能直接放回空闲队列
+            worker = self._replace_worker(worker)
+            raise
+        finally:
+            self._idle.put(worker)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取进程池状态"""
+        return {
+            "size": self.size,
+            "started": self._started,
+            "idle_workers": self._idle.qsize(),
+            "workers_replaced": self._workers_replaced,
+            "job_timeout": self.job_timeout,
+            "memory_limit_mb": self.memory_limit_mb,
+        }
+
+    def shutdown(self):
+        """停止所有空闲的工作进程"""
+        with self._lock:
+            if not self._started:
+                return
+            while True:
+                try:
+                    self._idle.get_nowait().stop()
+                except queue.Empty:
+                    break
+            self._started = False
+
+# 进程内共享的执行器实例，首次提交任务时启动
+executor_pool = ExecutorPool(
+    size=ExecutorConfig.WORKERS,
+    job_timeout=ExecutorConfig.JOB_TIMEOUT,
+    memory_limit_mb=ExecutorConfig.MEMORY_LIMIT_MB,
+    startup_timeout=ExecutorConfig.STARTUP_TIMEOUT,
+)
@@ -0,0 +1,80 @@
+"""
+执行器工作进程
+预先导入CadQuery/OCP/cq_gears/schemdraw，循环接收任务并通过管道返回结果
+"""
+
+import traceback
+from typing import Optional
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，无法设置内存上限
+    resource = None
+
+# 工作进程启动时预加载的模块，使首个任务无需承担导入开销
+PRELOAD_MODULES = [
+    "cadquery",
+    "OCP",
+    "ocp_tessellate.convert",
+    "cq_gears",
+    "schemdraw",
+    "schemdraw.elements",
+]
+
+def _apply_memory_limit(memory_limit_mb: Optional[int]):
+    """限制工作进程的地址空间大小"""
+    if not resource or not memory_limit_mb:
+        return
+    limit = memory_limit_mb * 1024 * 1024
+    try:
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ValueError, OSError) as e:
+        print(f"Executor worker: failed to set memory limit: {e}")
+
+def _preload_modules():
+    """预加载重量级依赖"""
+    import matplotlib
+    matplotlib.use('Agg')  # 使用非GUI后端
+
+    for module_name in PRELOAD_MODULES:
+        try:
+            __import__(module_name)
+        except ImportError as e:
+            print(f"Executor worker: failed to preload {module_name}: {e}")
+
+def worker_main(conn, memory_limit_mb: Optional[int] = None):
+    """
+    工作进程主循环
+
+    协议: 启动完成后发送 ("ready", None)；之后每收到 (任务名, 参数元组)，
+    执行期间可发送任意条 ("progress", 阶段名)，最后返回 ("ok", 结果) 或
+    ("error", 错误信息字典)；收到 None 时退出
+    """
+    from .jobs import JOBS
+
+    _apply_memory_limit(memory_limit_mb)
+    _preload_modules()
+    conn.send(("ready", None))
+
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            break
+        if message is None:
+            break
+
+        job_name, args = message
+
+        def report_progress(stage: str):
+            conn.send(("progress", stage))
+
+        try:
+            result = JOBS[job_name](*args, progress=report_progress)
+            conn.send(("ok", result))
+        except Exception as e:
+            conn.send(("error", {
+                "type": type(e).__name__,
+                "message": str(e),
+                "traceback": traceback.format_exc()
+            }))
@@ -5,10 +5,12 @@
 
 from .cadquery_generator import generate_cq_obj, clean_code
 from .schemdraw_generator import generate_schemdraw_code, clean_schemdraw_code
+from .streaming import CompletionCancelled
 
 __all__ = [
     'generate_cq_obj',
     'clean_code',
     'generate_schemdraw_code', 
-    'clean_schemdraw_code'
+    'clean_schemdraw_code',
+    'CompletionCancelled'
 ] 
\ No newline at end of file
@@ -3,21 +3,27 @@ CadQuery 3D代码生成器
 专门用于生成3D CadQuery代码
 """
 
-import importlib
-import os
-import openai
-from datetime import datetime
+import ast
+import threading
 from dotenv import load_dotenv
-from typing import List, Dict, Tuple, Any
-import traceback
+from functools import lru_cache
+from typing import List, Dict, Tuple, Any, Optional
+
+from app.config import AIConfig, PathUtils
+from ai.llm_client import CadQueryLLMClient
+from ai.completion_cache import completion_cache, make_completion_key
+from processors import tessellate_code, get_quality_params
+from utils import generate_id
+from .code_patch import CodePatchError, apply_code_patch
+from .code_checker import check_generated_code
+from .streaming import request_completion, get_cached_completion, CompletionCancelled, ProgressCallback
 
 load_dotenv()
 
-# CadQuery代码生成客户端
-client = openai.OpenAI(
-    api_key=os.environ["SILICONFLOW_API_KEY"],
-    base_url="https://api.siliconflow.cn/v1",
-)
+@lru_cache(maxsize=None)
+def get_client():
+    """获取CadQuery代码生成客户端（所有客户端共享连接池与限流）"""
+    return CadQueryLLMClient()
 
 def clean_code(code_text: str) -> str:
     """清理模型生成的代码，移除 Markdown 格式标记"""
@@ -28,7 +34,87 @@ def clean_code(code_text: str) -> str:
             clean_lines.append(line)
     return '\n'.join(clean_lines)
 
-def generate_cq_obj(user_msg: str, conversation_history: List[Dict[str, str]] = None, error_message: str = None):
+# 后续修改的编辑模式：模型只返回针对当前代码的修改，输出长度与修改量而不是程序长度成正比
+EDIT_MODE_INSTRUCTIONS = """
+### Edit Mode
+The user is modifying the CURRENT CODE shown in their message. Do NOT repeat the whole program and do NOT write a new Plan block.
+Respond ONLY with one or more edit blocks in exactly this format:
+<<<<<<< SEARCH
+lines copied verbatim from the current code
+=======
+the new lines
+>>>>>>> REPLACE
+- Each SEARCH section must match a contiguous run of lines in the current code exactly once; include just enough lines to be unique.
+- To add code, SEARCH an existing line and REPLACE it with that line plus the new lines.
+- Keep the final object assigned to `obj` and follow all API rules above.
+- If the request needs a completely different design, respond with the full new program instead (Plan block first, as usual).
+"""
+
+_CODE_PLACEHOLDER = "（代码见下一条消息中的当前代码）"
+
+def build_edit_messages(system_msg: str, user_msg: str, base_code: str,
+                        conversation_history: Optional[List[Dict[str, str]]] = None) -> List[Dict[str, str]]:
+    """
+    构建编辑模式的消息：当前代码放在本轮查询中，历史里相同的代码替换为占位说明，避免重复发送
+    """
+    messages = [{"role": "system", "content": system_msg + EDIT_MODE_INSTRUCTIONS}]
+    for message in conversation_history or []:
+        if message["role"] == "assistant" and message["content"] == base_code:
+            message = {"role": "assistant", "content": _CODE_PLACEHOLDER}
+        messages.append(message)
+    messages.append({
+        "role": "user",
+        "content": f"当前代码:\n```python\n{base_code}\n```\n\n修改需求: {user_msg}"
+    })
+    return messages
+
+def _is_full_program(text: str) -> bool:
+    """编辑模式下模型是否改为返回了完整程序"""
+    try:
+        tree = ast.parse(text)
+    except SyntaxError:
+        return False
+    return any(
+        isinstance(node, ast.Assign) and any(isinstance(t, ast.Name) and t.id == "obj" for t in node.targets)
+        for node in tree.body
+    )
+
+def _generate_patched_code(llm_client, messages: List[Dict[str, str]], base_code: str,
+                           progress_callback: Optional[ProgressCallback],
+                           temperature: Optional[float], cancel_event: Optional[threading.Event]) -> Optional[str]:
+    """请求编辑模式补全并应用到当前代码，补丁无法应用时返回None（调用方回退为完整生成）"""
+    response_content = request_completion(llm_client, messages, progress_callback, temperature, cancel_event)
+    try:
+        code_content, edit_count = apply_code_patch(base_code, response_content)
+    except CodePatchError as e:
+        full_code = clean_code(response_content)
+        if _is_full_program(full_code):
+            print("Edit mode: model returned a full program")
+            return full_code
+        print(f"Edit mode: patch could not be applied ({e}), falling back to full generation")
+        if progress_callback:
+            progress_callback("patch_failed", {"reason": str(e)})
+        return None
+
+    print(f"Edit mode: applied {edit_count} edit(s) to the current code")
+    if progress_callback:
+        progress_callback("patch_applied", {"edits": edit_count})
+    return code_content
+
+def generate_cq_obj(user_msg: str, conversation_history: List[Dict[str, str]] = None, error_message: str = None,
+                    progress_callback: Optional[ProgressCallback] = None,
+                    temperature: Optional[float] = None, use_cache: bool = True,
+                    cancel_event: Optional[threading.Event] = None, quality: Optional[str] = None,
+                    base_code: Optional[str] = None):
+    """
+    生成CadQuery代码，在执行器进程中执行并细分
+
+    base_code 为对话当前代码时（后续修改且不是错误重试），先以编辑模式请求针对当前代码的补丁，
+    补丁无法应用时回退为完整生成
+
+    Returns:
+        (对象ID, (meshed_instances, shapes), 错误信息)，成功时错误信息为None，失败时细分结果为None
+    """
     # Define the system message by concatenating strings to avoid triple-quote conflicts.
     system_msg = """
 You are a senior design engineer and an expert CadQuery programmer. Your goal is to deeply understand the user's intent, applying both robust engineering principles and creative design thinking to translate it into clean, idiomatic code.
@@ -112,62 +198,84 @@ obj = gear_solid.copy()
     if conversation_history:
         messages.extend(conversation_history)
     
-    # Add error message if this is a retry
+    # Add the current request (combined with the error message if this is a retry).
+    # The history never contains the current request, so it is always appended here.
     if error_message:
         error_prompt = f"上面的代码执行时出现了错误：\n{error_message}\n\n请修复代码中的问题并重新生成完整的CadQuery代码。确保代码可以正确执行并且最终对象被赋值给变量'obj'。"
-        if conversation_history:
-            # If we have conversation history, add the error as a new user message
-            messages.append({"role": "user", "content": error_prompt})
-        else:
-            # If no conversation history, combine with the original query
-            messages.append({"role": "user", "content": f"{user_msg}\n\n{error_prompt}"})
+        messages.append({"role": "user", "content": f"{user_msg}\n\n{error_prompt}"})
     else:
-        # Normal generation without error
-        if not conversation_history:
-            messages.append({"role": "user", "content": user_msg})
-
-    # 调用大模型
-    response = client.chat.completions.create(
-        model="Qwen/Qwen2.5-72B-Instruct-128K",
-        messages=messages,
+        messages.append({"role": "user", "content": user_msg})
+
+    llm_client = get_client()
+    model = llm_client.model
+
+    code_content = None
+    use_edit_mode = (
+        AIConfig.EDIT_MODE_FOLLOW_UPS and base_code and not error_message
+        and len(base_code.splitlines()) >= AIConfig.EDIT_MODE_MIN_CODE_LINES
     )
+    if use_edit_mode:
+        # 缓存中保存的是应用补丁后的完整代码
+        edit_messages = build_edit_messages(system_msg, user_msg, base_code, conversation_history)
+        cache_key = make_completion_key(model, user_msg, edit_messages)
+        code_content = get_cached_completion(cache_key, use_cache, progress_callback)
+        if code_content is None:
+            code_content = _generate_patched_code(
+                llm_client, edit_messages, base_code, progress_callback, temperature, cancel_event
+            )
 
-    id = datetime.now().isoformat().replace(":", "-")
+    if code_content is None:
+        cache_key = make_completion_key(model, user_msg, messages, error_message)
+        code_content = get_cached_completion(cache_key, use_cache, progress_callback)
+    if code_content is None:
+        # 调用大模型
+        response_content = request_completion(
+            llm_client,
+            messages,
+            progress_callback,
+            temperature,
+            cancel_event
+        )
+        code_content = clean_code(response_content)
 
-    # create directory "data/generated" if does not exist
-    if not os.path.exists("data/generated"):
-        os.makedirs("data/generated")
+    # 检查生成的代码是否已经包含 import cadquery as cq
+    if 'import cadquery as cq' not in code_content:
+        code_content = f'import cadquery as cq\n{code_content}'
 
-    file_name = f"data/generated/{id}.py"
+    if cancel_event and cancel_event.is_set():
+        raise CompletionCancelled("Generation cancelled before execution")
+
+    id = generate_id()
+
+    # 生成文件存放在对象的分片目录中
+    PathUtils.ensure_object_dir(id)
+    file_name = PathUtils.get_generated_file_path(id)
     with open(file_name, "w", encoding='utf-8') as f:
-        code_content = clean_code(response.choices[0].message.content)
-        
-        # 检查生成的代码是否已经包含 import cadquery as cq
-        if 'import cadquery as cq' not in code_content:
-            f.write(f'import cadquery as cq\n{code_content}')
-        else:
-            f.write(code_content)
-
-    # 尝试执行代码
-    try:
-        # 确保以UTF-8编码读取文件内容来执行
-        with open(file_name, "r", encoding='utf-8') as f:
-            code_to_execute = f.read()
-        
-        # 创建一个新的模块命名空间来执行代码
-        exec_globals = {}
-        exec(code_to_execute, exec_globals)
-        
-        if 'obj' not in exec_globals:
-            raise ValueError("Generated code does not define 'obj' variable")
-        
-        return id, exec_globals['obj'], None  # 成功时返回None作为错误信息
-        
-    except Exception as e:
-        # 收集详细的错误信息
-        error_info = {
-            "type": type(e).__name__,
-            "message": str(e),
-            "traceback": traceback.format_exc()
-        }
-        return id, None, error_info  # 失败时返回错误信息 
\ No newline at end of file
+        f.write(code_content)
+
+    # 在执行器进程中执行代码并细分（相同代码命中细分缓存时无需执行）
+    with open(file_name, "r", encoding='utf-8') as f:
+        code_to_execute = f.read()
+
+    # 执行前静态检查，发现的问题直接作为错误信息进入重试
+    error_info = check_generated_code(code_to_execute, "cadquery")
+    if error_info:
+        print(f"Static check rejected generated code: {error_info['message']}")
+        return id, None, error_info
+
+    on_progress = None
+    if progress_callback:
+        progress_callback("executing", {"object_id": id})
+        on_progress = lambda stage: progress_callback(stage, {"object_id": id})
+
+    tessellation, error_info = tessellate_code(code_to_execute, on_progress=on_progress, artifact_id=id,
+                                               cancel_event=cancel_event, **get_quality_params(quality))
+    if cancel_event and cancel_event.is_set():
+        raise CompletionCancelled("Generation cancelled during execution")
+
+    # 只缓存执行成功且可以细分的代码
+    if not error_info and tessellation[0] and tessellation[1]:
+        if use_cache:
+            completion_cache.put(cache_key, model, code_content)
+
+    return id, tessellation, error_info  # 成功时错误信息为None，失败时细分结果为None
@@ -0,0 +1,199 @@
+"""
+生成代码静态检查
+在执行之前解析代码的语法树，检查输出变量、导入的模块、危险调用和API名称，
+发现问题时直接返回精确到行的错误信息进入重试，不必等待执行（可能需要数秒的OCC计算）后才发现
+
+API名称（模块属性和类的方法名）在执行器进程中收集一次后缓存；收集失败时同样缓存失败结果，之后跳过API名称检查
+"""
+
+import ast
+import threading
+from typing import Any, Dict, List, Optional, Set
+
+from app.config import CodeCheckConfig
+from executor import executor_pool
+
+# Python内置类型的方法（列表、字符串等在生成代码中也会被调用）
+_BUILTIN_METHODS = {
+    name
+    for builtin_type in (str, list, dict, tuple, set, int, float, range)
+    for name in dir(builtin_type) if not name.startswith("_")
+}
+
+_api_surface: Optional[Dict[str, Any]] = None
+# 收集失败后不再重试，避免每次检查都向执行器提交任务
+_api_surface_failed = False
+_api_surface_lock = threading.Lock()
+
+def get_api_surface() -> Optional[Dict[str, Any]]:
+    """
+    获取 CodeCheckConfig.API_SURFACE_MODULES 的API名称（首次调用时在执行器进程中收集）
+
+    Returns:
+        {"modules": {模块名: 属性名集合}, "methods": 方法名集合}，收集失败时（包括之前已失败）返回None
+    """
+    global _api_surface, _api_surface_failed
+    with _api_surface_lock:
+        if _api_surface is None and not _api_surface_failed:
+            surface, error_info = executor_pool.submit("api_surface", list(CodeCheckConfig.API_SURFACE_MODULES))
+            if error_info:
+                print(f"Failed to collect API surface, skipping API name checks: "
+                      f"{error_info['type']}: {error_info['message']}")
+                _api_surface_failed = True
+                return None
+            _api_surface = {
+                "modules": {name: set(attrs) for name, attrs in surface["modules"].items()},
+                "methods": set(surface["methods"]),
+            }
+        return _api_surface
+
+class _CodeChecker(ast.NodeVisitor):
+    """收集代码中的问题（行号, 说明）"""
+
+    def __init__(self, generator: str, surface: Optional[Dict[str, Any]], local_functions: Set[str]):
+        self.allowed_imports = set(CodeCheckConfig.ALLOWED_IMPORTS.get(generator, []))
+        # 变量名 -> 模块名
+        self.module_aliases: Dict[str, str] = dict(CodeCheckConfig.PREDEFINED_MODULES.get(generator, {}))
+        self.surface = surface
+        # 代码自己定义的函数和方法
+        self.local_functions = local_functions
+        self.issues: List[tuple] = []
+
+    def report(self, node: ast.AST, message: str):
+        self.issues.append((getattr(node, "lineno", 0), message))
+
+    def _check_module(self, node: ast.AST, module_name: str) -> bool:
+        root = module_name.split(".")[0]
+        if root not in self.allowed_imports:
+            allowed = ", ".join(sorted(self.allowed_imports))
+            self.report(node, f"不允许导入模块 {module_name}（只能导入: {allowed}）")
+            return False
+        return True
+
+    def _module_attrs(self, module_name: str) -> Optional[Set[str]]:
+        if not self.surface:
+            return None
+        return self.surface["modules"].get(module_name)
+
+    def visit_Import(self, node: ast.Import):
+        for alias in node.names:
+            if not self._check_module(node, alias.name):
+                continue
+            if alias.asname:
+                self.module_aliases[alias.asname] = alias.name
+            else:
+                root = alias.name.split(".")[0]
+                self.module_aliases[root] = root
+
+    def visit_ImportFrom(self, node: ast.ImportFrom):
+        if node.level or not node.module:
+            self.report(node, "不允许使用相对导入")
+            return
+        if not self._check_module(node, node.module):
+            return
+        attrs = self._module_attrs(node.module)
+        for alias in node.names:
+            if alias.name == "*":
+                self.report(node, f"不要使用 from {node.module} import *，请显式导入需要的名称")
+                continue
+            submodule = f"{node.module}.{alias.name}"
+            if self._module_attrs(submodule) is not None:
+                self.module_aliases[alias.asname or alias.name] = submodule
+            elif attrs is not None and alias.name not in attrs:
+                self.report(node, f"模块 {node.module} 中没有 {alias.name}")
+
+    def visit_Call(self, node: ast.Call):
+        func = node.func
+        if isinstance(func, ast.Name):
+            if func.id in CodeCheckConfig.DISPLAY_CALLS:
+                self.report(node, f"不要调用 {func.id}() 等显示函数，只需把最终对象赋值给输出变量")
+            elif func.id in CodeCheckConfig.FORBIDDEN_CALLS:
+                self.report(node, f"不允许调用 {func.id}()")
+        elif isinstance(func, ast.Attribute) and not self._is_module(func.value):
+            # 模块属性在 visit_Attribute 中检查，这里检查对象的方法调用
+            if self.surface and func.attr not in self.local_functions and func.attr not in _BUILTIN_METHODS \
+                    and func.attr not in self.surface["methods"] and not func.attr.startswith("__"):
+                self.report(node, f"未知的方法 .{func.attr}()，不在可用的API中")
+        self.generic_visit(node)
+
+    def _is_module(self, node: ast.AST) -> bool:
+        return isinstance(node, ast.Name) and node.id in self.module_aliases
+
+    def visit_Attribute(self, node: ast.Attribute):
+        if node.attr.startswith("__"):
+            self.report(node, f"不允许访问双下划线属性 {node.attr}")
+        elif self._is_module(node.value):
+            module_name = self.module_aliases[node.value.id]
+            attrs = self._module_attrs(module_name)
+            if attrs is not None and node.attr not in attrs \
+                    and self._module_attrs(f"{module_name}.{node.attr}") is None:
+                self.report(node, f"模块 {node.value.id}（{module_name}）中没有 {node.attr}")
+        self.generic_visit(node)
+
+    def visit_Name(self, node: ast.Name):
+        if node.id.startswith("__"):
+            self.report(node, f"不允许使用名称 {node.id}")
+
+def _assigns_name(tree: ast.Module, name: str) -> bool:
+    """模块作用域（不含函数和类的内部）中是否为 name 赋值"""
+    pending = list(tree.body)
+    while pending:
+        node = pending.pop()
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Lambda)):
+            continue
+        if isinstance(node, ast.Name) and node.id == name and isinstance(node.ctx, ast.Store):
+            return True
+        pending.extend(ast.iter_child_nodes(node))
+    return False
+
+def find_code_issues(code: str, generator: str, surface: Optional[Dict[str, Any]] = None) -> List[str]:
+    """
+    静态检查生成的代码
+
+    Args:
+        code: 清理后的生成代码
+        generator: "cadquery" 或 "schemdraw"
+        surface: get_api_surface() 的结果，None 表示不检查API名称
+
+    Returns:
+        问题说明列表（按行号排序），没有问题时为空列表
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        return [f"第{e.lineno}行: 语法错误: {e.msg}"]
+
+    local_functions = {
+        node.name for node in ast.walk(tree) if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))
+    }
+    checker = _CodeChecker(generator, surface, local_functions)
+    checker.visit(tree)
+
+    issues = sorted(set(checker.issues))
+    output_variable = CodeCheckConfig.OUTPUT_VARIABLES.get(generator)
+    if output_variable and not _assigns_name(tree, output_variable):
+        issues.append((0, f"代码没有定义输出变量 '{output_variable}'，最终对象必须赋值给 {output_variable}"))
+    return [f"第{line}行: {message}" if line else message for line, message in issues]
+
+def check_generated_code(code: str, generator: str) -> Optional[Dict[str, Any]]:
+    """
+    执行前检查生成的代码
+
+    Returns:
+        错误信息（与执行器的格式一致，包含 type、message、traceback），没有问题或检查关闭时返回None
+    """
+    if not CodeCheckConfig.ENABLED:
+        return None
+    surface = get_api_surface() if CodeCheckConfig.CHECK_API_SURFACE else None
+    issues = find_code_issues(code, generator, surface)
+    if not issues:
+        return None
+
+    reported = issues[:CodeCheckConfig.MAX_REPORTED_ISSUES]
+    if len(issues) > len(reported):
+        reported.append(f"……另有{len(issues) - len(reported)}处问题")
+    return {
+        "type": "CodeCheckError",
+        "message": "; ".join(reported),
+        "traceback": "Static check failed before execution:\n" + "\n".join(reported)
+    }
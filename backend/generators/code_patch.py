@@ -0,0 +1,159 @@
+"""
+代码补丁
+多轮对话的后续修改中，模型只返回针对当前代码的修改而不是完整程序，由后端应用补丁。
+支持两种格式:
+
+    编辑块（推荐，提示词中要求的格式）
+        <<<<<<< SEARCH
+        当前代码中需要替换的连续行（原样照抄）
+        =======
+        替换后的行
+        >>>>>>> REPLACE
+
+    统一diff（unified diff）
+        每个 @@ 块的上下文行与 "-" 行组成原文，上下文行与 "+" 行组成替换内容，按内容定位（忽略行号）
+
+每处原文必须在代码中唯一出现；完全匹配失败时忽略行尾空白再匹配一次
+"""
+
+import ast
+import re
+from typing import List, Tuple
+
+SEARCH_MARKER = re.compile(r"^<{5,9} ?SEARCH\s*$")
+DIVIDER_MARKER = re.compile(r"^={5,9}\s*$")
+REPLACE_MARKER = re.compile(r"^>{5,9} ?REPLACE\s*$")
+
+# (原文, 替换内容)
+Edit = Tuple[str, str]
+
+class CodePatchError(ValueError):
+    """补丁格式无效或无法应用到当前代码"""
+
+def parse_edit_blocks(patch_text: str) -> List[Edit]:
+    """解析 SEARCH/REPLACE 编辑块"""
+    edits = []
+    lines = patch_text.splitlines()
+    index = 0
+    while index < len(lines):
+        if not SEARCH_MARKER.match(lines[index]):
+            index += 1
+            continue
+
+        search, replace = [], []
+        target = search
+        index += 1
+        while index < len(lines) and not REPLACE_MARKER.match(lines[index]):
+            if target is search and DIVIDER_MARKER.match(lines[index]):
+                target = replace
+            else:
+                target.append(lines[index])
+            index += 1
+        if index == len(lines) or target is search:
+            raise CodePatchError("编辑块不完整")
+        edits.append(("\n".join(search), "\n".join(replace)))
+        index += 1
+    return edits
+
+def _diff_hunk(search: List[str], replace: List[str]) -> Edit:
+    """块末尾的空上下文行（常见于代码块结束标记之前）不参与定位"""
+    while search and replace and not search[-1] and not replace[-1]:
+        search, replace = search[:-1], replace[:-1]
+    return "\n".join(search), "\n".join(replace)
+
+def parse_unified_diff(patch_text: str) -> List[Edit]:
+    """将统一diff的每个块解析为 (原文, 替换内容)"""
+    edits = []
+    search, replace = None, None
+    for line in patch_text.splitlines():
+        if line.startswith("@@"):
+            if search is not None:
+                edits.append(_diff_hunk(search, replace))
+            search, replace = [], []
+        elif search is None or line.startswith(("--- ", "+++ ", "\\ ")):
+            continue
+        elif line.startswith("-"):
+            search.append(line[1:])
+        elif line.startswith("+"):
+            replace.append(line[1:])
+        elif line.startswith(" ") or not line:
+            # 上下文行（空行视为空的上下文行）
+            search.append(line[1:])
+            replace.append(line[1:])
+        else:
+            # 没有前缀的行（如diff之后的说明文字）结束当前块
+            edits.append(_diff_hunk(search, replace))
+            search, replace = None, None
+    if search is not None:
+        edits.append(_diff_hunk(search, replace))
+    return edits
+
+def strip_code_fences(patch_text: str) -> str:
+    """去掉模型常用来包裹补丁的 Markdown 代码块标记（```diff ... ```）"""
+    return "\n".join(line for line in patch_text.splitlines() if not line.lstrip().startswith("```"))
+
+def parse_code_patch(patch_text: str) -> List[Edit]:
+    """解析模型返回的补丁（可以包裹在代码块中），两种格式都不匹配时返回空列表"""
+    patch_text = strip_code_fences(patch_text)
+    if any(SEARCH_MARKER.match(line) for line in patch_text.splitlines()):
+        return parse_edit_blocks(patch_text)
+    if any(line.startswith("@@") for line in patch_text.splitlines()):
+        return parse_unified_diff(patch_text)
+    return []
+
+def _find_unique(code: str, search: str) -> Tuple[int, int]:
+    """定位原文在代码中的唯一位置 (起始, 结束)，找不到或出现多次时抛出 CodePatchError"""
+    count = code.count(search)
+    if count == 1:
+        start = code.index(search)
+        return start, start + len(search)
+    if count > 1:
+        raise CodePatchError(f"补丁原文在代码中出现了{count}次: {search.splitlines()[0]!r}")
+
+    # 忽略行尾空白按行匹配
+    code_lines = code.split("\n")
+    search_lines = [line.rstrip() for line in search.split("\n")]
+    stripped = [line.rstrip() for line in code_lines]
+    matches = [
+        i for i in range(len(code_lines) - len(search_lines) + 1)
+        if stripped[i:i + len(search_lines)] == search_lines
+    ]
+    if len(matches) != 1:
+        reason = "找不到" if not matches else f"出现了{len(matches)}次"
+        raise CodePatchError(f"补丁原文在代码中{reason}: {search_lines[0]!r}")
+    start = sum(len(line) + 1 for line in code_lines[:matches[0]])
+    end = start + sum(len(line) + 1 for line in code_lines[matches[0]:matches[0] + len(search_lines)]) - 1
+    return start, end
+
+def apply_code_patch(code: str, patch_text: str) -> Tuple[str, int]:
+    """
+    将补丁应用到代码并检查结果
+
+    Args:
+        code: 当前代码
+        patch_text: 模型返回的补丁（编辑块或统一diff）
+
+    Returns:
+        (修改后的代码, 应用的修改数量)
+
+    Raises:
+        CodePatchError: 没有可识别的修改、原文无法唯一定位、结果未改变代码或存在语法错误
+    """
+    edits = parse_code_patch(patch_text)
+    if not edits:
+        raise CodePatchError("回复中没有可识别的修改")
+
+    patched = code
+    for search, replace in edits:
+        if not search.strip():
+            raise CodePatchError("补丁原文不能为空")
+        start, end = _find_unique(patched, search)
+        patched = patched[:start] + replace + patched[end:]
+
+    if patched == code:
+        raise CodePatchError("补丁没有修改代码")
+    try:
+        ast.parse(patched)
+    except SyntaxError as e:
+        raise CodePatchError(f"应用补丁后代码存在语法错误: {e}") from e
+    return patched, len(edits)
@@ -3,27 +3,30 @@ Schemdraw 2D电路图代码生成器
 专门用于生成schemdraw代码并执行
 """
 
-import matplotlib
-matplotlib.use('Agg')  # 使用非GUI后端，避免线程警告
-
-import schemdraw
-import schemdraw.elements as elm
-import os
-import openai
-from datetime import datetime
+import threading
 from dotenv import load_dotenv
-from typing import List, Dict, Any
-import traceback
+from functools import lru_cache
+from typing import List, Dict, Any, Optional
+
+from app.config import PathUtils
+from ai.llm_client import SchemdrawLLMClient
+from ai.completion_cache import completion_cache, make_completion_key
+from executor import executor_pool
+from utils import generate_id
+from .code_checker import check_generated_code
+from .streaming import request_completion, get_cached_completion, CompletionCancelled, ProgressCallback
 
 load_dotenv()
 
-# Schemdraw代码生成客户端
-schemdraw_client = openai.OpenAI(
-    api_key=os.environ["SILICONFLOW_API_KEY"],
-    base_url="https://api.siliconflow.cn/v1",
-)
+@lru_cache(maxsize=None)
+def get_schemdraw_client():
+    """获取Schemdraw代码生成客户端（所有客户端共享连接池与限流）"""
+    return SchemdrawLLMClient()
 
-def generate_schemdraw_code(user_msg: str, conversation_history: List[Dict[str, str]] = None, error_message: str = None):
+def generate_schemdraw_code(user_msg: str, conversation_history: List[Dict[str, str]] = None, error_message: str = None,
+                            progress_callback: Optional[ProgressCallback] = None,
+                            temperature: Optional[float] = None, use_cache: bool = True,
+                            cancel_event: Optional[threading.Event] = None):
     """
     生成schemdraw代码用于2D电路图绘制
     """
@@ -136,73 +139,76 @@ Respond ONLY with Python code. Do not include explanations, markdown formatting,
     if conversation_history:
         messages.extend(conversation_history)
     
-    # 如果有错误信息，添加错误重试消息
+    # 添加本轮请求（历史中不包含本轮请求），重试时附带错误信息
     if error_message:
         error_prompt = f"上面的代码执行时出现了错误：\n{error_message}\n\n请修复代码中的问题并重新生成完整的schemdraw代码。"
-        if conversation_history:
-            messages.append({"role": "user", "content": error_prompt})
-        else:
-            messages.append({"role": "user", "content": f"{user_msg}\n\n{error_prompt}"})
+        messages.append({"role": "user", "content": f"{user_msg}\n\n{error_prompt}"})
     else:
-        if not conversation_history:
-            messages.append({"role": "user", "content": user_msg})
+        messages.append({"role": "user", "content": user_msg})
+
+    llm_client = get_schemdraw_client()
+    model = llm_client.model
+
+    cache_key = make_completion_key(model, user_msg, messages, error_message)
+    code_content = get_cached_completion(cache_key, use_cache, progress_callback)
+    if code_content is None:
+        # 调用大模型
+        response_content = request_completion(
+            llm_client,
+            messages,
+            progress_callback,
+            temperature,
+            cancel_event
+        )
+        code_content = clean_schemdraw_code(response_content)
+
+    if cancel_event and cancel_event.is_set():
+        raise CompletionCancelled("Generation cancelled before execution")
+
+    id = generate_id()
+
+    # 生成文件存放在对象的分片目录中
+    PathUtils.ensure_object_dir(id)
+    file_name = PathUtils.get_generated_file_path(id)
     
-    # 调用大模型
-    response = schemdraw_client.chat.completions.create(
-        model="Qwen/Qwen2.5-72B-Instruct-128K",
-        messages=messages,
-    )
+    with open(file_name, "w", encoding='utf-8') as f:
+        f.write(code_content)
 
-    id = datetime.now().isoformat().replace(":", "-")
+    # 在执行器进程中执行代码并生成SVG（schemdraw与matplotlib只在工作进程中加载）
+    with open(file_name, "r", encoding='utf-8') as f:
+        code_to_execute = f.read()
 
-    # 创建data/generated目录
-    if not os.path.exists("data/generated"):
-        os.makedirs("data/generated")
+    # 执行前静态检查，发现的问题直接作为错误信息进入重试
+    error_info = check_generated_code(code_to_execute, "schemdraw")
+    if error_info:
+        print(f"Static check rejected generated code: {error_info['message']}")
+        return id, None, error_info
 
-    file_name = f"data/generated/{id}.py"
-    code_content = clean_schemdraw_code(response.choices[0].message.content)
-    
-    with open(file_name, "w", encoding='utf-8') as f:
-        f.write(code_content)
+    on_progress = None
+    if progress_callback:
+        progress_callback("executing", {"object_id": id})
+        on_progress = lambda stage: progress_callback(stage, {"object_id": id})
 
-    # 尝试执行代码
-    try:
-        with open(file_name, "r", encoding='utf-8') as f:
-            code_to_execute = f.read()
-        
-        # 创建执行环境
-        exec_globals = {
-            'schemdraw': schemdraw,
-            'elm': elm
-        }
-        exec(code_to_execute, exec_globals)
-        
-        if 'd' not in exec_globals:
-            raise ValueError("Generated code does not define 'd' variable (schemdraw Drawing object)")
-        
-        # 生成SVG
-        drawing = exec_globals['d']
-        svg_content = drawing.get_imagedata('svg')
-        
-        # 保存SVG
-        svg_path = f"data/generated/{id}.svg"
-        with open(svg_path, 'wb') as f:
-            f.write(svg_content)
-
-        svg_string = svg_content.decode('utf-8')
-        svg_cleaned_string = svg_string.replace('\n', ' ').replace('\r', ' ')
-
-        return id, svg_cleaned_string, None
-        
-    except Exception as e:
-        # 收集详细的错误信息
-        error_info = {
-            "type": type(e).__name__,
-            "message": str(e),
-            "traceback": traceback.format_exc()
-        }
+    svg_content, error_info = executor_pool.submit("schemdraw", code_to_execute, on_progress=on_progress,
+                                                   cancel_event=cancel_event)
+    if cancel_event and cancel_event.is_set():
+        raise CompletionCancelled("Generation cancelled during execution")
+    if error_info:
         return id, None, error_info
 
+    if use_cache:
+        completion_cache.put(cache_key, model, code_content)
+
+    # 保存SVG
+    svg_path = PathUtils.get_svg_file_path(id)
+    with open(svg_path, 'wb') as f:
+        f.write(svg_content)
+
+    svg_string = svg_content.decode('utf-8')
+    svg_cleaned_string = svg_string.replace('\n', ' ').replace('\r', ' ')
+
+    return id, svg_cleaned_string, None
+
 def clean_schemdraw_code(code_text: str) -> str:
     """清理schemdraw代码，移除 Markdown 格式标记"""
     lines = code_text.split('\n')
@@ -0,0 +1,81 @@
+"""
+大模型流式输出
+以流式方式请求代码补全，边接收边推送token和 # Plan: 注释行；补全缓存命中时跳过请求
+"""
+
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from ai.completion_cache import completion_cache
+
+# 进度回调: (事件名, 事件数据)
+ProgressCallback = Callable[[str, Dict[str, Any]], None]
+
+class CompletionCancelled(Exception):
+    """补全请求在完成前被取消（例如并行候选中已有其他候选成功）"""
+
+def get_cached_completion(cache_key: str, use_cache: bool,
+                          progress_callback: Optional[ProgressCallback] = None) -> Optional[str]:
+    """
+    相同请求已有执行成功的代码时直接复用，跳过大模型调用
+    并行候选中使用不同温度的候选不读写缓存（use_cache=False）
+    """
+    code_content = completion_cache.get(cache_key) if use_cache else None
+    if code_content is not None:
+        print(f"Completion cache hit: {cache_key[:12]}")
+        if progress_callback:
+            progress_callback("cache_hit", {"key": cache_key[:12]})
+    return code_content
+
+def request_completion(llm_client, messages: List[Dict[str, str]],
+                       progress_callback: Optional[ProgressCallback] = None,
+                       temperature: Optional[float] = None,
+                       cancel_event: Optional[threading.Event] = None) -> str:
+    """
+    通过 LLMClient 请求代码补全
+
+    未提供 progress_callback 和 cancel_event 时与普通调用一致；否则使用 stream=True，
+    每收到一段内容推送 "token" 事件，开头注释块中的每一行完整接收后推送 "plan" 事件，
+    cancel_event 被设置时停止接收并抛出 CompletionCancelled
+
+    Returns:
+        模型返回的完整内容
+    """
+    options = {} if temperature is None else {"temperature": temperature}
+
+    if not progress_callback and not cancel_event:
+        return llm_client.chat_completion(messages, **options)
+
+    stream = llm_client.create(messages, stream=True, **options)
+
+    parts = []
+    line_buffer = ""
+    in_plan = True
+    for chunk in stream:
+        if cancel_event and cancel_event.is_set():
+            close = getattr(stream, "close", None)
+            if close:
+                close()
+            raise CompletionCancelled("Completion cancelled")
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content or ""
+        if not delta:
+            continue
+
+        parts.append(delta)
+        if not progress_callback:
+            continue
+        progress_callback("token", {"text": delta})
+
+        # 按行检查开头的注释块（模型的思考计划）
+        line_buffer += delta
+        while in_plan and "\n" in line_buffer:
+            line, line_buffer = line_buffer.split("\n", 1)
+            stripped = line.strip()
+            if stripped.startswith("#"):
+                progress_callback("plan", {"line": stripped})
+            elif stripped and not stripped.startswith("```"):
+                in_plan = False
+
+    return "".join(parts)
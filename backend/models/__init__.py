@@ -4,7 +4,25 @@
 """
 
 from .conversation import ConversationManager
+from .conversation_store import (
+    ConversationStore,
+    JSONConversationStore,
+    SQLiteConversationStore,
+    create_conversation_store,
+    get_conversation_store
+)
+from .query_index import QueryIndex, query_index
+from .search_index import ConversationSearchIndex, search_index
 
 __all__ = [
-    'ConversationManager'
+    'ConversationManager',
+    'ConversationStore',
+    'JSONConversationStore',
+    'SQLiteConversationStore',
+    'create_conversation_store',
+    'get_conversation_store',
+    'QueryIndex',
+    'query_index',
+    'ConversationSearchIndex',
+    'search_index'
 ] 
\ No newline at end of file
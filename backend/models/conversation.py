@@ -3,37 +3,39 @@
 处理对话历史、错误重试等功能
 """
 
-import json
 import os
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 
+from app.config import AIConfig, PathUtils, TessellationConfig
+from utils.id_utils import generate_id
+from utils.token_utils import estimate_message_tokens
+from .conversation_store import ConversationStore, get_conversation_store
+from .query_index import QueryIndex, query_index
+
 class ConversationManager:
-    def __init__(self, conversations_dir: str = "data/conversations"):
-        self.conversations_dir = conversations_dir
-        if not os.path.exists(conversations_dir):
-            os.makedirs(conversations_dir)
+    def __init__(self, store: Optional[ConversationStore] = None):
+        self._store = store
+
+    @property
+    def store(self) -> ConversationStore:
+        """
+        对话存储：未指定时在首次使用时取共享实例
+
+        各服务在模块导入时创建管理器，此时配置尚未初始化，不能打开存储（应在 create_app/warmup 中打开）；
+        存储后端由 StorageConfig.CONVERSATION_BACKEND 决定，默认所有实例共享同一个
+        """
+        if self._store is None:
+            self._store = get_conversation_store()
+        return self._store
 
     def _load_conversation(self, conversation_id: str) -> Optional[Dict[str, Any]]:
         """加载对话数据"""
-        if not conversation_id:
-            return None
-        file_path = os.path.join(self.conversations_dir, f"{conversation_id}.json")
-        try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return None
-
-    def _save_conversation(self, conversation_id: str, conversation: Dict[str, Any]):
-        """保存对话数据"""
-        file_path = os.path.join(self.conversations_dir, f"{conversation_id}.json")
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(conversation, f, ensure_ascii=False, indent=2)
+        return self.store.load_conversation(conversation_id)
 
     def create_conversation(self, user_query: str) -> str:
         """创建新对话"""
-        conversation_id = datetime.now().isoformat().replace(":", "-")
+        conversation_id = generate_id()
         conversation = {
             "id": conversation_id,
             "created_at": datetime.now().isoformat(),
@@ -41,6 +43,7 @@ class ConversationManager:
                 {
                     "role": "user",
                     "content": user_query,
+                    "tokens": estimate_message_tokens(user_query),
                     "timestamp": datetime.now().isoformat()
                 }
             ],
@@ -49,83 +52,176 @@ class ConversationManager:
             "render_mode": None,
             "error_history": []
         }
-        self._save_conversation(conversation_id, conversation)
+        self.store.create_conversation(conversation)
         return conversation_id
 
     def add_user_message(self, conversation_id: str, user_query: str) -> bool:
         """添加用户消息"""
-        conversation = self._load_conversation(conversation_id)
-        if not conversation:
-            return False
-        conversation["messages"].append({
+        message = {
             "role": "user",
             "content": user_query,
+            "tokens": estimate_message_tokens(user_query),
             "timestamp": datetime.now().isoformat()
-        })
-        self._save_conversation(conversation_id, conversation)
+        }
+        message_index = self.store.append_message(conversation_id, message)
+        if message_index is None:
+            return False
         return True
 
     def add_assistant_message(self, conversation_id: str, code: str, object_id: Optional[str], error_message: Optional[str] = None, render_mode: Optional[str] = None):
-        """添加助手回复"""
-        conversation = self._load_conversation(conversation_id)
-        if not conversation: return False
-
+        """添加助手回复（消息、当前代码和错误历史在存储中一次性更新）"""
         message = {
             "role": "assistant", "timestamp": datetime.now().isoformat(),
             "code": code, "object_id": object_id, "error": error_message,
-            "render_mode": render_mode
+            "render_mode": render_mode, "tokens": estimate_message_tokens(code) if code else 0
         }
-        conversation["messages"].append(message)
 
-        if render_mode: conversation["render_mode"] = render_mode
+        updates = {}
+        error_entry = None
+        if render_mode: updates["render_mode"] = render_mode
         if error_message:
-            conversation["error_history"].append({"timestamp": message["timestamp"], "error": error_message})
+            error_entry = {"timestamp": message["timestamp"], "error": error_message}
         else:
-            conversation["current_code"] = code
-            conversation["current_object_id"] = object_id
+            updates["current_code"] = code
+            updates["current_object_id"] = object_id
+
+        message_index = self.store.append_message(conversation_id, message, updates, error_entry)
+        if message_index is None:
+            return False
 
-        self._save_conversation(conversation_id, conversation)
+        # 首轮查询的第一个成功结果加入相似查询索引
+        if not error_message and object_id:
+            entry = QueryIndex.first_turn_result(self._load_conversation(conversation_id) or {})
+            if entry and entry["message_index"] == message_index:
+                query_index.add(**entry)
         return True
 
-    def get_conversation_history(self, conversation_id: str) -> List[Dict[str, str]]:
-        """获取完整的对话历史用于发送给大模型"""
+    def get_current_code(self, conversation_id: str, render_mode: str) -> Optional[str]:
+        """获取对话最近一次成功生成的代码（对话的渲染模式与 render_mode 不同时返回None）"""
+        conversation = self._load_conversation(conversation_id)
+        if not conversation or conversation.get("render_mode") != render_mode:
+            return None
+        return conversation.get("current_code")
+
+    def get_conversation_history(self, conversation_id: str, token_budget: Optional[int] = None) -> List[Dict[str, str]]:
+        """
+        获取发送给大模型的对话历史（不含本轮查询），总长度控制在token预算内
+
+        始终保留最近一次成功生成的代码；更早的代码已被其取代，直接丢弃。
+        用户需求从最近一轮开始向前保留，超出预算的较早需求合并为一条简短摘要，摘要也放不下时丢弃。
+        每条消息的token数在写入时计算并保存，旧数据缺少时才现场估算
+
+        Args:
+            conversation_id: 对话ID
+            token_budget: token预算（None 表示使用 AIConfig.HISTORY_TOKEN_BUDGET）
+        """
         conversation = self._load_conversation(conversation_id)
         if not conversation: return []
 
+        if token_budget is None:
+            token_budget = AIConfig.HISTORY_TOKEN_BUDGET
+
+        messages = conversation["messages"]
+        latest_code_index = next(
+            (i for i in range(len(messages) - 1, -1, -1)
+             if messages[i]["role"] == "assistant" and messages[i].get("code") and not messages[i].get("error")),
+            None
+        )
+
+        def tokens_of(msg: Dict[str, Any]) -> int:
+            if "tokens" in msg:
+                return msg["tokens"]
+            content = msg.get("code") if msg["role"] == "assistant" else msg.get("content")
+            return estimate_message_tokens(content or "")
+
+        # 最近的成功代码始终保留
+        kept = set()
+        used = 0
+        if latest_code_index is not None:
+            kept.add(latest_code_index)
+            used += tokens_of(messages[latest_code_index])
+
+        # 从最近一轮开始向前保留用户需求
+        user_indices = [i for i, msg in enumerate(messages) if msg["role"] == "user" and msg.get("content")]
+        dropped = []
+        for position in range(len(user_indices) - 1, -1, -1):
+            index = user_indices[position]
+            cost = tokens_of(messages[index])
+            if used + cost > token_budget:
+                dropped = user_indices[:position + 1]
+                break
+            kept.add(index)
+            used += cost
+
         history = []
-        for msg in conversation["messages"]:
+        if dropped:
+            summary = self._summarize_user_turns([messages[i]["content"] for i in dropped], token_budget - used)
+            if summary:
+                history.append({"role": "user", "content": summary})
+
+        for index in sorted(kept):
+            msg = messages[index]
             content = msg.get("code") if msg["role"] == "assistant" else msg.get("content")
-            if content:
-                 history.append({"role": msg["role"], "content": content})
+            if history and history[-1]["role"] == msg["role"]:
+                # 合并相邻的同角色消息，保持用户/助手交替
+                history[-1]["content"] += f"\n\n{content}"
+            else:
+                history.append({"role": msg["role"], "content": content})
         return history
 
+    @staticmethod
+    def _summarize_user_turns(queries: List[str], token_budget: int) -> Optional[str]:
+        """将较早的用户需求压缩为一条摘要，超出预算时从最早的需求开始省略"""
+        item_chars = AIConfig.HISTORY_SUMMARY_ITEM_CHARS
+        items = [query if len(query) <= item_chars else query[:item_chars] + "…" for query in queries]
+        header = "（较早的需求摘要）"
+        while items:
+            summary = header + "\n" + "\n".join(f"- {item}" for item in items)
+            if estimate_message_tokens(summary) <= token_budget:
+                return summary
+            items = items[1:]
+        return None
+
     def get_all_conversations(self) -> List[Dict[str, Any]]:
-        """获取所有对话的摘要信息"""
+        """获取所有有成功结果的对话的摘要信息"""
+        summaries, _ = self.store.list_summaries()
+        return summaries
+
+    def list_conversation_summaries(self, limit: Optional[int] = None, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """
+        分页获取对话摘要（读取存储中增量维护的摘要，不加载对话内容）
+
+        Raises:
+            ValueError: 游标格式无效
+        """
+        summaries, next_cursor = self.store.list_summaries(limit, cursor)
+        return {"conversations": summaries, "next_cursor": next_cursor}
+
+    def get_conversation_summary(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        """获取单个对话的摘要"""
+        return self.store.get_summary(conversation_id)
+
+    def search_conversations(self, query: str, limit: int = 20, offset: int = 0) -> Dict[str, Any]:
+        """
+        全文搜索对话（用户需求与生成的代码），按BM25相关度排序
+
+        Returns:
+            {"conversations": 摘要列表（附带 score）, "total": 匹配总数}
+        """
+        found = self.store.search(query, limit, offset)
         conversations = []
-        if not os.path.exists(self.conversations_dir):
-            return conversations
-
-        files = os.listdir(self.conversations_dir)
-        files.sort(reverse=True)
-
-        for filename in files:
-            if filename.endswith('.json'):
-                conversation = self._load_conversation(filename[:-5])
-                if conversation:
-                    first_user_message = next((msg["content"] for msg in conversation["messages"] if msg["role"] == "user"), "")
-                    assistant_responses = sum(1 for msg in conversation["messages"] if msg["role"] == "assistant" and msg.get("object_id"))
-
-                    # 只添加有成功结果的对话，以匹配前端逻辑
-                    if assistant_responses > 0:
-                        conversations.append({
-                            "id": conversation["id"],
-                            "created_at": conversation["created_at"],
-                            "title": first_user_message[:50] + ("..." if len(first_user_message) > 50 else ""),
-                            "message_count": len(conversation["messages"]),
-                            "assistant_responses": assistant_responses,
-                            "current_object_id": conversation.get("current_object_id")
-                        })
-        return conversations
+        for result in found["results"]:
+            summary = self.get_conversation_summary(result["conversation_id"])
+            if summary:
+                conversations.append(dict(summary, score=result["score"]))
+        return {"conversations": conversations, "total": found["total"]}
+
+    def delete_conversation(self, conversation_id: str) -> bool:
+        """删除对话（生成的对象文件可能被其他对话复用，予以保留）"""
+        deleted = self.store.delete_conversation(conversation_id)
+        if deleted:
+            query_index.remove(conversation_id)
+        return deleted
 
     def get_conversation_detail(self, conversation_id: str) -> Optional[Dict[str, Any]]:
         """获取对话的详细信息，为前端准备格式化的数据"""
@@ -153,22 +249,36 @@ class ConversationManager:
             "current_object_id": conversation.get("current_object_id")
         }
 
-    def get_message_result(self, conversation_id: str, message_index: int) -> Optional[Dict[str, Any]]:
-        """获取特定消息的渲染结果"""
-        conversation = self._load_conversation(conversation_id)
-        if not conversation or message_index >= len(conversation["messages"]):
+    def get_message(self, conversation_id: str, message_index: int) -> Optional[Dict[str, Any]]:
+        """获取对话中的单条原始消息"""
+        if message_index < 0:
+            return None
+        return self.store.get_message(conversation_id, message_index)
+
+    def get_message_result(self, conversation_id: str, message_index: int, mesh_payload: str = "resolved",
+                           quality: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """获取特定消息的渲染结果，mesh_payload 决定3D网格是否保留引用，quality 为3D网格的细分质量"""
+        message = self.get_message(conversation_id, message_index)
+        if not message:
             return None
 
-        message = conversation["messages"][message_index]
         render_mode = message.get("render_mode")
         object_id = message.get("object_id")
 
         if message["role"] != "assistant" or not object_id:
             return {"error": "This message has no associated CAD object."}
 
+        result = self.get_object_result(object_id, render_mode, mesh_payload, quality)
+        if "error" not in result:
+            result["conversation_id"] = conversation_id
+        return result
+
+    def get_object_result(self, object_id: str, render_mode: Optional[str], mesh_payload: str = "resolved",
+                          quality: Optional[str] = None) -> Dict[str, Any]:
+        """根据对象ID读取（必要时以 quality 细分质量重新生成）渲染结果，失败时返回包含 error 的字典"""
         # 重新生成数据
         try:
-            code_file = f"data/generated/{object_id}.py"
+            code_file = PathUtils.get_generated_file_path(object_id)
             if not os.path.exists(code_file):
                 return {"error": "Code file not found"}
 
@@ -177,7 +287,7 @@ class ConversationManager:
 
             # --- Logic for 2D results ---
             if render_mode == "2d":
-                svg_file = f"data/generated/{object_id}.svg"
+                svg_file = PathUtils.get_svg_file_path(object_id)
                 if not os.path.exists(svg_file):
                     return {"error": "SVG file for 2D object not found."}
 
@@ -189,24 +299,25 @@ class ConversationManager:
                     "svg": svg_content,
                     "code": code_content,
                     "render_mode": render_mode,
-                    "conversation_id": conversation_id,
                 }
 
             # --- Logic for 3D results ---
             elif render_mode == "3d":
-                exec_globals = {}
-                exec(code_content, exec_globals)
-
-                if 'obj' not in exec_globals:
-                    return {"error": "No 'obj' variable found in the generated code"}
+                from processors import build_shapes_payload, ensure_mesh_artifact
 
-                from processors.tessellation_processor import tessellate_cad_objects
-                meshed_instances, shapes, _ = tessellate_cad_objects(exec_globals['obj'])
+                # 优先读取持久化的网格产物（内存映射），无需重新执行代码；
+                # 旧对象或新的细分质量没有网格产物：相同代码已细分过时命中缓存，否则在执行器中重新执行，并补写产物
+                quality = quality or TessellationConfig.DEFAULT_QUALITY
+                tessellation, error_info = ensure_mesh_artifact(object_id, quality)
+                if error_info:
+                    return {"error": f"Failed to regenerate result: {error_info['type']}: {error_info['message']}"}
+                meshed_instances, shapes = tessellation
 
                 return {
                     "id": object_id,
-                    "shapes": [shapes, meshed_instances],
-                    "conversation_id": conversation_id,
+                    "shapes": build_shapes_payload(meshed_instances, shapes, mesh_payload),
+                    "mesh_payload": mesh_payload,
+                    "quality": quality,
                     "code": code_content,
                     "render_mode": render_mode
                 }
@@ -0,0 +1,1007 @@
+"""
+对话存储后端
+ConversationManager 通过 ConversationStore 接口读写对话，可选两种实现:
+    json   - 每个对话一个JSON文件（旧格式，每次追加消息都会重写整个文件）
+    sqlite - SQLite(WAL)数据库，消息按行追加，更新在事务中完成
+
+两种实现都在每次写入时增量维护对话摘要（标题、消息数等），
+历史列表按 (created_at, id) 游标分页读取摘要，无需加载对话内容。
+
+最近使用的对话缓存在进程内（ConversationCache），读取时只做一次廉价的版本检查
+（JSON: 文件 inode/mtime/size；SQLite: 消息数），其他 worker 进程写入后版本变化会自动重新加载
+
+全文搜索: SQLite 使用与消息在同一事务中写入的 FTS5 表，多个 worker 进程共享；
+JSON 使用进程内的BM25索引（见 search_index），搜索前根据对话目录的修改时间同步其他 worker 进程的写入
+"""
+
+import base64
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: 没有 fcntl，只保证进程内的写入串行化
+    fcntl = None
+
+from app.config import StorageConfig, StoragePaths
+from .query_index import query_index
+from .search_index import message_text, search_index, tokenize
+
+TITLE_LENGTH = 50
+
+def make_conversation_title(first_query: str) -> str:
+    """由首条用户消息生成对话标题"""
+    return first_query[:TITLE_LENGTH] + ("..." if len(first_query) > TITLE_LENGTH else "")
+
+def summarize_conversation(conversation: Dict[str, Any]) -> Dict[str, Any]:
+    """生成对话摘要（历史列表中显示的信息）"""
+    messages = conversation.get("messages", [])
+    first_user_message = next((msg["content"] for msg in messages if msg["role"] == "user"), "")
+    return {
+        "id": conversation["id"],
+        "created_at": conversation["created_at"],
+        "title": make_conversation_title(first_user_message or ""),
+        "message_count": len(messages),
+        "assistant_responses": sum(1 for msg in messages if msg["role"] == "assistant" and msg.get("object_id")),
+        "current_object_id": conversation.get("current_object_id"),
+    }
+
+def encode_cursor(summary: Dict[str, Any]) -> str:
+    """将一页最后一条摘要编码为游标"""
+    raw = json.dumps([summary["created_at"], summary["id"]], ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """解析游标，返回 (created_at, id)，格式无效时抛出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, conversation_id = json.loads(raw.decode("utf-8"))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(created_at, str) or not isinstance(conversation_id, str):
+        raise ValueError("Invalid cursor")
+    return created_at, conversation_id
+
+class ConversationCache:
+    """
+    热对话缓存（有界LRU，线程安全）
+
+    每个条目带有加载或写入时的版本，读取时版本与存储中的当前版本一致才命中。
+    缓存的对话字典由所有调用方共享，只读；写入时以新字典替换（写时复制），
+    正在使用旧字典的读者不受影响
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Hashable, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, conversation_id: str, version: Hashable) -> Optional[Dict[str, Any]]:
+        """版本一致时返回缓存的对话"""
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is None or entry[0] != version:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(conversation_id)
+            self._hits += 1
+            return entry[1]
+
+    def version(self, conversation_id: str) -> Optional[Hashable]:
+        """获取缓存条目的版本（不计入命中统计）"""
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            return entry[0] if entry else None
+
+    def put(self, conversation_id: str, version: Hashable, conversation: Dict[str, Any]):
+        """写入或替换缓存条目"""
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[conversation_id] = (version, conversation)
+            self._entries.move_to_end(conversation_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def advance(self, conversation_id: str, old_version: Hashable, new_version: Hashable,
+                update: Callable[[Dict[str, Any]], Dict[str, Any]]):
+        """条目版本为 old_version 时用 update 生成新对话并更新到 new_version，否则移除条目"""
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is None:
+                return
+            if entry[0] != old_version:
+                del self._entries[conversation_id]
+                return
+            self._entries[conversation_id] = (new_version, update(entry[1]))
+
+    def pop(self, conversation_id: str):
+        """移除缓存条目"""
+        with self._lock:
+            self._entries.pop(conversation_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+            }
+
+def apply_append(conversation: Dict[str, Any], message: Dict[str, Any],
+                 updates: Optional[Dict[str, Any]] = None,
+                 error_entry: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """返回追加消息后的新对话字典（不修改原字典）"""
+    updated = dict(conversation)
+    updated["messages"] = conversation["messages"] + [message]
+    updated.update(updates or {})
+    if error_entry:
+        updated["error_history"] = conversation.get("error_history", []) + [error_entry]
+    return updated
+
+class ConversationStore(ABC):
+    """
+    对话存储接口，对话以与旧JSON文件相同结构的字典表示
+
+    load_conversation 返回的字典可能来自共享缓存，调用方不应修改
+    """
+
+    _cache: ConversationCache
+
+    @abstractmethod
+    def create_conversation(self, conversation: Dict[str, Any]) -> None:
+        """保存一个新对话（包含初始消息）"""
+
+    @abstractmethod
+    def load_conversation(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        """加载完整对话，不存在时返回None"""
+
+    @abstractmethod
+    def append_message(self, conversation_id: str, message: Dict[str, Any],
+                       updates: Optional[Dict[str, Any]] = None,
+                       error_entry: Optional[Dict[str, Any]] = None) -> Optional[int]:
+        """
+        追加一条消息，并在同一次写入中更新对话字段和错误历史
+
+        Args:
+            conversation_id: 对话ID
+            message: 消息字典
+            updates: 需要更新的对话字段（current_code、current_object_id、render_mode）
+            error_entry: 需要追加到 error_history 的条目
+
+        Returns:
+            新消息的索引，对话不存在时返回None
+        """
+
+    @abstractmethod
+    def get_message(self, conversation_id: str, message_index: int) -> Optional[Dict[str, Any]]:
+        """获取单条消息，不存在时返回None"""
+
+    @abstractmethod
+    def iter_conversations(self) -> Iterator[Dict[str, Any]]:
+        """按创建时间从新到旧遍历所有对话"""
+
+    @abstractmethod
+    def delete_conversation(self, conversation_id: str) -> bool:
+        """删除对话，返回是否删除成功"""
+
+    @abstractmethod
+    def get_summary(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        """获取单个对话的摘要，不存在时返回None"""
+
+    @abstractmethod
+    def list_summaries(self, limit: Optional[int] = None,
+                       cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        按创建时间从新到旧分页列出有成功结果的对话摘要
+
+        Args:
+            limit: 每页数量（None 表示不分页）
+            cursor: 上一页返回的游标（None 表示第一页）
+
+        Returns:
+            (摘要列表, 下一页游标)，没有更多数据时游标为None
+        """
+
+    def import_conversation(self, conversation: Dict[str, Any]) -> bool:
+        """导入一个完整对话（用于迁移），对话已存在时跳过并返回False"""
+        if self.load_conversation(conversation["id"]):
+            return False
+        self.create_conversation(conversation)
+        return True
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """获取热对话缓存的统计信息"""
+        return self._cache.stats()
+
+    @abstractmethod
+    def data_version(self) -> Hashable:
+        """廉价的存储版本：任何 worker 进程创建、追加或删除对话后都会变化，用于刷新进程内的索引"""
+
+    @abstractmethod
+    def list_changes(self, since: Optional[Hashable] = None) -> Tuple[Dict[str, Optional[Dict[str, Any]]], Hashable]:
+        """
+        列出游标之后创建、追加消息或删除的对话（用于增量同步进程内的索引）
+
+        Args:
+            since: 上次调用返回的游标（None 表示列出所有现有对话）
+
+        Returns:
+            ({对话ID: 摘要，已删除的对话为None}, 新游标)
+        """
+
+    def prepare_indexes(self) -> None:
+        """预先构建进程内的索引（启动预热时调用，避免第一个请求承担构建开销）"""
+        query_index.refresh()
+
+    def search(self, query: str, limit: int = 20, offset: int = 0) -> Dict[str, Any]:
+        """
+        全文搜索对话（用户需求与成功生成的代码）
+
+        Returns:
+            {"results": [{"conversation_id", "score"}], "total": 匹配的对话总数}
+        """
+        return search_index.search(query, limit, offset)
+
+    def search_stats(self) -> Dict[str, Any]:
+        """获取全文搜索索引的统计信息"""
+        return search_index.stats()
+
+class JSONConversationStore(ConversationStore):
+    """
+    每个对话一个JSON文件的存储（旧格式）
+
+    写入先写临时文件再原子重命名，读者永远不会读到写了一半的文件；
+    多个 worker 进程之间通过目录中的咨询锁文件（fcntl.flock）串行化写入。
+    文件的 (inode, mtime, size) 作为版本，重命名后 inode 必然变化
+    """
+
+    SUMMARY_INDEX_FILE = ".summaries"
+    LOCK_FILE = ".lock"
+
+    def __init__(self, conversations_dir: str, cache_size: Optional[int] = None):
+        self.conversations_dir = conversations_dir
+        self._lock = threading.Lock()
+        self._cache = ConversationCache(StorageConfig.CONVERSATION_CACHE_SIZE if cache_size is None else cache_size)
+        # 对话ID -> {"mtime": 文件修改时间, "summary": 摘要}，首次列出时构建
+        self._summaries: Optional[Dict[str, Dict[str, Any]]] = None
+        # 上次构建或刷新摘要时对话目录的修改时间
+        self._summaries_version: Optional[int] = None
+        # 上次同步全文搜索索引时的摘要版本
+        self._search_version: Optional[int] = None
+        # 对话ID -> 摘要最后一次变化（新建、更新或删除）时的序号，按序号递增排列，供 list_changes 增量列出
+        self._changed_at: Dict[str, int] = {}
+        self._change_seq = 0
+        os.makedirs(conversations_dir, exist_ok=True)
+
+    def _file_path(self, conversation_id: str) -> str:
+        return os.path.join(self.conversations_dir, f"{conversation_id}.json")
+
+    @staticmethod
+    def _version(stat: os.stat_result) -> Tuple[int, int, int]:
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _write_lock(self):
+        """获取写锁：进程内线程锁 + 跨进程的文件锁"""
+        return _FileLock(self._lock, os.path.join(self.conversations_dir, self.LOCK_FILE))
+
+    def _save(self, conversation: Dict[str, Any]):
+        """原子写入对话文件并更新缓存和摘要（调用方持有写锁）"""
+        file_path = self._file_path(conversation["id"])
+        fd, temp_path = tempfile.mkstemp(dir=self.conversations_dir, prefix=".tmp-", suffix=".part")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(conversation, f, ensure_ascii=False, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, file_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        stat = os.stat(file_path)
+        self._cache.put(conversation["id"], self._version(stat), conversation)
+        if self._summaries is not None:
+            self._summaries[conversation["id"]] = {
+                "mtime": stat.st_mtime_ns,
+                "summary": summarize_conversation(conversation),
+            }
+            self._mark_changed(conversation["id"])
+
+    def _mark_changed(self, conversation_id: str):
+        """记录对话摘要的变化（调用方持有锁）"""
+        self._change_seq += 1
+        self._changed_at.pop(conversation_id, None)
+        self._changed_at[conversation_id] = self._change_seq
+
+    def _read(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        """从文件读取对话并放入缓存（版本取自实际读取的文件）"""
+        try:
+            with open(self._file_path(conversation_id), "r", encoding="utf-8") as f:
+                version = self._version(os.fstat(f.fileno()))
+                conversation = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self._cache.pop(conversation_id)
+            return None
+        self._cache.put(conversation_id, version, conversation)
+        return conversation
+
+    def create_conversation(self, conversation: Dict[str, Any]) -> None:
+        with self._write_lock():
+            self._save(conversation)
+        for index, message in enumerate(conversation.get("messages", [])):
+            search_index.add_message(conversation["id"], index, message)
+
+    def load_conversation(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        if not conversation_id:
+            return None
+        try:
+            version = self._version(os.stat(self._file_path(conversation_id)))
+        except FileNotFoundError:
+            self._cache.pop(conversation_id)
+            return None
+        cached = self._cache.get(conversation_id, version)
+        if cached is not None:
+            return cached
+        return self._read(conversation_id)
+
+    def append_message(self, conversation_id, message, updates=None, error_entry=None):
+        with self._write_lock():
+            # 持有跨进程写锁时，缓存版本与文件一致即可直接使用缓存，无需重新读取
+            conversation = self.load_conversation(conversation_id)
+            if not conversation:
+                return None
+            self._save(apply_append(conversation, message, updates, error_entry))
+            message_index = len(conversation["messages"])
+        search_index.add_message(conversation_id, message_index, message)
+        return message_index
+
+    def get_message(self, conversation_id, message_index):
+        conversation = self.load_conversation(conversation_id)
+        if not conversation or not 0 <= message_index < len(conversation["messages"]):
+            return None
+        return conversation["messages"][message_index]
+
+    def iter_conversations(self):
+        if not os.path.exists(self.conversations_dir):
+            return
+        files = sorted((name for name in os.listdir(self.conversations_dir) if name.endswith(".json")), reverse=True)
+        for filename in files:
+            conversation = self.load_conversation(filename[:-5])
+            if conversation:
+                yield conversation
+
+    def _ensure_summaries(self):
+        """
+        构建或刷新摘要索引（调用方持有锁）
+
+        索引持久化在对话目录中，启动时只重新解析修改时间发生变化的对话文件。
+        对话文件都是重命名进目录的，其他 worker 进程创建、更新或删除对话都会改变目录的修改时间：
+        每次使用前检查目录修改时间，变化时按各文件的修改时间增量刷新
+        """
+        # 在扫描之前记录目录版本，扫描期间的写入会在下次使用时再次触发刷新
+        directory_version = os.stat(self.conversations_dir).st_mtime_ns
+        if self._summaries is not None and directory_version == self._summaries_version:
+            return
+
+        index_path = os.path.join(self.conversations_dir, self.SUMMARY_INDEX_FILE)
+        initial = self._summaries is None
+        if initial:
+            try:
+                with open(index_path, "r", encoding="utf-8") as f:
+                    cached = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                cached = {}
+        else:
+            cached = self._summaries
+
+        summaries = {}
+        parsed = 0
+        for filename in os.listdir(self.conversations_dir):
+            if not filename.endswith(".json"):
+                continue
+            conversation_id = filename[:-len(".json")]
+            try:
+                mtime = os.stat(os.path.join(self.conversations_dir, filename)).st_mtime_ns
+            except FileNotFoundError:
+                continue
+            entry = cached.get(conversation_id)
+            if not entry or entry.get("mtime") != mtime:
+                conversation = self.load_conversation(conversation_id)
+                if not conversation:
+                    continue
+                entry = {"mtime": mtime, "summary": summarize_conversation(conversation)}
+                parsed += 1
+                if not initial:
+                    self._mark_changed(conversation_id)
+            summaries[conversation_id] = entry
+
+        if not initial:
+            for conversation_id in cached.keys() - summaries.keys():
+                self._mark_changed(conversation_id)
+
+        self._summaries = summaries
+        self._summaries_version = directory_version
+        if parsed or len(summaries) != len(cached):
+            fd, temp_path = tempfile.mkstemp(dir=self.conversations_dir, prefix=".tmp-", suffix=".part")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(summaries, f, ensure_ascii=False)
+            os.replace(temp_path, index_path)
+        if initial:
+            print(f"Conversation summary index loaded: {len(summaries)} conversations ({parsed} re-parsed)")
+
+    def delete_conversation(self, conversation_id):
+        with self._write_lock():
+            self._cache.pop(conversation_id)
+            try:
+                os.remove(self._file_path(conversation_id))
+            except FileNotFoundError:
+                return False
+            if self._summaries is not None and self._summaries.pop(conversation_id, None):
+                self._mark_changed(conversation_id)
+        search_index.remove(conversation_id)
+        return True
+
+    def data_version(self):
+        # 对话文件都是重命名进目录的，任何写入都会改变目录的修改时间
+        return os.stat(self.conversations_dir).st_mtime_ns
+
+    def list_changes(self, since=None):
+        with self._lock:
+            self._ensure_summaries()
+            if since is None:
+                changed = list(self._summaries)
+            else:
+                changed = []
+                for conversation_id in reversed(self._changed_at):
+                    if self._changed_at[conversation_id] <= since:
+                        break
+                    changed.append(conversation_id)
+            changes = {}
+            for conversation_id in changed:
+                entry = self._summaries.get(conversation_id)
+                changes[conversation_id] = entry["summary"] if entry else None
+            return changes, self._change_seq
+
+    def prepare_indexes(self):
+        with self._lock:
+            self._ensure_summaries()
+        search_index.stats(build=True)
+        super().prepare_indexes()
+
+    def search(self, query, limit=20, offset=0):
+        # 目录变化时按摘要中的消息数同步搜索索引，只重新加载消息数变化的对话
+        with self._lock:
+            self._ensure_summaries()
+            message_counts = None
+            if self._summaries_version != self._search_version:
+                message_counts = {conversation_id: entry["summary"]["message_count"]
+                                  for conversation_id, entry in self._summaries.items()}
+                self._search_version = self._summaries_version
+        if message_counts is not None:
+            search_index.sync(message_counts, self.load_conversation)
+        return super().search(query, limit, offset)
+
+    def get_summary(self, conversation_id):
+        with self._lock:
+            self._ensure_summaries()
+            entry = self._summaries.get(conversation_id)
+        return entry["summary"] if entry else None
+
+    def list_summaries(self, limit=None, cursor=None):
+        position = decode_cursor(cursor) if cursor else None
+        with self._lock:
+            self._ensure_summaries()
+            summaries = [entry["summary"] for entry in self._summaries.values()
+                         if entry["summary"]["assistant_responses"] > 0]
+        summaries.sort(key=lambda summary: (summary["created_at"], summary["id"]), reverse=True)
+        if position:
+            summaries = [summary for summary in summaries if (summary["created_at"], summary["id"]) < position]
+        if limit is None or len(summaries) <= limit:
+            return summaries, None
+        page = summaries[:limit]
+        return page, encode_cursor(page[-1])
+
+class SQLiteConversationStore(ConversationStore):
+    """
+    SQLite(WAL)对话存储
+
+    消息按行追加（写入量与消息大小成正比，而不是与对话长度成正比），
+    写操作使用 BEGIN IMMEDIATE 事务串行化，同一对话的并发请求不会丢失写入。
+    每次写入都会使消息数加一，消息数即作为缓存版本
+    """
+
+    _MESSAGE_COLUMNS = ("role", "content", "code", "object_id", "error", "render_mode", "tokens", "timestamp")
+    _UPDATABLE_FIELDS = ("current_code", "current_object_id", "render_mode")
+
+    def __init__(self, db_path: str, cache_size: Optional[int] = None):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._cache = ConversationCache(StorageConfig.CONVERSATION_CACHE_SIZE if cache_size is None else cache_size)
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._init_schema()
+
+    def _connection(self) -> sqlite3.Connection:
+        """每个线程使用独立连接（WAL模式下读写互不阻塞）"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    _SUMMARY_COLUMNS = ("title", "message_count", "assistant_responses")
+
+    def _init_schema(self):
+        conn = self._connection()
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS conversations (
+                id TEXT PRIMARY KEY,
+                created_at TEXT NOT NULL,
+                current_code TEXT,
+                current_object_id TEXT,
+                render_mode TEXT,
+                title TEXT NOT NULL DEFAULT '',
+                message_count INTEGER NOT NULL DEFAULT 0,
+                assistant_responses INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_conversations_created_at ON conversations (created_at);
+
+            CREATE TABLE IF NOT EXISTS messages (
+                conversation_id TEXT NOT NULL REFERENCES conversations (id) ON DELETE CASCADE,
+                message_index INTEGER NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT,
+                code TEXT,
+                object_id TEXT,
+                error TEXT,
+                render_mode TEXT,
+                tokens INTEGER,
+                timestamp TEXT NOT NULL,
+                PRIMARY KEY (conversation_id, message_index)
+            );
+            CREATE INDEX IF NOT EXISTS idx_messages_object_id ON messages (object_id);
+
+            CREATE TABLE IF NOT EXISTS conversation_errors (
+                conversation_id TEXT NOT NULL REFERENCES conversations (id) ON DELETE CASCADE,
+                timestamp TEXT NOT NULL,
+                error TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_conversation_errors_conversation_id ON conversation_errors (conversation_id);
+
+            CREATE TABLE IF NOT EXISTS conversation_changes (
+                conversation_id TEXT PRIMARY KEY,
+                change_seq INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_conversation_changes_seq ON conversation_changes (change_seq);
+            """
+        )
+        self._migrate_summary_columns(conn)
+        self._create_search_table(conn)
+        # 历史列表只包含有成功结果的对话，按 (created_at, id) 倒序分页
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_conversations_listing ON conversations (created_at DESC, id DESC) "
+            "WHERE assistant_responses > 0"
+        )
+
+    def _migrate_summary_columns(self, conn: sqlite3.Connection):
+        """为早期版本创建的数据库补充摘要列，并根据已有消息回填"""
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(conversations)")}
+        if all(column in columns for column in self._SUMMARY_COLUMNS):
+            return
+        with _Transaction(conn):
+            conn.execute("ALTER TABLE conversations ADD COLUMN title TEXT NOT NULL DEFAULT ''")
+            conn.execute("ALTER TABLE conversations ADD COLUMN message_count INTEGER NOT NULL DEFAULT 0")
+            conn.execute("ALTER TABLE conversations ADD COLUMN assistant_responses INTEGER NOT NULL DEFAULT 0")
+            conn.execute(
+                """
+                UPDATE conversations SET
+                    message_count = (SELECT COUNT(*) FROM messages WHERE conversation_id = conversations.id),
+                    assistant_responses = (SELECT COUNT(*) FROM messages WHERE conversation_id = conversations.id
+                                           AND role = 'assistant' AND object_id IS NOT NULL AND object_id != '')
+                """
+            )
+            rows = conn.execute(
+                """
+                SELECT conversation_id, content FROM messages AS m WHERE role = 'user' AND message_index = (
+                    SELECT MIN(message_index) FROM messages WHERE conversation_id = m.conversation_id AND role = 'user'
+                )
+                """
+            ).fetchall()
+            conn.executemany(
+                "UPDATE conversations SET title = ? WHERE id = ?",
+                [(make_conversation_title(row["content"] or ""), row["conversation_id"]) for row in rows]
+            )
+        print("Conversation database migrated: summary columns added")
+
+    def _create_search_table(self, conn: sqlite3.Connection):
+        """
+        创建全文搜索表，为早期版本创建的数据库根据已有消息回填
+
+        每条需要索引的消息一行，rowid 与 messages 表中的行相同；
+        内容是切分后以空格连接的词项（中文二字组由 search_index.tokenize 生成，FTS5 按空格切分）
+        """
+        with _Transaction(conn):
+            # 在写事务中检查，避免多个进程同时创建
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'message_search'"
+            ).fetchone()
+            if exists:
+                return
+            conn.execute("CREATE VIRTUAL TABLE message_search USING fts5(terms)")
+            rows = conn.execute(f"SELECT rowid, {', '.join(self._MESSAGE_COLUMNS)} FROM messages").fetchall()
+            for row in rows:
+                self._index_message(conn, row["rowid"], self._row_to_message(row))
+        if rows:
+            print(f"Conversation database migrated: search table built for {len(rows)} messages")
+
+    @staticmethod
+    def _index_message(conn: sqlite3.Connection, rowid: int, message: Dict[str, Any]):
+        """将消息的词项写入全文搜索表（调用方持有写事务）"""
+        terms = tokenize(message_text(message) or "", cjk_unigrams=True)
+        if terms:
+            conn.execute("INSERT INTO message_search (rowid, terms) VALUES (?, ?)", (rowid, " ".join(terms)))
+
+    @staticmethod
+    def _record_change(conn: sqlite3.Connection, conversation_id: str):
+        """
+        为对话分配新的变化序号（调用方持有写事务，序号因此严格递增）
+
+        删除的对话保留其变化记录，其他进程据此从索引中移除该对话
+        """
+        conn.execute(
+            "INSERT OR REPLACE INTO conversation_changes (conversation_id, change_seq) "
+            "SELECT ?, COALESCE(MAX(change_seq), 0) + 1 FROM conversation_changes",
+            (conversation_id,)
+        )
+
+    def _insert_message(self, conn: sqlite3.Connection, conversation_id: str, message_index: int,
+                        message: Dict[str, Any]):
+        """插入消息行并在同一事务中写入全文搜索表"""
+        cursor = conn.execute(
+            f"INSERT INTO messages (conversation_id, message_index, {', '.join(self._MESSAGE_COLUMNS)}) "
+            f"VALUES (?, ?, {', '.join('?' * len(self._MESSAGE_COLUMNS))})",
+            [conversation_id, message_index] + self._message_row(message)
+        )
+        self._index_message(conn, cursor.lastrowid, message)
+
+    def _transaction(self):
+        """开始写事务（立即获取写锁）"""
+        return _Transaction(self._connection())
+
+    @classmethod
+    def _message_row(cls, message: Dict[str, Any]) -> List[Any]:
+        return [message.get(column) for column in cls._MESSAGE_COLUMNS]
+
+    @staticmethod
+    def _row_to_message(row: sqlite3.Row) -> Dict[str, Any]:
+        """将消息行转换为与旧JSON格式相同的字典"""
+        if row["role"] == "user":
+            message = {"role": "user", "content": row["content"]}
+        else:
+            message = {
+                "role": row["role"],
+                "code": row["code"],
+                "object_id": row["object_id"],
+                "error": row["error"],
+                "render_mode": row["render_mode"],
+            }
+        if row["tokens"] is not None:
+            message["tokens"] = row["tokens"]
+        message["timestamp"] = row["timestamp"]
+        return message
+
+    def _insert_conversation(self, conn: sqlite3.Connection, conversation: Dict[str, Any]):
+        summary = summarize_conversation(conversation)
+        conn.execute(
+            "INSERT INTO conversations (id, created_at, current_code, current_object_id, render_mode, "
+            "title, message_count, assistant_responses) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (conversation["id"], conversation["created_at"], conversation.get("current_code"),
+             conversation.get("current_object_id"), conversation.get("render_mode"),
+             summary["title"], summary["message_count"], summary["assistant_responses"])
+        )
+        for index, message in enumerate(conversation.get("messages", [])):
+            self._insert_message(conn, conversation["id"], index, message)
+        conn.executemany(
+            "INSERT INTO conversation_errors (conversation_id, timestamp, error) VALUES (?, ?, ?)",
+            [(conversation["id"], entry["timestamp"], entry["error"]) for entry in conversation.get("error_history", [])]
+        )
+        self._record_change(conn, conversation["id"])
+
+    def create_conversation(self, conversation: Dict[str, Any]) -> None:
+        with self._transaction() as conn:
+            self._insert_conversation(conn, conversation)
+        # 新对话的下一步通常就是读取历史和追加消息
+        self._cache.put(conversation["id"], len(conversation.get("messages", [])), conversation)
+
+    def is_empty(self) -> bool:
+        """数据库中是否还没有任何对话"""
+        return self._connection().execute("SELECT 1 FROM conversations LIMIT 1").fetchone() is None
+
+    def import_conversation(self, conversation: Dict[str, Any]) -> bool:
+        with self._transaction() as conn:
+            if conn.execute("SELECT 1 FROM conversations WHERE id = ?", (conversation["id"],)).fetchone():
+                return False
+            self._insert_conversation(conn, conversation)
+            return True
+
+    def load_conversation(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        if not conversation_id:
+            return None
+        row = self._connection().execute(
+            "SELECT message_count FROM conversations WHERE id = ?", (conversation_id,)
+        ).fetchone()
+        if row is None:
+            self._cache.pop(conversation_id)
+            return None
+        cached = self._cache.get(conversation_id, row["message_count"])
+        if cached is not None:
+            return cached
+        return self._read(conversation_id)
+
+    def _read(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        """在一个读事务中完整读取对话（保证快照一致）并放入缓存"""
+        with _Transaction(self._connection(), "DEFERRED") as conn:
+            row = conn.execute("SELECT * FROM conversations WHERE id = ?", (conversation_id,)).fetchone()
+            if row is None:
+                return None
+            messages = conn.execute(
+                "SELECT * FROM messages WHERE conversation_id = ? ORDER BY message_index", (conversation_id,)
+            ).fetchall()
+            errors = conn.execute(
+                "SELECT timestamp, error FROM conversation_errors WHERE conversation_id = ? ORDER BY rowid", (conversation_id,)
+            ).fetchall()
+        conversation = {
+            "id": row["id"],
+            "created_at": row["created_at"],
+            "messages": [self._row_to_message(message) for message in messages],
+            "current_code": row["current_code"],
+            "current_object_id": row["current_object_id"],
+            "render_mode": row["render_mode"],
+            "error_history": [{"timestamp": error["timestamp"], "error": error["error"]} for error in errors],
+        }
+        self._cache.put(conversation_id, row["message_count"], conversation)
+        return conversation
+
+    def append_message(self, conversation_id, message, updates=None, error_entry=None):
+        with self._transaction() as conn:
+            row = conn.execute("SELECT message_count FROM conversations WHERE id = ?", (conversation_id,)).fetchone()
+            if row is None:
+                return None
+            message_index = row["message_count"]
+            self._insert_message(conn, conversation_id, message_index, message)
+            # 对话字段与摘要计数在同一事务中更新
+            fields = {key: value for key, value in (updates or {}).items() if key in self._UPDATABLE_FIELDS}
+            is_response = message["role"] == "assistant" and bool(message.get("object_id"))
+            conn.execute(
+                f"UPDATE conversations SET {''.join(f'{key} = ?, ' for key in fields)}"
+                "message_count = message_count + 1, assistant_responses = assistant_responses + ? WHERE id = ?",
+                list(fields.values()) + [int(is_response), conversation_id]
+            )
+            if error_entry:
+                conn.execute(
+                    "INSERT INTO conversation_errors (conversation_id, timestamp, error) VALUES (?, ?, ?)",
+                    (conversation_id, error_entry["timestamp"], error_entry["error"])
+                )
+            self._record_change(conn, conversation_id)
+        # 提交后更新缓存：缓存版本正是写入前的消息数时才能直接追加，否则说明缓存已过期
+        self._cache.advance(conversation_id, message_index, message_index + 1,
+                            lambda conversation: apply_append(conversation, message, fields, error_entry))
+        return message_index
+
+    def get_message(self, conversation_id, message_index):
+        row = self._connection().execute(
+            "SELECT * FROM messages WHERE conversation_id = ? AND message_index = ?", (conversation_id, message_index)
+        ).fetchone()
+        return self._row_to_message(row) if row else None
+
+    def iter_conversations(self):
+        ids = [row["id"] for row in self._connection().execute("SELECT id FROM conversations ORDER BY created_at DESC")]
+        for conversation_id in ids:
+            conversation = self.load_conversation(conversation_id)
+            if conversation:
+                yield conversation
+
+    def delete_conversation(self, conversation_id):
+        with self._transaction() as conn:
+            # 全文搜索表不参与外键级联删除
+            conn.execute(
+                "DELETE FROM message_search WHERE rowid IN (SELECT rowid FROM messages WHERE conversation_id = ?)",
+                (conversation_id,)
+            )
+            deleted = conn.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,)).rowcount > 0
+            if deleted:
+                self._record_change(conn, conversation_id)
+        self._cache.pop(conversation_id)
+        return deleted
+
+    def data_version(self):
+        # 每次写入都会分配新的变化序号，取最大值只需读取索引的最后一项
+        return self._connection().execute(
+            "SELECT COALESCE(MAX(change_seq), 0) FROM conversation_changes"
+        ).fetchone()[0]
+
+    def list_changes(self, since=None):
+        # 游标与变化记录在同一个读事务中读取，避免漏掉读取期间的写入
+        with _Transaction(self._connection(), "DEFERRED") as conn:
+            cursor = conn.execute("SELECT COALESCE(MAX(change_seq), 0) FROM conversation_changes").fetchone()[0]
+            if since is None:
+                rows = conn.execute(self._SUMMARY_QUERY).fetchall()
+                return {row["id"]: dict(row) for row in rows}, cursor
+            rows = conn.execute(
+                f"SELECT c.conversation_id, s.* FROM conversation_changes AS c "
+                f"LEFT JOIN ({self._SUMMARY_QUERY}) AS s ON s.id = c.conversation_id WHERE c.change_seq > ?",
+                (since,)
+            ).fetchall()
+        changes = {}
+        for row in rows:
+            summary = dict(row)
+            conversation_id = summary.pop("conversation_id")
+            # 已删除的对话在摘要中没有对应的行
+            changes[conversation_id] = summary if summary["id"] is not None else None
+        return changes, cursor
+
+    def search(self, query, limit=20, offset=0):
+        # 与进程内索引相同的切分方式，任一词项命中即可；rank 为FTS5的BM25（越小越相关），对话得分为其各条消息得分之和
+        terms = sorted(set(tokenize(query)))
+        if not terms:
+            return {"results": [], "total": 0}
+        match = " OR ".join(f'"{term}"' for term in terms)
+        rows = self._connection().execute(
+            """
+            SELECT m.conversation_id, SUM(s.score) AS score, COUNT(*) OVER () AS total
+            FROM (SELECT rowid, -rank AS score FROM message_search WHERE message_search MATCH ?) AS s
+            JOIN messages AS m ON m.rowid = s.rowid
+            GROUP BY m.conversation_id
+            ORDER BY score DESC, m.conversation_id
+            LIMIT ? OFFSET ?
+            """,
+            (match, limit, offset)
+        ).fetchall()
+        if not rows and offset:
+            # 超出最后一页时仍需返回匹配总数
+            total = self._connection().execute(
+                """
+                SELECT COUNT(DISTINCT m.conversation_id) FROM message_search AS s JOIN messages AS m ON m.rowid = s.rowid
+                WHERE message_search MATCH ?
+                """,
+                (match,)
+            ).fetchone()[0]
+        else:
+            total = rows[0]["total"] if rows else 0
+        return {
+            "results": [{"conversation_id": row["conversation_id"], "score": round(row["score"], 4)} for row in rows],
+            "total": total,
+        }
+
+    def search_stats(self):
+        conn = self._connection()
+        return {
+            "backend": "sqlite_fts5",
+            "conversations": conn.execute("SELECT COUNT(*) FROM conversations").fetchone()[0],
+            "indexed_messages": conn.execute("SELECT COUNT(*) FROM message_search").fetchone()[0],
+        }
+
+    _SUMMARY_QUERY = ("SELECT id, created_at, title, message_count, assistant_responses, current_object_id "
+                      "FROM conversations")
+
+    def get_summary(self, conversation_id):
+        row = self._connection().execute(f"{self._SUMMARY_QUERY} WHERE id = ?", (conversation_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list_summaries(self, limit=None, cursor=None):
+        query = f"{self._SUMMARY_QUERY} WHERE assistant_responses > 0"
+        params: List[Any] = []
+        if cursor:
+            created_at, conversation_id = decode_cursor(cursor)
+            query += " AND (created_at < ? OR (created_at = ? AND id < ?))"
+            params += [created_at, created_at, conversation_id]
+        query += " ORDER BY created_at DESC, id DESC"
+        if limit is not None:
+            # 多取一条用于判断是否还有下一页
+            query += " LIMIT ?"
+            params.append(limit + 1)
+        summaries = [dict(row) for row in self._connection().execute(query, params)]
+        if limit is None or len(summaries) <= limit:
+            return summaries, None
+        page = summaries[:limit]
+        return page, encode_cursor(page[-1])
+
+class _FileLock:
+    """进程内线程锁 + 跨进程咨询文件锁（没有 fcntl 的平台上只使用线程锁）"""
+
+    def __init__(self, thread_lock: threading.Lock, lock_path: str):
+        self.thread_lock = thread_lock
+        self.lock_path = lock_path
+        self._file = None
+
+    def __enter__(self):
+        self.thread_lock.acquire()
+        if fcntl is not None:
+            try:
+                self._file = open(self.lock_path, "a")
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+            except BaseException:
+                if self._file:
+                    self._file.close()
+                    self._file = None
+                self.thread_lock.release()
+                raise
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._file:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+        self.thread_lock.release()
+        return False
+
+class _Transaction:
+    """BEGIN ... COMMIT/ROLLBACK 上下文（默认 IMMEDIATE，立即获取写锁）"""
+
+    def __init__(self, conn: sqlite3.Connection, mode: str = "IMMEDIATE"):
+        self.conn = conn
+        self.mode = mode
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn.execute(f"BEGIN {self.mode}")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+_store: Optional[ConversationStore] = None
+_store_lock = threading.Lock()
+
+def _import_json_conversations(store: ConversationStore):
+    """数据库为空时导入旧版本保存在 data/conversations 中的JSON对话（已存在的对话跳过，多个进程同时执行也是安全的）"""
+    source_dir = str(StoragePaths.CONVERSATIONS_DIR)
+    if not os.path.isdir(source_dir) or not any(name.endswith(".json") for name in os.listdir(source_dir)):
+        return
+    from .migrate_conversations import migrate_json_conversations
+    stats = migrate_json_conversations(source_dir, store)
+    print(f"Imported JSON conversations into database: {stats['migrated']} migrated, "
+          f"{stats['skipped']} skipped, {stats['failed']} failed")
+
+def create_conversation_store(backend: Optional[str] = None) -> ConversationStore:
+    """
+    按配置创建对话存储
+
+    Args:
+        backend: 'sqlite' 或 'json'（None 表示使用 StorageConfig.CONVERSATION_BACKEND）
+    """
+    backend = backend or StorageConfig.CONVERSATION_BACKEND
+    if backend == "json":
+        return JSONConversationStore(str(StoragePaths.CONVERSATIONS_DIR))
+    if backend == "sqlite":
+        store = SQLiteConversationStore(str(StoragePaths.CONVERSATIONS_DB))
+        if StorageConfig.AUTO_IMPORT_JSON_CONVERSATIONS and store.is_empty():
+            _import_json_conversations(store)
+        return store
+    raise ValueError(f"Unknown conversation storage backend: {backend}")
+
+def get_conversation_store() -> ConversationStore:
+    """获取进程内共享的对话存储（首次使用时创建）"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = create_conversation_store()
+        return _store
@@ -0,0 +1,53 @@
+"""
+对话数据迁移工具
+将旧的JSON对话文件一次性导入当前配置的对话存储（默认SQLite）
+
+用法（在 backend 目录下执行）:
+    python -m models.migrate_conversations [--source data/conversations]
+"""
+
+import argparse
+import json
+import os
+from typing import Dict
+
+from app.config import StoragePaths
+from .conversation_store import ConversationStore, get_conversation_store
+
+def migrate_json_conversations(source_dir: str, store: ConversationStore) -> Dict[str, int]:
+    """
+    导入目录中的所有JSON对话，已存在的对话跳过，可重复执行
+
+    Returns:
+        统计信息（migrated、skipped、failed）
+    """
+    stats = {"migrated": 0, "skipped": 0, "failed": 0}
+    if not os.path.isdir(source_dir):
+        return stats
+
+    for filename in sorted(os.listdir(source_dir)):
+        if not filename.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(source_dir, filename), "r", encoding="utf-8") as f:
+                conversation = json.load(f)
+            conversation.setdefault("id", filename[:-len(".json")])
+            if store.import_conversation(conversation):
+                stats["migrated"] += 1
+            else:
+                stats["skipped"] += 1
+        except Exception as e:
+            stats["failed"] += 1
+            print(f"Failed to migrate {filename}: {type(e).__name__}: {e}")
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="将JSON对话文件导入对话存储")
+    parser.add_argument("--source", default=str(StoragePaths.CONVERSATIONS_DIR), help="JSON对话文件目录")
+    args = parser.parse_args()
+
+    stats = migrate_json_conversations(args.source, get_conversation_store())
+    print(f"Migration finished: {stats['migrated']} migrated, {stats['skipped']} skipped, {stats['failed']} failed")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""
+相似查询索引
+对历史对话中首轮用户查询建立字符n-gram TF-IDF索引（无需下载模型，适用于中文），
+新查询与已有成功结果足够相似时可直接复用之前生成的对象。
+索引在启动预热时构建，之后根据存储版本增量同步其他 worker 进程的写入
+"""
+
+import math
+import re
+import threading
+from collections import Counter
+from typing import Any, Dict, Hashable, List, Optional
+
+NGRAM_SIZES = (1, 2, 3)
+_NUMBER_PATTERN = re.compile(r"\d+(?:\.\d+)?")
+_IGNORED_CHARS = re.compile(r"[\s\W_]+", re.UNICODE)
+
+def normalize_query(query: str) -> str:
+    """规范化查询：转小写，去除空白和标点"""
+    return _IGNORED_CHARS.sub("", query.lower())
+
+def extract_numbers(query: str) -> List[str]:
+    """提取查询中的数值（按出现顺序，统一格式）"""
+    return [str(float(number)) for number in _NUMBER_PATTERN.findall(query)]
+
+def char_ngrams(query: str) -> Counter:
+    """生成字符n-gram词频"""
+    text = normalize_query(query)
+    grams = Counter()
+    for size in NGRAM_SIZES:
+        for start in range(len(text) - size + 1):
+            grams[text[start:start + size]] += 1
+    return grams
+
+class QueryIndex:
+    """
+    增量更新的TF-IDF余弦相似度索引（线程安全）
+
+    每个对话只索引首轮查询及其第一个成功结果。数值不同的查询（如齿数30与40）
+    在字面上仍然非常相似，因此只有数值完全一致时才视为匹配
+    """
+
+    def __init__(self):
+        self._documents: Dict[str, Dict[str, Any]] = {}
+        self._postings: Dict[str, Dict[str, int]] = {}
+        # 对话ID -> 上次检查时的消息数，避免重复加载未变化的对话
+        self._checked: Dict[str, int] = {}
+        # 对话ID -> 文档向量的模长；IDF随文档集合变化，增删文档时整体失效
+        self._norms: Dict[str, float] = {}
+        self._version: Optional[Hashable] = None
+        # 存储 list_changes 的游标
+        self._cursor: Optional[Hashable] = None
+        self._lock = threading.Lock()
+        self._built = False
+
+    def _ensure_current(self):
+        """
+        构建或刷新索引（调用方持有锁）
+
+        其他 worker 进程的写入不会经过本进程的 add/remove：每次使用前比较存储版本，
+        变化时只列出上次同步之后变化的对话，只重新加载消息数发生变化且尚未索引的对话（首轮结果一经索引不再变化）
+        """
+        from .conversation_store import get_conversation_store
+        store = get_conversation_store()
+        # 在列出变化之前记录版本，列出期间的写入会在下次使用时再次触发同步
+        version = store.data_version()
+        if self._built and version == self._version:
+            return
+
+        changes, self._cursor = store.list_changes(self._cursor)
+        for conversation_id, summary in changes.items():
+            if summary is None:
+                self._remove(conversation_id)
+                self._checked.pop(conversation_id, None)
+                continue
+            if summary["assistant_responses"] == 0:
+                continue
+            if conversation_id in self._documents or self._checked.get(conversation_id) == summary["message_count"]:
+                continue
+            self._checked[conversation_id] = summary["message_count"]
+            entry = self.first_turn_result(store.load_conversation(conversation_id) or {})
+            if entry:
+                self._add(**entry)
+
+        if not self._built:
+            print(f"Query index built with {len(self._documents)} queries")
+        self._version = version
+        self._built = True
+
+    @staticmethod
+    def first_turn_result(conversation: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """获取对话首轮查询及其第一个成功结果，对话不是单轮成功对话时返回None"""
+        messages = conversation.get("messages", [])
+        if not messages or messages[0]["role"] != "user":
+            return None
+        for index, message in enumerate(messages[1:], start=1):
+            if message["role"] == "user":
+                return None
+            if message.get("object_id") and not message.get("error"):
+                return {
+                    "conversation_id": conversation["id"],
+                    "message_index": index,
+                    "object_id": message["object_id"],
+                    "render_mode": message.get("render_mode"),
+                    "query": messages[0]["content"],
+                }
+        return None
+
+    def _add(self, conversation_id: str, message_index: int, object_id: str, render_mode: Optional[str], query: str):
+        """添加文档（调用方持有锁）"""
+        self._remove(conversation_id)
+        grams = char_ngrams(query)
+        if not grams:
+            return
+        self._documents[conversation_id] = {
+            "conversation_id": conversation_id,
+            "message_index": message_index,
+            "object_id": object_id,
+            "render_mode": render_mode,
+            "query": query,
+            "numbers": extract_numbers(query),
+            "grams": grams,
+        }
+        for gram, count in grams.items():
+            self._postings.setdefault(gram, {})[conversation_id] = count
+        self._norms.clear()
+
+    def _remove(self, conversation_id: str):
+        """移除文档（调用方持有锁）"""
+        document = self._documents.pop(conversation_id, None)
+        if not document:
+            return
+        for gram in document["grams"]:
+            postings = self._postings.get(gram)
+            if postings:
+                postings.pop(conversation_id, None)
+                if not postings:
+                    del self._postings[gram]
+        self._norms.clear()
+
+    def add(self, conversation_id: str, message_index: int, object_id: str, render_mode: Optional[str], query: str):
+        """索引一个对话的首轮查询及其成功结果"""
+        with self._lock:
+            if self._built:
+                self._add(conversation_id, message_index, object_id, render_mode, query)
+            # 从存储构建时已包含刚写入的对话；已构建时同步这次写入带来的版本变化（只列出增量），
+            # 之后的 find_similar 不必再为本进程自己的写入刷新
+            self._ensure_current()
+
+    def remove(self, conversation_id: str):
+        """从索引中移除对话"""
+        with self._lock:
+            self._remove(conversation_id)
+            self._checked.pop(conversation_id, None)
+            if self._built:
+                self._ensure_current()
+
+    def refresh(self):
+        """构建索引或从存储同步其他进程的写入（启动预热时调用）"""
+        with self._lock:
+            self._ensure_current()
+
+    def _idf(self, gram: str) -> float:
+        """平滑IDF"""
+        total = len(self._documents)
+        return math.log((1 + total) / (1 + len(self._postings.get(gram, {})))) + 1
+
+    def _document_norm(self, conversation_id: str) -> float:
+        """文档向量的模长（调用方持有锁），文档集合不变时缓存"""
+        norm = self._norms.get(conversation_id)
+        if norm is None:
+            norm = math.sqrt(sum(
+                (count * self._idf(gram)) ** 2 for gram, count in self._documents[conversation_id]["grams"].items()
+            ))
+            self._norms[conversation_id] = norm
+        return norm
+
+    def find_similar(self, query: str, render_mode: Optional[str] = None, threshold: float = 0.0) -> Optional[Dict[str, Any]]:
+        """
+        查找最相似的历史查询
+
+        Args:
+            query: 新查询
+            render_mode: 只匹配该渲染模式的结果（None表示不限）
+            threshold: 余弦相似度阈值
+
+        Returns:
+            最佳匹配（包含 conversation_id、message_index、object_id、render_mode、query、score，
+            以及规范化后查询是否完全相同的 exact），
+            没有达到阈值的匹配时返回None
+        """
+        grams = char_ngrams(query)
+        if not grams:
+            return None
+        numbers = extract_numbers(query)
+
+        with self._lock:
+            self._ensure_current()
+
+            query_weights = {gram: count * self._idf(gram) for gram, count in grams.items()}
+            query_norm = math.sqrt(sum(weight * weight for weight in query_weights.values()))
+
+            # 通过倒排表累加点积，只计算与查询共享n-gram的文档
+            dot_products: Dict[str, float] = {}
+            for gram, weight in query_weights.items():
+                idf = self._idf(gram)
+                for conversation_id, count in self._postings.get(gram, {}).items():
+                    dot_products[conversation_id] = dot_products.get(conversation_id, 0.0) + weight * count * idf
+
+            best = None
+            for conversation_id, dot in dot_products.items():
+                document = self._documents[conversation_id]
+                if render_mode and document["render_mode"] != render_mode:
+                    continue
+                if document["numbers"] != numbers:
+                    continue
+                score = dot / (query_norm * self._document_norm(conversation_id))
+                if score >= threshold and (best is None or score > best[0]):
+                    best = (score, document)
+
+            if best is None:
+                return None
+            score, document = best
+            match = {key: value for key, value in document.items() if key not in ("grams", "numbers")}
+            match["score"] = round(min(score, 1.0), 4)
+            # 字符n-gram无法区分只差一个关键词的查询（如 电容/电感），只有规范化后完全相同才可以直接复用
+            match["exact"] = normalize_query(document["query"]) == normalize_query(query)
+            return match
+
+    def stats(self) -> Dict[str, Any]:
+        """获取索引统计信息"""
+        with self._lock:
+            return {
+                "built": self._built,
+                "queries": len(self._documents),
+                "ngrams": len(self._postings),
+            }
+
+# 进程内共享的索引实例
+query_index = QueryIndex()
@@ -0,0 +1,194 @@
+"""
+对话全文搜索索引
+对所有对话中的用户需求和成功生成的代码建立倒排索引，按BM25排序。
+中文按相邻二字切分（CJK bigram），无需分词词典；英文、数字和代码标识符按单词切分。
+
+进程内索引用于JSON存储后端（在启动预热时构建，搜索前根据对话目录的变化同步其他 worker 进程的写入）；
+SQLite后端使用同样的切分写入FTS5表，见 SQLiteConversationStore.search
+"""
+
+import math
+import re
+import threading
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+
+# BM25 参数
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_CJK_RUN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+")
+_WORD = re.compile(r"[a-z0-9]+")
+
+def tokenize(text: str, cjk_unigrams: bool = False) -> List[str]:
+    """
+    切分文本：中文连续片段生成二字组（单字片段保留单字），其余部分按字母数字单词切分
+
+    Args:
+        cjk_unigrams: 是否同时输出所有中文单字（索引文档时开启，使单字查询也能命中）
+    """
+    text = text.lower()
+    tokens = []
+    for run in _CJK_RUN.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+            continue
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        if cjk_unigrams:
+            tokens.extend(run)
+    tokens.extend(_WORD.findall(_CJK_RUN.sub(" ", text)))
+    return tokens
+
+def message_text(message: Dict[str, Any]) -> Optional[str]:
+    """获取消息中需要索引的文本：用户需求，或没有错误的助手代码"""
+    if message["role"] == "user":
+        return message.get("content")
+    if message.get("code") and not message.get("error"):
+        return message["code"]
+    return None
+
+class ConversationSearchIndex:
+    """
+    增量更新的BM25倒排索引（线程安全）
+
+    每个对话作为一个文档，消息追加时只把新消息的词项累加到文档中。
+    已索引的消息下标会被记录，重复添加同一条消息（例如与首次构建并发时）不会重复计数
+    """
+
+    def __init__(self):
+        self._documents: Dict[str, Dict[str, Any]] = {}
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._total_length = 0
+        self._lock = threading.Lock()
+        self._built = False
+
+    def _ensure_built(self):
+        """首次使用时从对话存储构建索引（调用方持有锁）"""
+        if self._built:
+            return
+        from .conversation_store import get_conversation_store
+        for conversation in get_conversation_store().iter_conversations():
+            for index, message in enumerate(conversation["messages"]):
+                self._add(conversation["id"], index, message_text(message))
+        self._built = True
+        print(f"Conversation search index built with {len(self._documents)} conversations, {len(self._postings)} terms")
+
+    def _add(self, conversation_id: str, message_index: int, text: Optional[str]):
+        """将一条消息的文本累加到对话文档（调用方持有锁）"""
+        document = self._documents.setdefault(conversation_id, {"terms": Counter(), "length": 0, "messages": set()})
+        if message_index in document["messages"]:
+            return
+        document["messages"].add(message_index)
+        tokens = tokenize(text or "", cjk_unigrams=True)
+        if not tokens:
+            return
+        terms = Counter(tokens)
+        document["terms"].update(terms)
+        document["length"] += len(tokens)
+        self._total_length += len(tokens)
+        for term in terms:
+            self._postings.setdefault(term, {})[conversation_id] = document["terms"][term]
+
+    def add_message(self, conversation_id: str, message_index: int, message: Dict[str, Any]):
+        """索引对话中新追加的一条消息（在消息写入存储之后调用）"""
+        with self._lock:
+            if not self._built:
+                # 从存储构建时已包含刚写入的消息
+                self._ensure_built()
+                return
+            self._add(conversation_id, message_index, message_text(message))
+
+    def sync(self, message_counts: Dict[str, int], load: Callable[[str], Optional[Dict[str, Any]]]):
+        """
+        与存储同步（其他 worker 进程的写入不会经过本进程的 add_message/remove）
+
+        Args:
+            message_counts: 存储中所有对话的 {对话ID: 消息数}
+            load: 加载完整对话的函数，只对已索引消息数与存储不一致的对话调用
+        """
+        with self._lock:
+            if not self._built:
+                self._ensure_built()
+                return
+            for conversation_id, count in message_counts.items():
+                document = self._documents.get(conversation_id)
+                if document and len(document["messages"]) == count:
+                    continue
+                conversation = load(conversation_id)
+                if conversation:
+                    for index, message in enumerate(conversation["messages"]):
+                        self._add(conversation_id, index, message_text(message))
+            deleted = [conversation_id for conversation_id in self._documents if conversation_id not in message_counts]
+        for conversation_id in deleted:
+            self.remove(conversation_id)
+
+    def remove(self, conversation_id: str):
+        """从索引中移除对话"""
+        with self._lock:
+            document = self._documents.pop(conversation_id, None)
+            if not document:
+                return
+            self._total_length -= document["length"]
+            for term in document["terms"]:
+                postings = self._postings.get(term)
+                if postings:
+                    postings.pop(conversation_id, None)
+                    if not postings:
+                        del self._postings[term]
+
+    def search(self, query: str, limit: int = 20, offset: int = 0) -> Dict[str, Any]:
+        """
+        搜索对话
+
+        Args:
+            query: 搜索文本
+            limit: 返回数量
+            offset: 跳过的结果数（分页）
+
+        Returns:
+            {"results": [{"conversation_id", "score"}], "total": 匹配的对话总数}
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return {"results": [], "total": 0}
+
+        with self._lock:
+            self._ensure_built()
+            total_documents = len(self._documents)
+            if not total_documents:
+                return {"results": [], "total": 0}
+            average_length = self._total_length / total_documents or 1.0
+
+            scores: Dict[str, float] = {}
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (total_documents - len(postings) + 0.5) / (len(postings) + 0.5))
+                for conversation_id, frequency in postings.items():
+                    length = self._documents[conversation_id]["length"]
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+                    scores[conversation_id] = scores.get(conversation_id, 0.0) + idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return {
+            "results": [
+                {"conversation_id": conversation_id, "score": round(score, 4)}
+                for conversation_id, score in ranked[offset:offset + limit]
+            ],
+            "total": len(ranked),
+        }
+
+    def stats(self, build: bool = False) -> Dict[str, Any]:
+        """获取索引统计信息（build 为 True 时先确保索引已构建，用于启动预热）"""
+        with self._lock:
+            if build:
+                self._ensure_built()
+            return {
+                "built": self._built,
+                "conversations": len(self._documents),
+                "terms": len(self._postings),
+            }
+
+# 进程内共享的索引实例
+search_index = ConversationSearchIndex()
@@ -1,10 +1,66 @@
 """
 后处理器模块
-负责处理生成的CAD对象，如tessellation转换
+负责处理生成的CAD对象，如tessellation转换、导出产物
 """
 
-from .tessellation_processor import tessellate_cad_objects
+from .tessellation_processor import (
+    tessellate_cad_objects,
+    build_shapes_payload,
+    resolve_shape_references,
+    get_quality_params,
+    MESH_PAYLOAD_MODES,
+    DEFAULT_MESH_PAYLOAD
+)
+from .tessellation_cache import (
+    TessellationCache,
+    tessellation_cache,
+    tessellate_code,
+    make_tessellation_key
+)
+from .export_artifacts import (
+    get_brep_artifact_path,
+    get_brep_part_name,
+    save_brep_artifact,
+    copy_brep_artifact,
+    ensure_brep_artifact,
+    export_object,
+    schedule_pre_export,
+    iter_export_bundle
+)
+from .mesh_artifacts import (
+    get_mesh_artifact_path,
+    save_mesh_artifact,
+    load_mesh_artifact,
+    ensure_mesh_artifact,
+    schedule_mesh_refinement,
+    get_refinement_status,
+    wait_for_mesh_refinement
+)
 
 __all__ = [
-    'tessellate_cad_objects'
-] 
\ No newline at end of file
+    'tessellate_cad_objects',
+    'build_shapes_payload',
+    'resolve_shape_references',
+    'get_quality_params',
+    'MESH_PAYLOAD_MODES',
+    'DEFAULT_MESH_PAYLOAD',
+    'TessellationCache',
+    'tessellation_cache',
+    'tessellate_code',
+    'make_tessellation_key',
+    'get_brep_artifact_path',
+    'get_brep_part_name',
+    'save_brep_artifact',
+    'copy_brep_artifact',
+    'ensure_brep_artifact',
+    'export_object',
+    'schedule_pre_export',
+    'iter_export_bundle',
+    'get_mesh_artifact_path',
+    'save_mesh_artifact',
+    'load_mesh_artifact',
+    'ensure_mesh_artifact',
+    'schedule_mesh_refinement',
+    'get_refinement_status',
+    'wait_for_mesh_refinement'
+]
@@ -0,0 +1,229 @@
+"""
+导出产物
+3D生成成功时对象被序列化为BREP（<id>.brep）并持久化，所有下载格式都从BREP导出，
+生成的代码只执行一次；常用格式可以在生成后于后台预先导出。
+同一个产物文件的生成通过文件锁串行化，写入采用临时文件 + 原子替换；
+多个对象/格式可以打包为边导出边输出的ZIP流
+"""
+
+import json
+import os
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterator, List, Optional, Tuple
+
+from app.config import ExportConfig, PathUtils
+from executor import executor_pool
+from utils.file_utils import atomic_write_bytes, file_lock
+
+def get_brep_artifact_path(object_id: str) -> Optional[str]:
+    """获取已存在的BREP产物路径，不存在时返回None"""
+    brep_path = PathUtils.get_generated_file_path(object_id, "brep")
+    return brep_path if os.path.exists(brep_path) else None
+
+def get_brep_part_name(object_id: str) -> Optional[str]:
+    """
+    获取从BREP细分对象时使用的部件名称（记录在 <id>.brep.json 中）
+
+    没有记录时（装配体、多部件对象或旧对象）BREP无法还原对象的部件结构，只能用于导出，
+    其他细分质量的网格仍需执行代码
+    """
+    try:
+        with open(PathUtils.get_generated_file_path(object_id, "brep.json"), "r", encoding="utf-8") as f:
+            return json.load(f).get("part_name")
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def save_brep_artifact(object_id: str, brep: bytes, part_name: Optional[str] = None) -> str:
+    """写入对象的BREP产物（part_name 见 get_brep_part_name），返回文件路径"""
+    PathUtils.ensure_object_dir(object_id)
+    if part_name:
+        atomic_write_bytes(
+            PathUtils.get_generated_file_path(object_id, "brep.json"),
+            json.dumps({"part_name": part_name}, ensure_ascii=False).encode("utf-8")
+        )
+    brep_path = PathUtils.get_generated_file_path(object_id, "brep")
+    atomic_write_bytes(brep_path, brep)
+    return brep_path
+
+def copy_brep_artifact(source_id: str, object_id: str) -> bool:
+    """
+    将另一个对象（由相同代码生成）的BREP产物复制为对象的产物
+
+    Returns:
+        是否复制成功，源对象没有BREP产物时返回False
+    """
+    source_path = get_brep_artifact_path(source_id)
+    if not source_path:
+        return False
+    try:
+        with open(source_path, "rb") as f:
+            brep = f.read()
+    except FileNotFoundError:
+        return False
+    save_brep_artifact(object_id, brep, get_brep_part_name(source_id))
+    return True
+
+def ensure_brep_artifact(object_id: str) -> str:
+    """
+    获取对象的BREP产物，不存在时（旧对象，或生成时命中的细分缓存条目没有可复制的BREP）在执行器中执行一次代码生成
+
+    Raises:
+        FileNotFoundError: 对象的代码文件不存在
+        RuntimeError: 代码执行失败
+    """
+    brep_path = PathUtils.get_generated_file_path(object_id, "brep")
+    if os.path.exists(brep_path):
+        return brep_path
+
+    with file_lock(brep_path):
+        if os.path.exists(brep_path):
+            return brep_path
+
+        with open(PathUtils.get_generated_file_path(object_id), "r", encoding="utf-8") as f:
+            code = f.read()
+        brep, error_info = executor_pool.submit("brep", code)
+        if error_info:
+            raise RuntimeError(f"{error_info['type']}: {error_info['message']}")
+        atomic_write_bytes(brep_path, brep)
+        print(f"BREP artifact created for {object_id}")
+    return brep_path
+
+def export_object(object_id: str, file_format: str) -> str:
+    """
+    获取对象指定格式的导出文件，不存在时从BREP产物导出（并发请求同一文件时只导出一次）
+
+    Args:
+        object_id: 对象ID
+        file_format: 导出格式（文件扩展名，如 step、stl、3mf）
+
+    Returns:
+        导出文件路径
+
+    Raises:
+        FileNotFoundError: 对象不存在
+        RuntimeError: 导出失败
+    """
+    if file_format == "brep":
+        return ensure_brep_artifact(object_id)
+
+    export_path = PathUtils.get_generated_file_path(object_id, file_format)
+    if os.path.exists(export_path):
+        return export_path
+
+    with file_lock(export_path):
+        if os.path.exists(export_path):
+            return export_path
+
+        with open(ensure_brep_artifact(object_id), "rb") as f:
+            brep = f.read()
+        file_data, error_info = executor_pool.submit("export", brep, file_format)
+        if error_info:
+            raise RuntimeError(f"{error_info['type']}: {error_info['message']}")
+        atomic_write_bytes(export_path, file_data)
+    return export_path
+
+_pre_export_executor: Optional[ThreadPoolExecutor] = None
+_pre_export_lock = threading.Lock()
+
+def _pre_export(object_id: str, formats: List[str]):
+    for file_format in formats:
+        try:
+            export_object(object_id, file_format)
+        except Exception as e:
+            print(f"Pre-export of {object_id}.{file_format} failed: {e}")
+
+def schedule_pre_export(object_id: str, formats: Optional[List[str]] = None):
+    """在后台线程中预先导出常用格式（默认 ExportConfig.PRE_EXPORT_FORMATS）"""
+    global _pre_export_executor
+    formats = ExportConfig.PRE_EXPORT_FORMATS if formats is None else formats
+    if not formats:
+        return
+    with _pre_export_lock:
+        if _pre_export_executor is None:
+            _pre_export_executor = ThreadPoolExecutor(
+                max_workers=ExportConfig.PRE_EXPORT_WORKERS,
+                thread_name_prefix="pre-export"
+            )
+    _pre_export_executor.submit(_pre_export, object_id, list(formats))
+
+# 本身已经压缩的格式，打包时不再压缩
+_STORED_FORMATS = {"3mf"}
+
+class _ZipStream:
+    """只支持写入的缓冲区：ZipFile 写入的数据被逐块取走输出，不在内存中保留整个压缩包"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+def iter_export_bundle(entries: List[Tuple[str, str]]) -> Iterator[bytes]:
+    """
+    将多个对象的导出文件打包为ZIP并以数据块流式输出
+
+    各文件在线程池中并行导出（导出本身在执行器进程中进行），先完成的先写入压缩包；
+    导出失败的文件不会中断打包，失败原因写入压缩包中的 errors.txt
+
+    Args:
+        entries: (对象ID, 格式) 列表，格式为 "svg" 时直接打包2D对象的SVG文件
+
+    Yields:
+        ZIP文件的字节块
+    """
+    stream = _ZipStream()
+    errors = []
+    pool = ThreadPoolExecutor(
+        max_workers=max(1, min(ExportConfig.BUNDLE_EXPORT_WORKERS, len(entries))),
+        thread_name_prefix="bundle-export"
+    )
+    try:
+        futures = {}
+        for object_id, file_format in entries:
+            if file_format == "svg" and os.path.exists(PathUtils.get_svg_file_path(object_id)):
+                future = pool.submit(PathUtils.get_svg_file_path, object_id)
+            else:
+                future = pool.submit(export_object, object_id, file_format)
+            futures[future] = (object_id, file_format)
+
+        with zipfile.ZipFile(stream, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for future in as_completed(futures):
+                object_id, file_format = futures[future]
+                arcname = f"{object_id}.{file_format}"
+                try:
+                    file_path = future.result()
+                except Exception as e:
+                    print(f"Bundle export of {arcname} failed: {e}")
+                    errors.append(f"{arcname}: {type(e).__name__}: {e}")
+                    continue
+
+                info = zipfile.ZipInfo.from_file(file_path, arcname)
+                info.compress_type = zipfile.ZIP_STORED if file_format in _STORED_FORMATS else zipfile.ZIP_DEFLATED
+                with open(file_path, "rb") as src, archive.open(info, "w") as dest:
+                    while True:
+                        chunk = src.read(ExportConfig.BUNDLE_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        dest.write(chunk)
+                        data = stream.drain()
+                        if data:
+                            yield data
+                yield stream.drain()
+
+            if errors:
+                archive.writestr("errors.txt", "\n".join(errors) + "\n")
+        yield stream.drain()
+    finally:
+        # 客户端中途断开时不再启动排队中的导出
+        pool.shutdown(wait=False, cancel_futures=True)
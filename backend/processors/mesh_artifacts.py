@@ -0,0 +1,157 @@
+"""
+网格产物持久化
+3D生成成功后将细分结果以二进制网格格式写入对象生成目录中的 <id>.mesh，
+历史回放和服务重启后直接读取该文件，无需重新执行生成的代码。
+非默认细分质量的网格写入 <id>.<质量>.mesh；渐进模式下精细网格在后台线程中生成
+"""
+
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import PathUtils, TessellationConfig
+from utils.binary_utils import encode_binary_payload, load_binary_payload
+from utils.file_utils import atomic_write_bytes, file_lock
+from .export_artifacts import get_brep_artifact_path, get_brep_part_name
+from .tessellation_cache import tessellate_code
+from .tessellation_processor import get_quality_params
+
+def get_mesh_artifact_path(object_id: str, quality: Optional[str] = None) -> Optional[str]:
+    """获取已存在的网格产物路径，不存在时返回None"""
+    mesh_path = PathUtils.get_mesh_file_path(object_id, quality)
+    return mesh_path if os.path.exists(mesh_path) else None
+
+def save_mesh_artifact(object_id: str, code: str, meshed_instances: List[Dict[str, Any]], shapes: Dict[str, Any],
+                       quality: Optional[str] = None) -> str:
+    """
+    将细分结果写入网格产物文件
+
+    文件内容即 ref 负载模式下的完整3D结果，可以原样作为二进制传输响应发送。
+    先写临时文件再原子替换，避免并发读取到写了一半的文件。
+
+    Args:
+        object_id: 对象ID
+        code: 生成对象的代码
+        meshed_instances: 网格实例列表
+        shapes: 保留引用的shapes结构
+        quality: 细分质量等级（None 表示 TessellationConfig.DEFAULT_QUALITY）
+
+    Returns:
+        网格产物文件路径
+    """
+    quality = quality or TessellationConfig.DEFAULT_QUALITY
+    PathUtils.ensure_object_dir(object_id)
+    mesh_path = PathUtils.get_mesh_file_path(object_id, quality)
+    payload = encode_binary_payload({
+        "id": object_id,
+        "shapes": [shapes, meshed_instances],
+        "mesh_payload": "ref",
+        "quality": quality,
+        "code": code,
+        "render_mode": "3d",
+    })
+    atomic_write_bytes(mesh_path, payload)
+    return mesh_path
+
+def load_mesh_artifact(object_id: str, quality: Optional[str] = None) -> Optional[Tuple[List[Dict[str, Any]], Dict[str, Any]]]:
+    """
+    以内存映射方式读取网格产物
+
+    Returns:
+        (meshed_instances, 保留引用的shapes)，产物不存在时返回None
+    """
+    mesh_path = get_mesh_artifact_path(object_id, quality)
+    if not mesh_path:
+        return None
+    shapes, meshed_instances = load_binary_payload(mesh_path)["shapes"]
+    return meshed_instances, shapes
+
+def ensure_mesh_artifact(object_id: str, quality: Optional[str] = None
+                         ) -> Tuple[Optional[Tuple[List[Dict[str, Any]], Dict[str, Any]]], Optional[Dict[str, Any]]]:
+    """
+    获取对象指定细分质量的网格，产物不存在时细分并写入产物：
+    相同代码和质量命中细分缓存；否则对象有可还原部件结构的BREP产物时从BREP细分，
+    没有时（包括装配体等多部件对象）才在执行器中执行代码
+
+    同一产物的生成通过文件锁串行化，并发请求只细分一次
+
+    Returns:
+        ((meshed_instances, 保留引用的shapes), 错误信息)，成功时错误信息为None
+
+    Raises:
+        FileNotFoundError: 对象的代码文件不存在
+    """
+    artifact = load_mesh_artifact(object_id, quality)
+    if artifact:
+        return artifact, None
+
+    with file_lock(PathUtils.get_mesh_file_path(object_id, quality)):
+        artifact = load_mesh_artifact(object_id, quality)
+        if artifact:
+            return artifact, None
+
+        with open(PathUtils.get_generated_file_path(object_id), "r", encoding="utf-8") as f:
+            code = f.read()
+        # BREP只保存合并后的形状：记录了部件名称时从BREP细分，部件结构与执行代码相同；
+        # 否则执行代码，对象还没有BREP产物时顺便保存
+        brep_path = get_brep_artifact_path(object_id)
+        part_name = get_brep_part_name(object_id) if brep_path else None
+        tessellation, error_info = tessellate_code(
+            code, artifact_id=None if brep_path else object_id,
+            brep_path=brep_path if part_name else None, brep_part_name=part_name,
+            **get_quality_params(quality)
+        )
+        if error_info:
+            return None, error_info
+        meshed_instances, shapes = tessellation
+        save_mesh_artifact(object_id, code, meshed_instances, shapes, quality)
+        return tessellation, None
+
+# (对象ID, 质量) -> 正在进行的后台细化任务
+_refinements: Dict[Tuple[str, str], Future] = {}
+_refinements_lock = threading.Lock()
+_refine_executor: Optional[ThreadPoolExecutor] = None
+
+def _refine(object_id: str, quality: str):
+    try:
+        _, error_info = ensure_mesh_artifact(object_id, quality)
+        if error_info:
+            print(f"Mesh refinement of {object_id} ({quality}) failed: {error_info['type']}: {error_info['message']}")
+        else:
+            print(f"Mesh refinement of {object_id} ({quality}) finished")
+    except Exception as e:
+        print(f"Mesh refinement of {object_id} ({quality}) failed: {e}")
+    finally:
+        with _refinements_lock:
+            _refinements.pop((object_id, quality), None)
+
+def schedule_mesh_refinement(object_id: str, quality: str) -> None:
+    """在后台线程中生成对象指定质量的网格产物（已存在或已在进行时忽略）"""
+    global _refine_executor
+    if get_mesh_artifact_path(object_id, quality):
+        return
+    with _refinements_lock:
+        if (object_id, quality) in _refinements:
+            return
+        if _refine_executor is None:
+            _refine_executor = ThreadPoolExecutor(
+                max_workers=TessellationConfig.REFINE_WORKERS,
+                thread_name_prefix="mesh-refine"
+            )
+        _refinements[(object_id, quality)] = _refine_executor.submit(_refine, object_id, quality)
+
+def get_refinement_status(object_id: str, quality: str) -> Optional[str]:
+    """后台细化状态: "ready"（产物已存在）、"pending"（正在进行）或 None（未安排或已失败）"""
+    if get_mesh_artifact_path(object_id, quality):
+        return "ready"
+    with _refinements_lock:
+        return "pending" if (object_id, quality) in _refinements else None
+
+def wait_for_mesh_refinement(object_id: str, quality: str, timeout: Optional[float] = None) -> bool:
+    """等待后台细化完成，返回产物是否已存在"""
+    with _refinements_lock:
+        future = _refinements.get((object_id, quality))
+    if future is not None:
+        future.exception(timeout=timeout)
+    return get_mesh_artifact_path(object_id, quality) is not None
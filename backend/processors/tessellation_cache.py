@@ -0,0 +1,183 @@
+"""
+细分网格缓存
+以"规范化代码 + 细分参数 + 来源（执行代码或从BREP细分）"的内容哈希为键，缓存tessellation结果，
+供生成、历史回放等路径共享，避免对同一对象重复执行代码和OCC细分；
+未命中时代码在执行器进程池中执行。条目同时记录保存了BREP产物的对象，
+命中时为新对象复制该产物，导出时无需重新执行代码
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import CacheConfig
+from executor import executor_pool
+from .export_artifacts import copy_brep_artifact, save_brep_artifact
+
+# 细分结果: (meshed_instances, 保留引用的shapes)
+TessellationResult = Tuple[List[Dict[str, Any]], Dict[str, Any]]
+# 缓存值: (细分结果, 保存了BREP产物的对象ID)
+CacheEntry = Tuple[TessellationResult, Optional[str]]
+
+def normalize_code(code: str) -> str:
+    """规范化代码文本：统一换行符、去除行尾空白和空行"""
+    lines = code.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines if line.strip())
+
+def make_tessellation_key(code: str, params: Optional[Dict[str, Any]] = None, source: str = "code") -> str:
+    """
+    根据规范化代码、细分参数和细分来源计算缓存键
+
+    source 为 "code"（执行代码）或 "brep"（从BREP细分）：两者的部件结构不保证相同，不能共用缓存条目
+    """
+    digest = hashlib.sha256()
+    digest.update(normalize_code(code).encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(json.dumps(params or {}, sort_keys=True, default=str).encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(source.encode("utf-8"))
+    return digest.hexdigest()
+
+def estimate_payload_size(data: Any) -> int:
+    """估算缓存值占用的字节数（以NumPy数组为主）"""
+    if isinstance(data, np.ndarray):
+        return data.nbytes
+    if isinstance(data, dict):
+        return sum(estimate_payload_size(value) for value in data.values()) + 64
+    if isinstance(data, (list, tuple)):
+        return sum(estimate_payload_size(item) for item in data) + 16
+    if isinstance(data, str):
+        return len(data)
+    return 8
+
+class TessellationCache:
+    """按字节大小淘汰的线程安全LRU缓存"""
+
+    def __init__(self, max_bytes: int, max_entries: int):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[CacheEntry, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """获取缓存值，命中时移动到最近使用位置"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: str, value: CacheEntry) -> None:
+        """写入缓存值，超出容量时淘汰最久未使用的条目"""
+        size = estimate_payload_size(value)
+        if size > self.max_bytes:
+            # 单个对象超过整个缓存容量，不缓存
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._total_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self._total_bytes += size
+
+            while self._entries and (self._total_bytes > self.max_bytes or len(self._entries) > self.max_entries):
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._total_bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+# 进程内共享的缓存实例
+tessellation_cache = TessellationCache(
+    max_bytes=CacheConfig.TESSELLATION_CACHE_MAX_BYTES,
+    max_entries=CacheConfig.TESSELLATION_CACHE_MAX_ENTRIES,
+)
+
+def tessellate_code(code: str, on_progress: Optional[Callable[[str], None]] = None,
+                    artifact_id: Optional[str] = None, brep_path: Optional[str] = None,
+                    brep_part_name: Optional[str] = None, cancel_event: Optional[threading.Event] = None,
+                    **params) -> Tuple[Optional[TessellationResult], Optional[Dict[str, Any]]]:
+    """
+    获取代码对应对象的细分结果，未命中缓存时才在执行器进程中细分：
+    提供了对象的BREP产物时从BREP加载后细分，否则执行代码
+
+    Args:
+        code: 生成对象的CadQuery代码（同时用于计算缓存键）
+        on_progress: 接收执行阶段名称的回调
+        artifact_id: 对象ID，执行代码时顺便把对象的BREP保存为该对象的导出产物，
+                     命中缓存时复制缓存条目对应对象的BREP产物
+        brep_path: 对象已有的BREP产物路径（不再执行代码），只应用于可以还原部件结构的对象
+        brep_part_name: 从BREP细分时使用的部件名称，见 get_brep_part_name
+        cancel_event: 被设置时放弃执行，见 ExecutorPool.submit
+        **params: 传递给 tessellate_cad_objects 的细分参数
+
+    Returns:
+        ((meshed_instances, 保留引用的shapes), 错误信息)，成功时错误信息为None
+    """
+    key = make_tessellation_key(code, params, "brep" if brep_path else "code")
+    cached = tessellation_cache.get(key)
+    if cached is not None:
+        print(f"Tessellation cache hit: {key[:12]}")
+        tessellation, brep_object_id = cached
+        if artifact_id and brep_object_id and brep_object_id != artifact_id:
+            try:
+                # 复制失败时导出会回退为重新执行代码
+                copy_brep_artifact(brep_object_id, artifact_id)
+            except OSError as e:
+                print(f"Failed to copy BREP artifact from {brep_object_id} to {artifact_id}: {e}")
+        return tessellation, None
+
+    if brep_path:
+        with open(brep_path, "rb") as f:
+            brep = f.read()
+        result, error_info = executor_pool.submit("brep_tessellation", brep, params, brep_part_name,
+                                                  on_progress=on_progress, cancel_event=cancel_event)
+        artifact_id = None
+    else:
+        result, error_info = executor_pool.submit("cadquery", code, params, bool(artifact_id),
+                                                  on_progress=on_progress, cancel_event=cancel_event)
+    if error_info:
+        return None, error_info
+
+    brep_object_id = None
+    if artifact_id and result.get("brep"):
+        try:
+            save_brep_artifact(artifact_id, result["brep"], result.get("brep_part_name"))
+            brep_object_id = artifact_id
+        except OSError as e:
+            print(f"Failed to save BREP artifact for {artifact_id}: {e}")
+
+    tessellation = (result["meshed_instances"], result["shapes"])
+    if tessellation[0] and tessellation[1]:
+        tessellation_cache.put(key, (tessellation, brep_object_id))
+    return tessellation, None
@@ -1,14 +1,73 @@
-from ocp_tessellate.convert import to_ocpgroup, tessellate_group
+from typing import Any, Dict, Optional
+
+from app.config import TessellationConfig
+from app.startup import lazy_import
+
+# 网格负载模式:
+#   resolved - shapes 中的引用被替换为实际几何数据（兼容旧版前端，网格会随 meshed_instances 重复发送）
+#   ref      - 保留 {"ref": i} 引用，每个网格只在 meshed_instances 中发送一次，由前端解析
+MESH_PAYLOAD_MODES = ("resolved", "ref")
+DEFAULT_MESH_PAYLOAD = "resolved"
+
+# tessellate_group 使用的细分参数，其余关键字参数传给 to_ocpgroup
+TESSELLATION_PARAM_KEYS = ("deviation", "angular_tolerance", "edge_accuracy", "render_edges", "render_normals")
+
+def get_quality_params(quality: Optional[str] = None) -> Dict[str, Any]:
+    """获取细分质量等级对应的细分参数（None 表示 TessellationConfig.DEFAULT_QUALITY）"""
+    return dict(TessellationConfig.QUALITY_LEVELS[quality or TessellationConfig.DEFAULT_QUALITY])
+
+def resolve_shape_references(shapes_data, meshed_instances):
+    """递归地解析shapes中的引用，将ref替换为实际的几何数据"""
+    if isinstance(shapes_data, dict):
+        result = shapes_data.copy()
+
+        # 处理parts列表
+        if 'parts' in result and isinstance(result['parts'], list):
+            resolved_parts = []
+            for part in result['parts']:
+                resolved_part = resolve_shape_references(part, meshed_instances)
+                resolved_parts.append(resolved_part)
+            result['parts'] = resolved_parts
+
+        # 如果这是一个shape对象且有ref，替换为实际数据
+        if 'shape' in result and isinstance(result['shape'], dict) and 'ref' in result['shape']:
+            ref_index = result['shape']['ref']
+            if 0 <= ref_index < len(meshed_instances):
+                # 将引用替换为实际的几何数据
+                mesh_data = meshed_instances[ref_index]
+                result['shape'] = {
+                    'vertices': mesh_data.get('vertices', []),
+                    'triangles': mesh_data.get('triangles', []),
+                    'normals': mesh_data.get('normals', []),
+                    'edges': mesh_data.get('edges', []),
+                    'face_types': mesh_data.get('face_types', []),
+                    'edge_types': mesh_data.get('edge_types', []),
+                }
+
+        return result
+    elif isinstance(shapes_data, list):
+        return [resolve_shape_references(item, meshed_instances) for item in shapes_data]
+    else:
+        return shapes_data
 
 def tessellate_cad_objects(
-    *cad_objs, names=None, colors=None, alphas=None, progress=None, **kwargs
+    *cad_objs, names=None, colors=None, alphas=None, progress=None, resolve_refs=True, **kwargs
 ):
     """
     Tessellates CAD objects using ocp-tessellate v3.0.16.
     This version uses the to_ocpgroup function (not to_ocp_group).
+    ocp_tessellate (and with it OCP) is imported on first use only.
+
+    When resolve_refs is False the shapes keep the {"ref": i} indices produced
+    by tessellate_group, so every mesh only lives in meshed_instances.
+    Tessellation parameters (TESSELLATION_PARAM_KEYS, e.g. deviation and
+    angular_tolerance) are passed to tessellate_group, everything else to to_ocpgroup.
     """
+    convert = lazy_import("ocp_tessellate.convert")
+    tessellation_params = {key: kwargs.pop(key) for key in TESSELLATION_PARAM_KEYS if key in kwargs}
+
     # Create an OcpGroup from the CAD objects using the correct function name.
-    group, instances = to_ocpgroup(
+    group, instances = convert.to_ocpgroup(
         *cad_objs,
         names=names,
         colors=colors,
@@ -19,44 +78,28 @@ def tessellate_cad_objects(
 
     # Perform the tessellation using tessellate_group with correct parameter order
     # The function returns 3 values: meshed_instances, shapes, mapping
-    meshed_instances, shapes, mapping = tessellate_group(group, instances, progress=progress)
-    
-    # Process shapes to include actual mesh data instead of references
-    def resolve_shape_references(shapes_data, meshed_instances):
-        """递归地解析shapes中的引用，将ref替换为实际的几何数据"""
-        if isinstance(shapes_data, dict):
-            result = shapes_data.copy()
-
-            # 处理parts列表
-            if 'parts' in result and isinstance(result['parts'], list):
-                resolved_parts = []
-                for part in result['parts']:
-                    resolved_part = resolve_shape_references(part, meshed_instances)
-                    resolved_parts.append(resolved_part)
-                result['parts'] = resolved_parts
-
-            # 如果这是一个shape对象且有ref，替换为实际数据
-            if 'shape' in result and isinstance(result['shape'], dict) and 'ref' in result['shape']:
-                ref_index = result['shape']['ref']
-                if 0 <= ref_index < len(meshed_instances):
-                    # 将引用替换为实际的几何数据
-                    mesh_data = meshed_instances[ref_index]
-                    result['shape'] = {
-                        'vertices': mesh_data.get('vertices', []),
-                        'triangles': mesh_data.get('triangles', []),
-                        'normals': mesh_data.get('normals', []),
-                        'edges': mesh_data.get('edges', []),
-                        'face_types': mesh_data.get('face_types', []),
-                        'edge_types': mesh_data.get('edge_types', []),
-                    }
-
-            return result
-        elif isinstance(shapes_data, list):
-            return [resolve_shape_references(item, meshed_instances) for item in shapes_data]
-        else:
-            return shapes_data
-    
+    meshed_instances, shapes, mapping = convert.tessellate_group(group, instances, tessellation_params, progress=progress)
+
+    if not resolve_refs:
+        return meshed_instances, shapes, mapping
+
     # 解析所有引用
     resolved_shapes = resolve_shape_references(shapes, meshed_instances)
-    
-    return meshed_instances, resolved_shapes, mapping 
\ No newline at end of file
+
+    return meshed_instances, resolved_shapes, mapping
+
+def build_shapes_payload(meshed_instances, shapes, mesh_payload: str = DEFAULT_MESH_PAYLOAD):
+    """
+    根据负载模式构建返回给前端的 [shapes, meshed_instances]
+
+    Args:
+        meshed_instances: tessellate_group 生成的网格实例列表
+        shapes: 保留引用（未解析）的shapes结构
+        mesh_payload: 负载模式，见 MESH_PAYLOAD_MODES
+
+    Returns:
+        [shapes, meshed_instances] 列表
+    """
+    if mesh_payload == "ref":
+        return [shapes, meshed_instances]
+    return [resolve_shape_references(shapes, meshed_instances), meshed_instances]
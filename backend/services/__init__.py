@@ -5,8 +5,12 @@
 
 from .cad_service import CADService
 from .conversation_service import ConversationService
+from .job_service import JobManager, JobQueueFullError, job_manager
 
 __all__ = [
     'CADService',
-    'ConversationService'
+    'ConversationService',
+    'JobManager',
+    'JobQueueFullError',
+    'job_manager'
 ] 
\ No newline at end of file
@@ -3,13 +3,21 @@ CAD服务层
 封装CAD生成的核心业务逻辑
 """
 
-from typing import Dict, Any, Optional, Tuple, List
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
+from typing import Dict, Any, Optional, Tuple, List, Callable
+import threading
 import traceback
 
-from generators import generate_cq_obj, generate_schemdraw_code
-from processors import tessellate_cad_objects
+from generators import generate_cq_obj, generate_schemdraw_code, CompletionCancelled
+from generators.streaming import ProgressCallback
+from processors import (
+    build_shapes_payload, save_mesh_artifact, schedule_pre_export, schedule_mesh_refinement,
+    get_refinement_status, DEFAULT_MESH_PAYLOAD
+)
 from ai import analyze_errors_with_ai
-from models import ConversationManager
+from models import ConversationManager, query_index
+from app.config import AIConfig, CacheConfig, PathUtils, TessellationConfig
 from utils import validate_api_request_data, sanitize_user_input
 
 class CADService:
@@ -19,7 +27,13 @@ class CADService:
         self.conversation_manager = ConversationManager()
         self.max_retries = 3
     
-    def generate_cad(self, query: str, conversation_id: Optional[str] = None, render_mode: str = "3d") -> Dict[str, Any]:
+    def generate_cad(self, query: str, conversation_id: Optional[str] = None, render_mode: str = "3d",
+                     mesh_payload: str = DEFAULT_MESH_PAYLOAD,
+                     progress_callback: Optional[ProgressCallback] = None,
+                     reuse_similar: Optional[bool] = None,
+                     candidates: Optional[int] = None,
+                     quality: Optional[str] = None,
+                     progressive: bool = False) -> Dict[str, Any]:
         """
         生成CAD对象的主要业务逻辑
         
@@ -27,44 +41,199 @@ class CADService:
             query: 用户查询
             conversation_id: 对话ID（可选）
             render_mode: 渲染模式 ('2d' 或 '3d')
+            mesh_payload: 3D网格负载模式 ('resolved' 或 'ref')
+            progress_callback: 进度回调 (事件名, 数据)，用于流式推送生成过程
+            reuse_similar: 新对话的查询与历史成功查询规范化后完全相同时是否直接复用已有结果
+                           （None 表示使用 CacheConfig.QUERY_MATCH_AUTO_REUSE），只是相似时只附带 similar_result
+            candidates: 首轮并行生成的候选数量（None 表示使用 AIConfig.SPECULATIVE_CANDIDATES）
+            quality: 3D网格细分质量（None 表示 TessellationConfig.DEFAULT_QUALITY）
+            progressive: 渐进模式，先返回 TessellationConfig.PROGRESSIVE_PREVIEW_QUALITY 的粗网格，
+                         quality 质量的网格在后台生成，通过结果中的 refinement 获取
         
         Returns:
             生成结果字典
         """
         # 输入验证和清理
         query = sanitize_user_input(query)
+        quality = quality or TessellationConfig.DEFAULT_QUALITY
+        
+        # 新对话先在历史首轮查询中查找相似的成功结果
+        similar = None
+        if not conversation_id:
+            similar = query_index.find_similar(query, render_mode, CacheConfig.QUERY_MATCH_THRESHOLD)
+            if reuse_similar is None:
+                reuse_similar = CacheConfig.QUERY_MATCH_AUTO_REUSE
+            reuse_similar = bool(similar and reuse_similar and similar["exact"])
         
         # 处理对话历史
         conversation_history = []
+        base_code = None
         if conversation_id:
             conversation_history = self.conversation_manager.get_conversation_history(conversation_id)
+            # 后续修改以当前代码为基础，模型只需返回修改部分
+            base_code = self.conversation_manager.get_current_code(conversation_id, render_mode)
             # 添加用户消息到对话
             self.conversation_manager.add_user_message(conversation_id, query)
         else:
             # 创建新对话
             conversation_id = self.conversation_manager.create_conversation(query)
         
+        self._emit(progress_callback, "conversation", {"conversation_id": conversation_id, "render_mode": render_mode})
+        
+        if similar and reuse_similar:
+            result = self._reuse_similar_result(conversation_id, similar, mesh_payload, progress_callback, quality)
+            if result:
+                return result
+        
+        if candidates is None:
+            candidates = AIConfig.SPECULATIVE_CANDIDATES
+        
         # 根据渲染模式选择生成策略
         if render_mode == "2d":
-            return self._generate_2d_cad(query, conversation_id, conversation_history)
+            result = self._generate_2d_cad(query, conversation_id, conversation_history, progress_callback, candidates)
         else:
-            return self._generate_3d_cad(query, conversation_id, conversation_history)
+            result = self._generate_3d_cad(query, conversation_id, conversation_history, mesh_payload,
+                                           progress_callback, candidates, quality, progressive, base_code)
+        
+        if similar and not reuse_similar:
+            # 未自动复用时附带相似的历史结果，由前端提示用户
+            result["similar_result"] = similar
+        return result
     
-    def _generate_2d_cad(self, query: str, conversation_id: str, conversation_history: List[Dict[str, str]]) -> Dict[str, Any]:
+    def _reuse_similar_result(self, conversation_id: str, similar: Dict[str, Any], mesh_payload: str,
+                              progress_callback: Optional[ProgressCallback],
+                              quality: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """复用相似查询已有的成功结果，结果无法读取时返回None（回退到正常生成）"""
+        result = self.conversation_manager.get_object_result(similar["object_id"], similar["render_mode"], mesh_payload,
+                                                             quality)
+        if "error" in result:
+            print(f"Similar result {similar['object_id']} unavailable: {result['error']}")
+            return None
+        
+        print(f"Reusing result of similar query '{similar['query']}' (score {similar['score']})")
+        self._emit(progress_callback, "reused", similar)
+        self.conversation_manager.add_assistant_message(
+            conversation_id, result["code"], similar["object_id"], None, similar["render_mode"]
+        )
+        
+        result.update({
+            "success": True,
+            "conversation_id": conversation_id,
+            "generator": "schemdraw" if similar["render_mode"] == "2d" else "cadquery",
+            "reused_from": similar
+        })
+        return result
+    
+    @staticmethod
+    def _emit(progress_callback: Optional[ProgressCallback], event: str, data: Dict[str, Any]):
+        """推送进度事件（未提供回调时忽略）"""
+        if progress_callback:
+            progress_callback(event, data)
+    
+    def _start_attempt(self, attempt: int, accumulated_errors: List[Dict[str, Any]],
+                       progress_callback: Optional[ProgressCallback]) -> Optional[str]:
+        """开始一次生成尝试，返回重试时需要反馈给模型的错误信息"""
+        error_message = None
+        if attempt > 0:
+            last_error = accumulated_errors[-1] if accumulated_errors else None
+            if last_error:
+                error_message = f"{last_error['type']}: {last_error['message']}"
+            self._emit(progress_callback, "retry", {
+                "attempt": attempt + 1,
+                "max_retries": self.max_retries,
+                "error": error_message
+            })
+        else:
+            self._emit(progress_callback, "generating", {"attempt": 1, "max_retries": self.max_retries})
+        return error_message
+    
+    def _analyze_errors(self, query: str, accumulated_errors: List[Dict[str, Any]],
+                        progress_callback: Optional[ProgressCallback]) -> str:
+        """所有尝试失败后使用AI分析错误"""
+        self._emit(progress_callback, "analyzing_errors", {"error_count": len(accumulated_errors)})
+        return analyze_errors_with_ai(query, accumulated_errors)
+    
+    def _generate_candidates(self, generator: Callable, is_valid: Callable[[Tuple], bool], query: str,
+                             conversation_history: List[Dict[str, str]], candidates: int,
+                             accumulated_errors: List[Dict[str, Any]],
+                             progress_callback: Optional[ProgressCallback]) -> Tuple:
+        """
+        并行生成多个候选，返回第一个有效候选的生成结果
+        
+        第一个候选使用模型默认温度（可命中补全缓存），其余候选依次使用 AIConfig.SPECULATIVE_TEMPERATURES。
+        有候选成功后取消其余候选：停止接收模型输出，尚未开始执行的代码不再执行，正在执行的任务所在的工作进程被杀死并替换。
+        全部失败时，其余候选的错误加入 accumulated_errors，返回第一个失败的结果交由重试流程处理
+        """
+        cancel_event = threading.Event()
+        temperatures = [None] + list(AIConfig.SPECULATIVE_TEMPERATURES)
+        self._emit(progress_callback, "candidates", {"count": candidates})
+        
+        def run_candidate(index: int) -> Tuple:
+            def candidate_callback(event: str, data: Dict[str, Any]):
+                # 只转发第一个候选的token和计划，其余候选只推送阶段事件
+                if index > 0 and event in ("token", "plan"):
+                    return
+                progress_callback(event, {**data, "candidate": index})
+            
+            return generator(
+                query, conversation_history, None,
+                candidate_callback if progress_callback else None,
+                temperature=temperatures[index % len(temperatures)],
+                use_cache=index == 0,
+                cancel_event=cancel_event
+            )
+        
+        failures = []
+        pool = ThreadPoolExecutor(max_workers=candidates, thread_name_prefix="candidate")
+        futures = {pool.submit(run_candidate, index): index for index in range(candidates)}
+        try:
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    result = future.result()
+                except CompletionCancelled:
+                    continue
+                except Exception as e:
+                    failures.append((None, None, {
+                        "type": type(e).__name__,
+                        "message": str(e),
+                        "traceback": traceback.format_exc()
+                    }))
+                    continue
+                
+                if is_valid(result):
+                    print(f"Candidate {index + 1}/{candidates} succeeded, cancelling the others")
+                    self._emit(progress_callback, "candidate_selected", {"candidate": index})
+                    return result
+                failures.append(result)
+        finally:
+            cancel_event.set()
+            pool.shutdown(wait=False, cancel_futures=True)
+        
+        print(f"All {candidates} candidates failed")
+        for failure in failures[1:]:
+            if failure[2]:
+                accumulated_errors.append(failure[2])
+        return failures[0]
+    
+    def _generate_2d_cad(self, query: str, conversation_id: str, conversation_history: List[Dict[str, str]],
+                         progress_callback: Optional[ProgressCallback] = None, candidates: int = 1) -> Dict[str, Any]:
         """生成2D CAD的业务逻辑"""
         accumulated_errors = []
         
         for attempt in range(self.max_retries):
             try:
                 # 获取错误信息（如果是重试）
-                error_message = None
-                if attempt > 0:
-                    last_error = accumulated_errors[-1] if accumulated_errors else None
-                    if last_error:
-                        error_message = f"{last_error['type']}: {last_error['message']}"
+                error_message = self._start_attempt(attempt, accumulated_errors, progress_callback)
 
-                # 生成schemdraw代码
-                result = generate_schemdraw_code(query, conversation_history, error_message)
+                # 生成schemdraw代码（首轮可并行生成多个候选）
+                if attempt == 0 and candidates > 1:
+                    result = self._generate_candidates(
+                        generate_schemdraw_code, lambda candidate: not candidate[2],
+                        query, conversation_history, candidates, accumulated_errors, progress_callback
+                    )
+                else:
+                    result = generate_schemdraw_code(query, conversation_history, error_message, progress_callback)
 
                 if len(result) == 3:
                     object_id, svg_content, error_info = result
@@ -80,7 +249,7 @@ class CADService:
 
                         if attempt == self.max_retries - 1:
                             # 最后一次重试失败，使用AI分析错误
-                            friendly_error = analyze_errors_with_ai(query, accumulated_errors)
+                            friendly_error = self._analyze_errors(query, accumulated_errors, progress_callback)
                             self.conversation_manager.add_assistant_message(
                                 conversation_id, "", None, friendly_error, "2d"
                             )
@@ -95,7 +264,7 @@ class CADService:
 
                     # 生成成功
                     # 读取生成的代码
-                    with open(f"data/generated/{object_id}.py", "r", encoding="utf-8") as f:
+                    with open(PathUtils.get_generated_file_path(object_id), "r", encoding="utf-8") as f:
                         generated_code = f.read()
 
                     self.conversation_manager.add_assistant_message(
@@ -127,7 +296,7 @@ class CADService:
                 accumulated_errors.append(system_error)
 
                 if attempt == self.max_retries - 1:
-                    friendly_error = analyze_errors_with_ai(query, accumulated_errors)
+                    friendly_error = self._analyze_errors(query, accumulated_errors, progress_callback)
                     return {
                         "success": False,
                         "error": friendly_error,
@@ -145,24 +314,42 @@ class CADService:
             "generator": "schemdraw"
         }
 
-    def _generate_3d_cad(self, query: str, conversation_id: str, conversation_history: List[Dict[str, str]]) -> Dict[str, Any]:
-        """生成3D CAD的业务逻辑"""
+    @staticmethod
+    def _is_valid_3d_result(result: Tuple) -> bool:
+        """3D候选是否执行成功且得到了非空的细分结果"""
+        _, tessellation, error_info = result
+        return not error_info and bool(tessellation and tessellation[0] and tessellation[1])
+
+    def _generate_3d_cad(self, query: str, conversation_id: str, conversation_history: List[Dict[str, str]],
+                         mesh_payload: str = DEFAULT_MESH_PAYLOAD,
+                         progress_callback: Optional[ProgressCallback] = None, candidates: int = 1,
+                         quality: Optional[str] = None, progressive: bool = False,
+                         base_code: Optional[str] = None) -> Dict[str, Any]:
+        """
+        生成3D CAD的业务逻辑，渐进模式下先以预览质量细分，quality 质量的网格在后台生成；
+        base_code 为对话的当前代码时，首次尝试以编辑模式只请求修改部分
+        """
         accumulated_errors = []
+        quality = quality or TessellationConfig.DEFAULT_QUALITY
+        mesh_quality = TessellationConfig.PROGRESSIVE_PREVIEW_QUALITY if progressive else quality
+        generator = partial(generate_cq_obj, quality=mesh_quality, base_code=base_code)
 
         for attempt in range(self.max_retries):
             try:
                 # 获取错误信息（如果是重试）
-                error_message = None
-                if attempt > 0:
-                    last_error = accumulated_errors[-1] if accumulated_errors else None
-                    if last_error:
-                        error_message = f"{last_error['type']}: {last_error['message']}"
+                error_message = self._start_attempt(attempt, accumulated_errors, progress_callback)
 
-                # 生成CadQuery代码
-                result = generate_cq_obj(query, conversation_history, error_message)
+                # 生成CadQuery代码（代码在执行器进程中执行并细分，首轮可并行生成多个候选）
+                if attempt == 0 and candidates > 1:
+                    result = self._generate_candidates(
+                        generator, self._is_valid_3d_result,
+                        query, conversation_history, candidates, accumulated_errors, progress_callback
+                    )
+                else:
+                    result = generator(query, conversation_history, error_message, progress_callback)
 
                 if len(result) == 3:
-                    object_id, obj, error_info = result
+                    object_id, tessellation, error_info = result
 
                     if error_info:
                         # CadQuery代码执行失败
@@ -174,7 +361,7 @@ class CADService:
                         accumulated_errors.append(error_info)
 
                         if attempt == self.max_retries - 1:
-                            friendly_error = analyze_errors_with_ai(query, accumulated_errors)
+                            friendly_error = self._analyze_errors(query, accumulated_errors, progress_callback)
                             self.conversation_manager.add_assistant_message(
                                 conversation_id, "", None, friendly_error, "3d"
                             )
@@ -187,9 +374,13 @@ class CADService:
                             }
                         continue
 
-                    # CadQuery生成成功，尝试tessellation
+                    # 读取生成的代码
+                    with open(PathUtils.get_generated_file_path(object_id), "r", encoding="utf-8") as f:
+                        generated_code = f.read()
+
+                    # CadQuery生成成功，检查tessellation结果（已写入缓存，供历史回放复用）
                     try:
-                        meshed_instances, shapes, mapping = tessellate_cad_objects(obj)
+                        meshed_instances, shapes = tessellation
 
                         if not shapes or not meshed_instances:
                             # tessellation失败
@@ -205,7 +396,7 @@ class CADService:
                             accumulated_errors.append(tessellation_error)
 
                             if attempt == self.max_retries - 1:
-                                friendly_error = analyze_errors_with_ai(query, accumulated_errors)
+                                friendly_error = self._analyze_errors(query, accumulated_errors, progress_callback)
                                 return {
                                     "success": False,
                                     "error": friendly_error,
@@ -216,9 +407,22 @@ class CADService:
                             continue
 
                         # 3D生成完全成功
-                        # 读取生成的代码
-                        with open(f"data/generated/{object_id}.py", "r", encoding="utf-8") as f:
-                            generated_code = f.read()
+                        # 持久化网格产物，历史回放和重启后无需重新执行代码
+                        try:
+                            save_mesh_artifact(object_id, generated_code, meshed_instances, shapes, mesh_quality)
+                        except Exception as artifact_error:
+                            print(f"Failed to save mesh artifact for {object_id}: {artifact_error}")
+                        # 在后台从BREP预先导出常用下载格式
+                        schedule_pre_export(object_id)
+                        refinement = None
+                        if mesh_quality != quality:
+                            # 渐进模式：先返回粗网格，在后台细分目标质量的网格
+                            schedule_mesh_refinement(object_id, quality)
+                            refinement = {
+                                "quality": quality,
+                                "status": get_refinement_status(object_id, quality),
+                                "mesh_url": f"/cad/{object_id}/mesh?quality={quality}"
+                            }
 
                         self.conversation_manager.add_assistant_message(
                             conversation_id, generated_code, object_id, None, "3d"
@@ -228,7 +432,10 @@ class CADService:
                             "success": True,
                             "id": object_id,
                             # 将 shapes 和 meshed_instances 打包成一个数组
-                            "shapes": [shapes, meshed_instances],
+                            "shapes": build_shapes_payload(meshed_instances, shapes, mesh_payload),
+                            "mesh_payload": mesh_payload,
+                            "quality": mesh_quality,
+                            "refinement": refinement,
                             "code": generated_code,
                             "render_mode": "3d",
                             "conversation_id": conversation_id,
@@ -250,7 +457,7 @@ class CADService:
                         accumulated_errors.append(system_error)
 
                         if attempt == self.max_retries - 1:
-                            friendly_error = analyze_errors_with_ai(query, accumulated_errors)
+                            friendly_error = self._analyze_errors(query, accumulated_errors, progress_callback)
                             return {
                                 "success": False,
                                 "error": friendly_error,
@@ -274,7 +481,7 @@ class CADService:
                 accumulated_errors.append(system_error)
 
                 if attempt == self.max_retries - 1:
-                    friendly_error = analyze_errors_with_ai(query, accumulated_errors)
+                    friendly_error = self._analyze_errors(query, accumulated_errors, progress_callback)
                     return {
                         "success": False,
                         "error": friendly_error,
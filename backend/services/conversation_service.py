@@ -3,7 +3,9 @@
 封装对话管理的业务逻辑
 """
 from typing import Dict, Any, List, Optional
+from app.config import StorageConfig
 from models.conversation import ConversationManager
+from processors.mesh_artifacts import get_mesh_artifact_path
 
 class ConversationService:
     """对话管理服务"""
@@ -11,25 +13,42 @@ class ConversationService:
     def __init__(self):
         self.conversation_manager = ConversationManager()
 
-    def get_recent_conversations(self, limit: int = 50) -> List[Dict[str, Any]]:
-        """获取最近的对话列表"""
-        all_convos = self.conversation_manager.get_all_conversations()
-        return all_convos[:limit]
+    def get_recent_conversations(self, limit: Optional[int] = None, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """获取最近的对话列表（游标分页），返回 conversations 和 next_cursor"""
+        if limit is None:
+            limit = StorageConfig.CONVERSATION_PAGE_SIZE
+        return self.conversation_manager.list_conversation_summaries(limit, cursor)
 
     def get_conversation_detail(self, conversation_id: str) -> Optional[Dict[str, Any]]:
         """获取对话详细信息"""
         return self.conversation_manager.get_conversation_detail(conversation_id)
 
-    def get_message_result(self, conversation_id: str, message_index: int) -> Optional[Dict[str, Any]]:
+    def get_message_result(self, conversation_id: str, message_index: int, mesh_payload: str = "resolved",
+                           quality: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """获取单个消息的结果"""
-        return self.conversation_manager.get_message_result(conversation_id, message_index)
-
-    # 其他方法可以保持原样，因为它们大多是简单的调用
-    def search_conversations(self, query: str, limit: int = 50) -> List[Dict[str, Any]]:
-        """搜索对话"""
-        # 注意：这里的搜索返回的是原始对话，需要包装成摘要
-        conversations = self.conversation_manager.search_conversations(query, limit)
-        return [self.conversation_manager.get_conversation_summary(conv) for conv in conversations]
+        return self.conversation_manager.get_message_result(conversation_id, message_index, mesh_payload, quality)
+
+    def get_message(self, conversation_id: str, message_index: int) -> Optional[Dict[str, Any]]:
+        """获取对话中的单条原始消息，不存在时返回None"""
+        return self.conversation_manager.get_message(conversation_id, message_index)
+
+    def get_message_mesh_artifact(self, conversation_id: str, message_index: int,
+                                  quality: Optional[str] = None) -> Optional[str]:
+        """获取3D消息结果对应的网格产物路径，不存在时返回None"""
+        message = self.conversation_manager.get_message(conversation_id, message_index)
+        if not message or message["role"] != "assistant" or message.get("render_mode") != "3d":
+            return None
+        if not message.get("object_id"):
+            return None
+        return get_mesh_artifact_path(message["object_id"], quality)
+
+    def search_conversations(self, query: str, limit: Optional[int] = None, offset: int = 0) -> Dict[str, Any]:
+        """搜索对话，返回 conversations、total 和 next_offset（没有更多结果时为None）"""
+        if limit is None:
+            limit = StorageConfig.CONVERSATION_PAGE_SIZE
+        page = self.conversation_manager.search_conversations(query, limit, offset)
+        page["next_offset"] = offset + limit if offset + limit < page["total"] else None
+        return page
 
     def delete_conversation(self, conversation_id: str) -> Dict[str, Any]:
         """删除对话"""
@@ -0,0 +1,171 @@
+"""
+异步任务服务
+在固定大小的后台线程池中执行耗时的CAD生成任务，提交后立即返回任务ID，
+客户端通过任务ID轮询状态与结果；任务不依赖客户端连接，结果在TTL内可重复获取
+"""
+
+import queue
+import threading
+import time
+import traceback
+import uuid
+from typing import Any, Callable, Dict, Optional
+
+from app.config import JobConfig
+
+# 任务状态
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+class JobQueueFullError(Exception):
+    """任务队列已满，无法接受新任务"""
+
+class JobManager:
+    """有界队列 + 固定数量工作线程的异步任务管理器"""
+
+    def __init__(self, workers: int, queue_size: int, result_ttl: int):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.result_ttl = result_ttl
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue(maxsize=queue_size)
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._handlers: Dict[str, Callable[..., Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        """启动工作线程（可重复调用）"""
+        with self._lock:
+            if self._threads:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._worker_loop, name=f"job-worker-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, handler: Callable[..., Dict[str, Any]], **kwargs) -> Dict[str, Any]:
+        """
+        提交任务
+
+        Args:
+            handler: 任务函数，额外接收 progress_callback 参数，返回结果字典
+            **kwargs: 传递给任务函数的参数
+
+        Returns:
+            任务状态字典
+
+        Raises:
+            JobQueueFullError: 排队任务数已达上限
+        """
+        self.start()
+        self._purge_expired()
+
+        job_id = uuid.uuid4().hex
+        job = {
+            "job_id": job_id,
+            "status": JOB_QUEUED,
+            "progress": None,
+            "result": None,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+        }
+
+        with self._lock:
+            self._jobs[job_id] = job
+            self._handlers[job_id] = lambda progress_callback: handler(progress_callback=progress_callback, **kwargs)
+
+        try:
+            self._queue.put_nowait(job_id)
+        except queue.Full:
+            with self._lock:
+                self._jobs.pop(job_id, None)
+                self._handlers.pop(job_id, None)
+            raise JobQueueFullError(f"任务队列已满（{self.queue_size}），请稍后重试") from None
+
+        print(f"Job {job_id} queued ({self._queue.qsize()}/{self.queue_size})")
+        return self._snapshot(job)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """获取任务状态，任务不存在或已过期时返回None"""
+        self._purge_expired()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return self._snapshot(job) if job else None
+
+    def stats(self) -> Dict[str, Any]:
+        """获取任务队列统计信息"""
+        with self._lock:
+            counts = {JOB_QUEUED: 0, JOB_RUNNING: 0, JOB_SUCCEEDED: 0, JOB_FAILED: 0}
+            for job in self._jobs.values():
+                counts[job["status"]] += 1
+            return {
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "queue_depth": self._queue.qsize(),
+                "result_ttl": self.result_ttl,
+                "jobs": counts,
+            }
+
+    def _worker_loop(self):
+        """工作线程：依次取出任务并执行"""
+        while True:
+            job_id = self._queue.get()
+            with self._lock:
+                job = self._jobs.get(job_id)
+                handler = self._handlers.pop(job_id, None)
+                if job is None or handler is None:
+                    continue
+                job["status"] = JOB_RUNNING
+                job["started_at"] = time.time()
+
+            def progress_callback(event: str, data: Dict[str, Any]):
+                # 逐token事件过于频繁，只记录阶段性进度
+                if event == "token":
+                    return
+                with self._lock:
+                    job["progress"] = {"event": event, "data": data}
+
+            try:
+                result = handler(progress_callback)
+                status = JOB_SUCCEEDED if result.get("success") else JOB_FAILED
+            except Exception as e:
+                print(f"Job {job_id} crashed: {e}")
+                traceback.print_exc()
+                result = {
+                    "success": False,
+                    "error": "服务器内部错误",
+                    "message": str(e)
+                }
+                status = JOB_FAILED
+
+            with self._lock:
+                job["status"] = status
+                job["result"] = result
+                job["finished_at"] = time.time()
+            print(f"Job {job_id} {status} in {job['finished_at'] - job['started_at']:.1f}s")
+
+    def _purge_expired(self):
+        """清理超过TTL的已完成任务"""
+        deadline = time.time() - self.result_ttl
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job["finished_at"] is not None and job["finished_at"] < deadline
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+    @staticmethod
+    def _snapshot(job: Dict[str, Any]) -> Dict[str, Any]:
+        """复制任务状态（结果字典只读共享，不深拷贝）"""
+        return dict(job)
+
+# 进程内共享的任务管理器实例
+job_manager = JobManager(
+    workers=JobConfig.WORKERS,
+    queue_size=JobConfig.QUEUE_SIZE,
+    result_ttl=JobConfig.RESULT_TTL,
+)
@@ -0,0 +1,90 @@
+"""
+二进制网格传输格式（CQMB）的编码与解码（前端 decodeMeshPayload 按同样的布局解码）
+"""
+
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from utils.binary_utils import (
+    BUFFER_ALIGNMENT, MESH_FORMAT_VERSION, MESH_MAGIC, _PREFIX, decode_binary_payload, encode_binary_payload,
+    get_binary_payload_stats, load_binary_payload
+)
+
+def payload_data():
+    return {
+        "success": True,
+        "id": "01J0000000000000000000000",
+        "shapes": [
+            {"parts": [{"name": "box", "shape": {"ref": 0}}]},
+            [{
+                "vertices": np.array([0, 0, 0, 1, 0, 0, 1, 1, 0], dtype=np.float64),
+                "triangles": np.array([0, 1, 2], dtype=np.uint64),
+                "normals": np.array([0, 0, 1] * 3, dtype=np.float32),
+                "face_types": np.array([7], dtype=np.int64),
+                "quantized": np.array([1, 65535, 3], dtype=np.uint16),
+                "oct": np.array([0, 255, 128], dtype=np.uint8),
+                "flags": np.array([True, False, True]),
+            }],
+        ],
+    }
+
+class BinaryPayloadTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        data = payload_data()
+        decoded = decode_binary_payload(encode_binary_payload(data))
+        self.assertEqual(decoded["success"], True)
+        self.assertEqual(decoded["shapes"][0], data["shapes"][0])
+        mesh, original = decoded["shapes"][1][0], data["shapes"][1][0]
+        for name, dtype in (("vertices", "<f4"), ("triangles", "<u4"), ("normals", "<f4"), ("face_types", "<i4"),
+                            ("quantized", "<u2"), ("oct", "<u1"), ("flags", "<u1")):
+            self.assertEqual(mesh[name].dtype, np.dtype(dtype), name)
+            np.testing.assert_array_equal(mesh[name], original[name].astype(dtype))
+
+    def test_buffers_are_aligned(self):
+        payload = encode_binary_payload(payload_data())
+        magic, version, header_length, reserved = _PREFIX.unpack_from(payload, 0)
+        self.assertEqual((magic, version, reserved), (MESH_MAGIC, MESH_FORMAT_VERSION, 0))
+
+        data_start = _PREFIX.size + header_length
+        self.assertEqual(data_start % BUFFER_ALIGNMENT, 0)
+        header = json.loads(payload[_PREFIX.size:data_start])
+        end = 0
+        for spec in header["buffers"]:
+            self.assertEqual(spec["offset"] % BUFFER_ALIGNMENT, 0)
+            self.assertGreaterEqual(spec["offset"], end)
+            end = spec["offset"] + spec["length"]
+        self.assertEqual(len(payload) - data_start, -(-end // BUFFER_ALIGNMENT) * BUFFER_ALIGNMENT)
+        self.assertEqual(get_binary_payload_stats(payload), (data_start, len(payload) - data_start))
+
+    def test_arrays_are_views_on_buffer(self):
+        payload = bytearray(encode_binary_payload(payload_data()))
+        vertices = decode_binary_payload(payload)["shapes"][1][0]["vertices"]
+        self.assertFalse(vertices.flags.owndata)
+
+    def test_multidimensional_and_empty_arrays(self):
+        data = {"matrix": np.arange(6, dtype=np.float32).reshape(2, 3), "empty": np.zeros(0, dtype=np.uint32)}
+        decoded = decode_binary_payload(encode_binary_payload(data))
+        np.testing.assert_array_equal(decoded["matrix"], data["matrix"])
+        self.assertEqual(decoded["empty"].shape, (0,))
+
+    def test_load_from_file(self):
+        payload = encode_binary_payload(payload_data())
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "object.mesh")
+            with open(path, "wb") as f:
+                f.write(payload)
+            decoded = load_binary_payload(path)
+            np.testing.assert_array_equal(decoded["shapes"][1][0]["triangles"], [0, 1, 2])
+
+    def test_invalid_magic(self):
+        payload = b"XXXX" + encode_binary_payload({"a": 1})[4:]
+        with self.assertRaises(ValueError):
+            decode_binary_payload(payload)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,154 @@
+"""
+生成代码的静态检查
+"""
+
+import unittest
+from unittest import mock
+
+from generators import code_checker
+from generators.code_checker import find_code_issues
+
+# 执行器进程收集的API名称的一个子集
+SURFACE = {
+    "modules": {
+        "cadquery": {"Workplane", "Vector", "Location", "exporters"},
+        "cq_gears": {"SpurGear", "HerringboneGear"},
+        "schemdraw": {"Drawing"},
+        "schemdraw.elements": {"Resistor", "Capacitor", "SourceV", "Line"},
+        "math": {"pi", "sqrt", "radians", "cos", "sin"},
+    },
+    "methods": {
+        "box", "faces", "workplane", "hole", "gear", "translate", "union", "circle", "extrude",
+        "add", "right", "down", "left", "up", "label", "push", "pop",
+    },
+}
+
+GEAR_SCRIPT = """import cadquery as cq
+import math
+from cq_gears import SpurGear
+
+gear = SpurGear(module=1.0, teeth_number=20, width=5.0, bore_d=5.0)
+offset = math.sqrt(2) * 10
+obj = cq.Workplane("XY").gear(gear).faces(">Z").workplane().hole(3)
+obj = obj.translate((offset, 0, 0))
+"""
+
+CIRCUIT_SCRIPT = """d = schemdraw.Drawing()
+d.add(elm.SourceV().up().label("10V"))
+d.add(elm.Resistor().right().label("1kΩ"))
+d.add(elm.Capacitor().down())
+d.add(elm.Line().left())
+"""
+
+class FindCodeIssuesTest(unittest.TestCase):
+
+    def test_valid_gear_script(self):
+        self.assertEqual(find_code_issues(GEAR_SCRIPT, "cadquery", SURFACE), [])
+
+    def test_valid_circuit_script_with_predefined_modules(self):
+        self.assertEqual(find_code_issues(CIRCUIT_SCRIPT, "schemdraw", SURFACE), [])
+
+    def test_builtin_methods_are_allowed(self):
+        code = (
+            "import cadquery as cq\n"
+            "points = []\n"
+            "points.append((1, 2))\n"
+            "name = 'a,b'.split(',')\n"
+            "obj = cq.Workplane('XY').box(1, 1, 1)\n"
+        )
+        self.assertEqual(find_code_issues(code, "cadquery", SURFACE), [])
+
+    def test_user_defined_functions_and_methods(self):
+        code = (
+            "import cadquery as cq\n"
+            "class Bracket:\n"
+            "    def build_plate(self, size):\n"
+            "        return cq.Workplane('XY').box(size, size, 2)\n"
+            "def add_holes(part):\n"
+            "    return part.faces('>Z').workplane().hole(2)\n"
+            "obj = add_holes(Bracket().build_plate(20))\n"
+        )
+        self.assertEqual(find_code_issues(code, "cadquery", SURFACE), [])
+
+    def test_unknown_method(self):
+        code = "import cadquery as cq\nobj = cq.Workplane('XY').cube(1)\n"
+        issues = find_code_issues(code, "cadquery", SURFACE)
+        self.assertEqual(len(issues), 1)
+        self.assertIn(".cube()", issues[0])
+        self.assertTrue(issues[0].startswith("第2行"))
+
+    def test_unknown_module_attribute(self):
+        issues = find_code_issues("import cadquery as cq\nobj = cq.Box(1, 1, 1)\n", "cadquery", SURFACE)
+        self.assertEqual(len(issues), 1)
+        self.assertIn("Box", issues[0])
+
+    def test_unknown_name_imported_from_module(self):
+        code = "import cadquery as cq\nfrom cq_gears import WormGear\nobj = cq.Workplane('XY')\n"
+        self.assertIn("WormGear", find_code_issues(code, "cadquery", SURFACE)[0])
+
+    def test_api_names_are_not_checked_without_surface(self):
+        code = "import cadquery as cq\nobj = cq.Workplane('XY').cube(1)\n"
+        self.assertEqual(find_code_issues(code, "cadquery", None), [])
+
+    def test_forbidden_import(self):
+        code = "import cadquery as cq\nimport os\nfrom subprocess import run\nobj = cq.Workplane('XY')\n"
+        issues = find_code_issues(code, "cadquery", SURFACE)
+        self.assertEqual(len(issues), 2)
+        self.assertIn("os", issues[0])
+        self.assertIn("subprocess", issues[1])
+
+    def test_forbidden_calls(self):
+        code = "import cadquery as cq\nobj = eval('cq.Workplane()')\nshow_object(obj)\n"
+        issues = find_code_issues(code, "cadquery", SURFACE)
+        self.assertEqual(len(issues), 2)
+        self.assertIn("eval()", issues[0])
+        self.assertIn("show_object()", issues[1])
+
+    def test_dunder_access(self):
+        code = "import cadquery as cq\nobj = cq.Workplane('XY').__class__.__bases__\n"
+        self.assertTrue(find_code_issues(code, "cadquery", SURFACE))
+
+    def test_missing_obj(self):
+        issues = find_code_issues("import cadquery as cq\nresult = cq.Workplane('XY').box(1, 1, 1)\n",
+                                  "cadquery", SURFACE)
+        self.assertEqual(len(issues), 1)
+        self.assertIn("'obj'", issues[0])
+
+    def test_obj_assigned_only_inside_function(self):
+        code = "import cadquery as cq\ndef build():\n    obj = cq.Workplane('XY')\n    return obj\nbuild()\n"
+        self.assertIn("'obj'", find_code_issues(code, "cadquery", SURFACE)[-1])
+
+    def test_missing_d(self):
+        issues = find_code_issues("drawing = schemdraw.Drawing()\n", "schemdraw", SURFACE)
+        self.assertEqual(len(issues), 1)
+        self.assertIn("'d'", issues[0])
+
+    def test_syntax_error(self):
+        issues = find_code_issues("obj = cq.Workplane(\n", "cadquery", SURFACE)
+        self.assertEqual(len(issues), 1)
+        self.assertIn("语法错误", issues[0])
+
+class GetApiSurfaceTest(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.multiple(code_checker, _api_surface=None, _api_surface_failed=False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_surface_is_collected_once(self):
+        result = ({"modules": {"math": ["pi"]}, "methods": ["box"]}, None)
+        with mock.patch.object(code_checker.executor_pool, "submit", return_value=result) as submit:
+            surface = code_checker.get_api_surface()
+            self.assertIs(code_checker.get_api_surface(), surface)
+        self.assertEqual(submit.call_count, 1)
+        self.assertEqual(surface, {"modules": {"math": {"pi"}}, "methods": {"box"}})
+
+    def test_failure_is_cached(self):
+        result = (None, {"type": "ExecutionTimeout", "message": "timed out", "traceback": ""})
+        with mock.patch.object(code_checker.executor_pool, "submit", return_value=result) as submit:
+            self.assertIsNone(code_checker.get_api_surface())
+            self.assertIsNone(code_checker.get_api_surface())
+        self.assertEqual(submit.call_count, 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+"""
+代码补丁的解析与应用
+"""
+
+import unittest
+
+from generators.code_patch import CodePatchError, apply_code_patch
+
+CODE = """# Plan:
+# 1. base box
+import cadquery as cq
+length = 40
+width = 30
+obj = cq.Workplane("XY").box(length, width, 10)"""
+
+class ApplyCodePatchTest(unittest.TestCase):
+
+    def test_edit_block(self):
+        patch = (
+            "<<<<<<< SEARCH\n"
+            "width = 30\n"
+            "=======\n"
+            "width = 50\n"
+            ">>>>>>> REPLACE\n"
+        )
+        patched, count = apply_code_patch(CODE, patch)
+        self.assertEqual(count, 1)
+        self.assertIn("width = 50", patched)
+
+    def test_fenced_unified_diff(self):
+        patch = (
+            "```diff\n"
+            "--- a/code.py\n"
+            "+++ b/code.py\n"
+            "@@ -4,3 +4,3 @@\n"
+            " length = 40\n"
+            "-width = 30\n"
+            "+width = 50\n"
+            " obj = cq.Workplane(\"XY\").box(length, width, 10)\n"
+            "\n"
+            "```\n"
+            "这样宽度就变成了50。\n"
+        )
+        patched, count = apply_code_patch(CODE, patch)
+        self.assertEqual(count, 1)
+        self.assertEqual(patched, CODE.replace("width = 30", "width = 50"))
+
+    def test_fenced_edit_block(self):
+        patch = "```python\n<<<<<<< SEARCH\nlength = 40\n=======\nlength = 60\n>>>>>>> REPLACE\n```"
+        patched, _ = apply_code_patch(CODE, patch)
+        self.assertIn("length = 60", patched)
+
+    def test_unmatched_search_raises(self):
+        patch = "<<<<<<< SEARCH\nheight = 10\n=======\nheight = 20\n>>>>>>> REPLACE\n"
+        with self.assertRaises(CodePatchError):
+            apply_code_patch(CODE, patch)
+
+if __name__ == "__main__":
+    unittest.main()
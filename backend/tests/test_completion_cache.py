@@ -0,0 +1,34 @@
+"""
+补全缓存键
+"""
+
+import unittest
+
+from ai.completion_cache import make_completion_key
+
+HISTORY = [
+    {"role": "system", "content": "system"},
+    {"role": "user", "content": "一个小圆柱"},
+    {"role": "assistant", "content": "obj = cq.Workplane().cylinder(10, 3)"},
+]
+
+class MakeCompletionKeyTest(unittest.TestCase):
+    def test_follow_ups_with_same_history_differ_by_query(self):
+        first = make_completion_key("model", "把高度改为20", HISTORY)
+        second = make_completion_key("model", "顶部加一个倒角", HISTORY)
+        self.assertNotEqual(first, second)
+
+    def test_query_whitespace_is_normalized(self):
+        self.assertEqual(
+            make_completion_key("model", "把高度改为20", HISTORY),
+            make_completion_key("model", "  把高度改为20\r\n", HISTORY),
+        )
+
+    def test_error_message_changes_key(self):
+        self.assertNotEqual(
+            make_completion_key("model", "一个小圆柱", HISTORY[:1]),
+            make_completion_key("model", "一个小圆柱", HISTORY[:1], "NameError: name 'cq' is not defined"),
+        )
+
+if __name__ == "__main__":
+    unittest.main()
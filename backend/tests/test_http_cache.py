@@ -0,0 +1,42 @@
+"""
+对象端点的强ETag：省略查询参数与显式指定其默认值是同一个表示
+"""
+
+import unittest
+
+from flask import Flask, make_response
+
+from api.http_cache import immutable_response
+
+class ImmutableResponseEtagTest(unittest.TestCase):
+
+    def setUp(self):
+        app = Flask(__name__)
+
+        @app.route("/objects/<object_id>/mesh")
+        @immutable_response("quality", binary_aware=False, defaults={"quality": "normal"})
+        def mesh(object_id):
+            return make_response(object_id)
+
+        self.client = app.test_client()
+
+    def etag(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.headers["ETag"]
+
+    def test_default_variant_shares_etag(self):
+        self.assertEqual(self.etag("/objects/a/mesh"), self.etag("/objects/a/mesh?quality=normal"))
+
+    def test_other_variant_and_object_differ(self):
+        etag = self.etag("/objects/a/mesh")
+        self.assertNotEqual(etag, self.etag("/objects/a/mesh?quality=fine"))
+        self.assertNotEqual(etag, self.etag("/objects/b/mesh"))
+
+    def test_matching_etag_returns_not_modified(self):
+        etag = self.etag("/objects/a/mesh?quality=normal")
+        response = self.client.get("/objects/a/mesh", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+"""
+不同细分质量的网格（先执行代码得到的粗网格与之后从BREP细分的网格）保持相同的部件结构
+"""
+
+import importlib
+import importlib.util
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+from app.config import StoragePaths, TessellationConfig
+from processors.export_artifacts import get_brep_artifact_path, get_brep_part_name
+from processors.tessellation_cache import TessellationCache, make_tessellation_key, tessellate_code
+
+# processors 包导出的同名缓存实例遮蔽了子模块
+tessellation_cache_module = importlib.import_module("processors.tessellation_cache")
+
+HAS_CADQUERY = importlib.util.find_spec("cadquery") is not None
+
+PREVIEW = TessellationConfig.QUALITY_LEVELS["preview"]
+FINE = TessellationConfig.QUALITY_LEVELS["fine"]
+
+def part_structure(shapes):
+    """去掉几何数据后的部件树（id、名称、类型、颜色、位置）"""
+    node = {key: shapes.get(key) for key in ("id", "name", "subtype", "color", "loc")}
+    if "parts" in shapes:
+        node["parts"] = [part_structure(part) for part in shapes["parts"]]
+    return node
+
+class TessellationKeyTest(unittest.TestCase):
+
+    def test_source_is_part_of_key(self):
+        code = "obj = cq.Workplane().box(1, 1, 1)"
+        self.assertNotEqual(make_tessellation_key(code, FINE, "code"), make_tessellation_key(code, FINE, "brep"))
+        self.assertEqual(make_tessellation_key(code, FINE), make_tessellation_key(code, FINE, "code"))
+
+class CacheHitBrepArtifactTest(unittest.TestCase):
+    """命中细分缓存的新对象也得到BREP产物，导出时无需重新执行代码"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        result = {
+            "meshed_instances": [{"vertices": np.zeros(9, dtype=np.float32)}],
+            "shapes": {"id": "/Group", "name": "Group", "parts": []},
+            "brep": b"brep-bytes",
+            "brep_part_name": "Solid",
+        }
+        self.submit = mock.Mock(return_value=(result, None))
+        for patcher in (
+            mock.patch.object(StoragePaths, "GENERATED_DIR", Path(directory.name)),
+            mock.patch.object(tessellation_cache_module, "tessellation_cache", TessellationCache(1 << 20, 8)),
+            mock.patch.object(tessellation_cache_module.executor_pool, "submit", self.submit),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_cache_hit_copies_brep(self):
+        code = "obj = cq.Workplane().box(1, 1, 1)"
+        first, _ = tessellate_code(code, artifact_id="first", **FINE)
+        second, _ = tessellate_code(code, artifact_id="second", **FINE)
+
+        self.assertEqual(self.submit.call_count, 1)
+        self.assertIs(second, first)
+        with open(get_brep_artifact_path("second"), "rb") as f:
+            self.assertEqual(f.read(), b"brep-bytes")
+        self.assertEqual(get_brep_part_name("second"), "Solid")
+
+@unittest.skipUnless(HAS_CADQUERY, "cadquery is not installed")
+class BrepTessellationStructureTest(unittest.TestCase):
+
+    def tessellate_both(self, code):
+        from executor.jobs import run_brep_tessellation_job, run_cadquery_job
+
+        code = "import cadquery as cq\n" + code
+        coarse = run_cadquery_job(code, PREVIEW, include_brep=True)
+        self.assertIsNotNone(coarse["brep"])
+        refined = None
+        if coarse["brep_part_name"]:
+            refined = run_brep_tessellation_job(coarse["brep"], FINE, coarse["brep_part_name"])
+        return coarse, refined
+
+    def test_single_solid_keeps_structure(self):
+        coarse, refined = self.tessellate_both("obj = cq.Workplane().box(10, 10, 10).faces('>Z').hole(3)")
+        self.assertIsNotNone(refined)
+        self.assertEqual(part_structure(refined["shapes"]), part_structure(coarse["shapes"]))
+        self.assertEqual(len(refined["meshed_instances"]), len(coarse["meshed_instances"]))
+
+    def test_multiple_solids_keep_structure(self):
+        coarse, refined = self.tessellate_both(
+            "obj = cq.Workplane().pushPoints([(0, 0), (20, 0)]).box(5, 5, 5)"
+        )
+        self.assertIsNotNone(refined)
+        self.assertEqual(part_structure(refined["shapes"]), part_structure(coarse["shapes"]))
+
+    def test_assembly_is_not_tessellated_from_brep(self):
+        coarse, refined = self.tessellate_both(
+            "obj = cq.Assembly()\n"
+            "obj.add(cq.Workplane().box(5, 5, 5), name='base', color=cq.Color('red'))\n"
+            "obj.add(cq.Workplane().sphere(2), name='ball', loc=cq.Location((0, 0, 5)))"
+        )
+        self.assertIsNone(coarse["brep_part_name"])
+        self.assertIsNone(refined)
+
+if __name__ == "__main__":
+    unittest.main()
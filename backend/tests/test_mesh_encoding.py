@@ -0,0 +1,149 @@
+"""
+紧凑网格编码的往返还原（前端 decodeMeshInstance 按同样的格式解码）
+"""
+
+import unittest
+
+import numpy as np
+
+from utils.mesh_encoding import (
+    decode_indices, decode_mesh_instance, decode_varint, dequantize_positions, encode_indices,
+    encode_mesh_instance, encode_varint, oct_decode_normals, oct_encode_normals, quantize_positions
+)
+
+def unit_vectors(vectors):
+    vectors = np.asarray(vectors, dtype=np.float64)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+class VarintTest(unittest.TestCase):
+
+    def test_round_trip_across_byte_lengths(self):
+        values = np.array([0, 1, 127, 128, 16383, 16384, 2 ** 28 - 1, 2 ** 28, 2 ** 35 + 3, 2 ** 63], dtype=np.uint64)
+        encoded = encode_varint(values)
+        self.assertEqual(encoded.dtype, np.uint8)
+        np.testing.assert_array_equal(decode_varint(encoded), values)
+
+    def test_single_byte_values(self):
+        np.testing.assert_array_equal(encode_varint(np.array([0, 5, 127])), [0, 5, 127])
+        np.testing.assert_array_equal(encode_varint(np.array([300])), [0xAC, 0x02])
+
+    def test_empty(self):
+        self.assertEqual(len(encode_varint(np.array([], dtype=np.uint64))), 0)
+        self.assertEqual(len(decode_varint(np.array([], dtype=np.uint8))), 0)
+
+class IndicesTest(unittest.TestCase):
+
+    def test_round_trip_with_negative_deltas(self):
+        indices = np.array([10, 11, 12, 12, 3, 0, 7, 1], dtype=np.uint32)
+        encoded = encode_indices(indices)
+        self.assertEqual(encoded["codec"], "delta_varint")
+        self.assertEqual(encoded["count"], len(indices))
+        np.testing.assert_array_equal(decode_indices(encoded), indices)
+
+    def test_round_trip_with_large_values(self):
+        indices = np.array([0, 2 ** 28 + 5, 3, 2 ** 30, 2 ** 28, 2 ** 31 - 1, 0], dtype=np.int64)
+        decoded = decode_indices(encode_indices(indices))
+        self.assertEqual(decoded.dtype, np.int32)
+        np.testing.assert_array_equal(decoded, indices)
+
+    def test_small_deltas_use_one_byte(self):
+        indices = np.arange(1000, 1100)
+        encoded = encode_indices(indices)
+        # 第一个差值为1000（2字节），之后每个差值为1
+        self.assertEqual(len(encoded["data"]), 2 + 99)
+
+class PositionQuantizationTest(unittest.TestCase):
+
+    def test_round_trip_within_quantization_error(self):
+        rng = np.random.default_rng(0)
+        points = rng.uniform(-50, 120, size=(200, 3))
+        minimum = points.min(axis=0)
+        extent = points.max(axis=0) - minimum
+        encoded = quantize_positions(points.reshape(-1), minimum, extent)
+        self.assertEqual(encoded["data"].dtype, np.uint16)
+        decoded = dequantize_positions(encoded).reshape(-1, 3)
+        np.testing.assert_allclose(decoded, points, atol=(extent / 65535).max() / 2 + 1e-4)
+
+    def test_bounding_box_corners_are_exact(self):
+        points = np.array([[-1.0, 2.0, 3.0], [4.0, 5.0, 9.0]])
+        minimum = points.min(axis=0)
+        encoded = quantize_positions(points.reshape(-1), minimum, points.max(axis=0) - minimum)
+        np.testing.assert_array_equal(encoded["data"], [0, 0, 0, 65535, 65535, 65535])
+        np.testing.assert_allclose(dequantize_positions(encoded).reshape(-1, 3), points, atol=1e-5)
+
+    def test_zero_extent_box(self):
+        points = np.tile([1.5, -2.0, 7.25], (4, 1))
+        encoded = quantize_positions(points.reshape(-1), points[0], np.zeros(3))
+        self.assertEqual(encoded["scale"], [0.0, 0.0, 0.0])
+        np.testing.assert_array_equal(encoded["data"], np.zeros(12))
+        np.testing.assert_allclose(dequantize_positions(encoded).reshape(-1, 3), points)
+
+    def test_flat_axis(self):
+        # 平面零件：z方向尺寸为0，其余方向正常量化
+        points = np.array([[0.0, 0.0, 5.0], [10.0, 4.0, 5.0], [3.0, 1.0, 5.0]])
+        minimum = points.min(axis=0)
+        encoded = quantize_positions(points.reshape(-1), minimum, points.max(axis=0) - minimum)
+        decoded = dequantize_positions(encoded).reshape(-1, 3)
+        np.testing.assert_allclose(decoded, points, atol=1e-3)
+        np.testing.assert_array_equal(decoded[:, 2], 5.0)
+
+class NormalEncodingTest(unittest.TestCase):
+
+    def assert_round_trip(self, normals, tolerance_degrees=1.5):
+        encoded = oct_encode_normals(normals.reshape(-1))
+        self.assertEqual(encoded["data"].dtype, np.uint8)
+        self.assertEqual(len(encoded["data"]), 2 * len(normals))
+        decoded = oct_decode_normals(encoded).reshape(-1, 3)
+        np.testing.assert_allclose(np.linalg.norm(decoded, axis=1), 1.0, atol=1e-5)
+        cosines = np.clip((decoded * normals).sum(axis=1), -1.0, 1.0)
+        self.assertLess(np.degrees(np.arccos(cosines)).max(), tolerance_degrees)
+
+    def test_axis_normals(self):
+        self.assert_round_trip(np.array([
+            [1, 0, 0], [-1, 0, 0], [0, 1, 0], [0, -1, 0], [0, 0, 1], [0, 0, -1]
+        ], dtype=np.float64))
+
+    def test_lower_hemisphere(self):
+        self.assert_round_trip(unit_vectors([
+            [1, 1, -1], [-1, 1, -1], [1, -1, -1], [-1, -1, -1], [0.2, -0.1, -3], [-3, 0.5, -0.01]
+        ]))
+
+    def test_random_normals(self):
+        rng = np.random.default_rng(1)
+        self.assert_round_trip(unit_vectors(rng.normal(size=(500, 3))))
+
+class MeshInstanceTest(unittest.TestCase):
+
+    def mesh(self):
+        return {
+            "vertices": np.array([0, 0, 0, 10, 0, 0, 10, 5, 0, 0, 5, 0], dtype=np.float32),
+            "triangles": np.array([0, 1, 2, 0, 2, 3], dtype=np.uint32),
+            "normals": np.array([0, 0, 1] * 4, dtype=np.float32),
+            "edges": np.array([0, 0, 0, 10, 0, 0], dtype=np.float32),
+            "face_types": np.array([0], dtype=np.int32),
+            "name": "box",
+        }
+
+    def test_round_trip(self):
+        mesh = self.mesh()
+        encoded = encode_mesh_instance(mesh, "compact")
+        self.assertEqual(encoded["encoding"], "compact")
+        decoded = decode_mesh_instance(encoded)
+        self.assertNotIn("encoding", decoded)
+        np.testing.assert_allclose(decoded["vertices"], mesh["vertices"], atol=1e-3)
+        np.testing.assert_allclose(decoded["edges"], mesh["edges"], atol=1e-3)
+        np.testing.assert_allclose(decoded["normals"], mesh["normals"], atol=1e-2)
+        np.testing.assert_array_equal(decoded["triangles"], mesh["triangles"])
+        np.testing.assert_array_equal(decoded["face_types"], mesh["face_types"])
+        self.assertEqual(decoded["name"], "box")
+
+    def test_attribute_selection(self):
+        encoded = encode_mesh_instance(self.mesh(), "compact", ["vertices", "triangles"])
+        self.assertEqual(set(encoded), {"vertices", "triangles", "name", "encoding"})
+
+    def test_raw_encoding_is_unchanged(self):
+        mesh = self.mesh()
+        self.assertIs(decode_mesh_instance(encode_mesh_instance(mesh))["vertices"], mesh["vertices"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+"""
+相似查询索引按存储的变化记录增量同步其他 worker 进程的写入
+"""
+
+import tempfile
+import unittest
+from unittest import mock
+
+from models import conversation_store
+from models.conversation_store import JSONConversationStore, SQLiteConversationStore
+from models.query_index import QueryIndex
+
+def make_conversation(conversation_id, query, created_at="2026-01-01T00:00:00"):
+    return {
+        "id": conversation_id,
+        "created_at": created_at,
+        "messages": [{"role": "user", "content": query, "timestamp": created_at}],
+        "current_code": None,
+        "current_object_id": None,
+        "render_mode": None,
+        "error_history": [],
+    }
+
+def success_message(object_id):
+    return {"role": "assistant", "code": "obj = None", "object_id": object_id, "error": None,
+            "render_mode": "cadquery", "timestamp": "2026-01-01T00:00:01"}
+
+class QueryIndexSyncMixin:
+    """writer 模拟另一个 worker 进程的存储实例，reader 是本进程的存储实例"""
+
+    def make_stores(self, directory):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.writer, self.reader = self.make_stores(self.directory.name)
+        patcher = mock.patch.object(conversation_store, "_store", self.reader)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.index = QueryIndex()
+
+    def add_result(self, conversation_id, query, object_id):
+        self.writer.create_conversation(make_conversation(conversation_id, query))
+        self.writer.append_message(conversation_id, success_message(object_id))
+
+    def test_syncs_only_changed_conversations(self):
+        self.add_result("a", "一个直径20的齿轮", "obj-a")
+        self.index.refresh()
+        self.assertEqual(self.index.find_similar("一个直径20的齿轮")["object_id"], "obj-a")
+
+        self.add_result("b", "一个边长10的立方体", "obj-b")
+        with mock.patch.object(self.reader, "load_conversation", wraps=self.reader.load_conversation) as load:
+            match = self.index.find_similar("一个边长10的立方体")
+        self.assertEqual(match["object_id"], "obj-b")
+        self.assertEqual({call.args[0] for call in load.call_args_list}, {"b"})
+
+    def test_first_result_appended_after_creation(self):
+        self.writer.create_conversation(make_conversation("a", "一个直径20的齿轮"))
+        self.index.refresh()
+        self.assertIsNone(self.index.find_similar("一个直径20的齿轮"))
+
+        self.writer.append_message("a", success_message("obj-a"))
+        self.assertEqual(self.index.find_similar("一个直径20的齿轮")["object_id"], "obj-a")
+
+    def test_deletion_by_other_worker(self):
+        self.add_result("a", "一个直径20的齿轮", "obj-a")
+        self.index.refresh()
+        self.writer.delete_conversation("a")
+        self.assertIsNone(self.index.find_similar("一个直径20的齿轮"))
+
+    def test_own_write_does_not_require_resync(self):
+        self.index.refresh()
+        self.reader.create_conversation(make_conversation("a", "一个直径20的齿轮"))
+        self.reader.append_message("a", success_message("obj-a"))
+        self.index.add("a", 1, "obj-a", "cadquery", "一个直径20的齿轮")
+        with mock.patch.object(self.reader, "list_changes") as list_changes:
+            self.assertEqual(self.index.find_similar("一个直径20的齿轮")["object_id"], "obj-a")
+        list_changes.assert_not_called()
+
+class SQLiteQueryIndexSyncTest(QueryIndexSyncMixin, unittest.TestCase):
+    def make_stores(self, directory):
+        path = f"{directory}/conversations.sqlite3"
+        return SQLiteConversationStore(path, cache_size=0), SQLiteConversationStore(path, cache_size=0)
+
+class JSONQueryIndexSyncTest(QueryIndexSyncMixin, unittest.TestCase):
+    def make_stores(self, directory):
+        return JSONConversationStore(directory, cache_size=0), JSONConversationStore(directory, cache_size=0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,8 +4,21 @@
 """
 
 from .json_utils import NumpyEncoder
+from .binary_utils import MESH_MIMETYPE, encode_binary_payload
+from .mesh_encoding import (
+    MESH_ENCODINGS,
+    MESH_ATTRIBUTES,
+    DEFAULT_MESH_ENCODING,
+    encode_mesh_instance,
+    decode_mesh_instance,
+    encode_result_meshes
+)
+from .token_utils import estimate_tokens, estimate_message_tokens
+from .id_utils import generate_id, is_ulid, is_legacy_id, id_timestamp
 from .file_utils import (
     get_download_path,
+    atomic_write_bytes,
+    file_lock,
     ensure_directory_exists,
     safe_file_read,
     safe_file_write,
@@ -16,6 +29,10 @@ from .validation import (
     validate_object_id,
     validate_conversation_id,
     validate_render_mode,
+    validate_mesh_payload,
+    validate_mesh_encoding,
+    validate_mesh_attributes,
+    validate_quality,
     validate_user_query,
     validate_api_request_data,
     sanitize_user_input,
@@ -26,9 +43,33 @@ from .validation import (
 __all__ = [
     # JSON工具
     'NumpyEncoder',
+
+    # 二进制传输工具
+    'MESH_MIMETYPE',
+    'encode_binary_payload',
+
+    # 紧凑网格编码
+    'MESH_ENCODINGS',
+    'MESH_ATTRIBUTES',
+    'DEFAULT_MESH_ENCODING',
+    'encode_mesh_instance',
+    'decode_mesh_instance',
+    'encode_result_meshes',
+
+    # token估算工具
+    'estimate_tokens',
+    'estimate_message_tokens',
+    
+    # ID工具
+    'generate_id',
+    'is_ulid',
+    'is_legacy_id',
+    'id_timestamp',
     
     # 文件工具
     'get_download_path',
+    'atomic_write_bytes',
+    'file_lock',
     'ensure_directory_exists',
     'safe_file_read',
     'safe_file_write',
@@ -39,6 +80,10 @@ __all__ = [
     'validate_object_id',
     'validate_conversation_id',
     'validate_render_mode',
+    'validate_mesh_payload',
+    'validate_mesh_encoding',
+    'validate_mesh_attributes',
+    'validate_quality',
     'validate_user_query',
     'validate_api_request_data',
     'sanitize_user_input',
@@ -0,0 +1,180 @@
+"""
+二进制网格传输工具
+将包含NumPy数组的结果编码为"JSON头 + 小端序类型化数组缓冲区"的二进制格式
+
+格式布局（所有整数均为小端序）:
+    [0:4]   魔数 b"CQMB"
+    [4:8]   uint32 格式版本
+    [8:12]  uint32 JSON头长度（已按8字节对齐填充）
+    [12:16] uint32 保留
+    JSON头  {"version": 1, "buffers": [...], "data": {...}}
+    数据区  依次排列的原始缓冲区，每个缓冲区起始位置按8字节对齐
+
+JSON头中每个NumPy数组被替换为 {"__buffer__": 索引}，
+buffers[索引] 描述其 dtype、shape、offset（相对数据区起点）与 length（字节数），
+前端可以直接用 Float32Array / Uint32Array 包装这些区间而无需拷贝。
+"""
+
+import json
+import mmap
+import struct
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from .json_utils import NumpyEncoder
+
+MESH_MAGIC = b"CQMB"
+MESH_FORMAT_VERSION = 1
+MESH_MIMETYPE = "application/vnd.cqask.mesh"
+BUFFER_ALIGNMENT = 8
+
+# 前缀: 魔数 + 版本 + 头长度 + 保留字段
+_PREFIX = struct.Struct("<4sIII")
+
+def _normalize_array(array: np.ndarray) -> np.ndarray:
+    """将数组转换为前端类型化数组可直接使用的小端序dtype"""
+    kind = array.dtype.kind
+    if kind == "f":
+        target = "<f4"
+    elif kind == "u":
+        # 紧凑网格编码使用的 uint8 / uint16 保持原宽度
+        target = f"<u{array.dtype.itemsize}" if array.dtype.itemsize <= 2 else "<u4"
+    elif kind == "i":
+        target = "<i4"
+    elif kind == "b":
+        target = "<u1"
+    else:
+        raise TypeError(f"Unsupported array dtype for binary transport: {array.dtype}")
+    return np.ascontiguousarray(array, dtype=target)
+
+def _align(size: int) -> int:
+    """按缓冲区对齐要求向上取整"""
+    return (size + BUFFER_ALIGNMENT - 1) // BUFFER_ALIGNMENT * BUFFER_ALIGNMENT
+
+def _extract_buffers(data: Any, buffers: List[np.ndarray]) -> Any:
+    """递归地将数值型NumPy数组替换为缓冲区引用"""
+    if isinstance(data, np.ndarray) and data.dtype.kind in "fuib":
+        buffers.append(_normalize_array(data))
+        return {"__buffer__": len(buffers) - 1}
+    if isinstance(data, dict):
+        return {key: _extract_buffers(value, buffers) for key, value in data.items()}
+    if isinstance(data, (list, tuple)):
+        return [_extract_buffers(item, buffers) for item in data]
+    return data
+
+def encode_binary_payload(data: Dict[str, Any]) -> bytes:
+    """
+    将结果字典编码为二进制网格传输格式
+
+    Args:
+        data: 结果字典（可包含任意层级的NumPy数组）
+
+    Returns:
+        编码后的字节串
+    """
+    arrays: List[np.ndarray] = []
+    header_data = _extract_buffers(data, arrays)
+
+    buffer_specs = []
+    offset = 0
+    for array in arrays:
+        buffer_specs.append({
+            "dtype": array.dtype.name,
+            "shape": list(array.shape),
+            "offset": offset,
+            "length": array.nbytes,
+        })
+        offset = _align(offset + array.nbytes)
+
+    header = {
+        "version": MESH_FORMAT_VERSION,
+        "buffers": buffer_specs,
+        "data": header_data,
+    }
+    header_bytes = json.dumps(header, cls=NumpyEncoder, ensure_ascii=False).encode("utf-8")
+    # 用空格填充JSON头，保证数据区从对齐的位置开始
+    padded_length = _align(_PREFIX.size + len(header_bytes)) - _PREFIX.size
+    header_bytes = header_bytes.ljust(padded_length, b" ")
+
+    chunks: List[bytes] = [
+        _PREFIX.pack(MESH_MAGIC, MESH_FORMAT_VERSION, len(header_bytes), 0),
+        header_bytes,
+    ]
+    for array, spec in zip(arrays, buffer_specs):
+        chunks.append(array.tobytes())
+        padding = _align(spec["length"]) - spec["length"]
+        if padding:
+            chunks.append(b"\x00" * padding)
+
+    return b"".join(chunks)
+
+def _restore_buffers(data: Any, arrays: List[np.ndarray]) -> Any:
+    """递归地将缓冲区引用还原为NumPy数组"""
+    if isinstance(data, dict):
+        if len(data) == 1 and isinstance(data.get("__buffer__"), int):
+            return arrays[data["__buffer__"]]
+        return {key: _restore_buffers(value, arrays) for key, value in data.items()}
+    if isinstance(data, list):
+        return [_restore_buffers(item, arrays) for item in data]
+    return data
+
+def decode_binary_payload(buffer) -> Dict[str, Any]:
+    """
+    解码二进制网格传输格式
+
+    返回的NumPy数组是 buffer 上的只读视图，不拷贝数据；
+    传入 mmap 时数组直接引用内存映射的文件页
+
+    Args:
+        buffer: 支持缓冲区协议的对象（bytes、memoryview、mmap等）
+
+    Returns:
+        还原后的结果字典
+    """
+    magic, version, header_length, _ = _PREFIX.unpack_from(buffer, 0)
+    if magic != MESH_MAGIC:
+        raise ValueError("Invalid binary mesh payload")
+    if version != MESH_FORMAT_VERSION:
+        raise ValueError(f"Unsupported binary mesh payload version: {version}")
+
+    header = json.loads(bytes(buffer[_PREFIX.size:_PREFIX.size + header_length]).decode("utf-8"))
+    data_start = _PREFIX.size + header_length
+
+    arrays = []
+    for spec in header["buffers"]:
+        dtype = np.dtype(spec["dtype"]).newbyteorder("<")
+        array = np.frombuffer(
+            buffer,
+            dtype=dtype,
+            count=spec["length"] // dtype.itemsize,
+            offset=data_start + spec["offset"],
+        )
+        arrays.append(array.reshape(spec["shape"]))
+
+    return _restore_buffers(header["data"], arrays)
+
+def load_binary_payload(file_path: str) -> Dict[str, Any]:
+    """
+    以内存映射方式读取二进制网格文件并解码
+
+    Args:
+        file_path: 二进制网格文件路径
+
+    Returns:
+        还原后的结果字典（数组引用内存映射，不整体读入内存）
+    """
+    with open(file_path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return decode_binary_payload(mapped)
+
+def get_binary_payload_stats(payload: bytes) -> Tuple[int, int]:
+    """
+    获取二进制负载的JSON头与数据区大小，便于日志统计
+
+    Returns:
+        (头部字节数, 数据区字节数)
+    """
+    _, _, header_length, _ = _PREFIX.unpack_from(payload, 0)
+    header_size = _PREFIX.size + header_length
+    return header_size, len(payload) - header_size
@@ -3,43 +3,81 @@
 处理CAD文件的导入导出和路径管理
 """
 
-import importlib
+import hashlib
 import os
-import cadquery as cq
-from typing import Optional
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
 
-def get_download_path(object_id: str, extension: str, base_path_abs: str) -> str:
+from app.config import StoragePaths
+
+try:
+    import fcntl
+except ImportError:  # Windows: 没有 fcntl，只在进程内加锁
+    fcntl = None
+
+def get_download_path(object_id: str, extension: str) -> str:
     """
-    获取CAD对象的下载文件路径，如果文件不存在则自动生成
+    获取CAD对象的下载文件路径，如果文件不存在则从对象的BREP产物导出
     
     Args:
         object_id: 对象ID
         extension: 文件扩展名 (step, stl, obj, etc.)
-        base_path_abs: 用于存放生成文件的绝对路径目录
     
     Returns:
-        生成的文件路径
+        生成的文件路径（与对象的代码文件位于同一分片目录）
     """
-    # 确保目标目录存在
-    os.makedirs(base_path_abs, exist_ok=True)
+    from processors.export_artifacts import export_object
 
-    cad_file_path_abs = os.path.join(base_path_abs, f"{object_id}.{extension}")
-    python_file_path_abs = os.path.join(base_path_abs, f"{object_id}.py")
+    return export_object(object_id, extension)
 
-    if not os.path.exists(cad_file_path_abs):
-        spec = importlib.util.spec_from_file_location(
-            "obj_module", python_file_path_abs
-        )
-        obj_module = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(obj_module)
+def atomic_write_bytes(file_path: str, data: bytes) -> None:
+    """先写入同目录下的临时文件再原子替换，读者不会看到写了一半的文件"""
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(file_path) or ".", prefix=".tmp-", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
 
-        cq.exporters.export(
-            obj_module.obj,
-            cad_file_path_abs,
-            exportType=extension.upper()
-        )
+# 文件路径 -> [线程锁, 引用计数]
+_path_locks: Dict[str, List] = {}
+_path_locks_guard = threading.Lock()
 
-    return cad_file_path_abs
+@contextmanager
+def file_lock(file_path: str) -> Iterator[None]:
+    """
+    以文件为单位的互斥锁：进程内按路径加线程锁，跨进程对 data/locks 中以路径哈希命名的锁文件加咨询锁
+
+    用于保护"检查文件是否存在 -> 生成 -> 写入"的过程，避免并发请求重复生成同一个文件。
+    锁文件集中存放而不是放在产物旁边，分片目录中只有产物；锁文件释放后不删除
+    （删除会与正在等待同一个锁文件的进程竞争，导致两个进程各自锁住不同的文件）
+    """
+    with _path_locks_guard:
+        entry = _path_locks.setdefault(file_path, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            if fcntl is None:
+                yield
+                return
+            key = hashlib.sha256(os.path.abspath(file_path).encode("utf-8")).hexdigest()[:32]
+            os.makedirs(StoragePaths.LOCKS_DIR, exist_ok=True)
+            with open(os.path.join(StoragePaths.LOCKS_DIR, f"{key}.lock"), "a") as lock_file:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+    finally:
+        with _path_locks_guard:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _path_locks[file_path]
 
 def ensure_directory_exists(directory_path: str) -> None:
     """
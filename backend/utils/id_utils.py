@@ -0,0 +1,80 @@
+"""
+ID工具
+生成对象和对话使用的可排序唯一ID（ULID格式），并兼容旧的时间戳ID
+"""
+
+import hashlib
+import re
+import secrets
+import threading
+import time
+from datetime import datetime
+from typing import List, Optional
+
+# Crockford Base32 字母表（不含 I、L、O、U）
+_CROCKFORD = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_ULID_PATTERN = re.compile(r"^[0-7][0-9A-HJKMNP-TV-Z]{25}$")
+# 旧ID: datetime.now().isoformat() 去除冒号
+_LEGACY_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}T\d{2}-\d{2}-\d{2}(\.\d{6})?$")
+
+_RANDOM_BITS = 80
+_lock = threading.Lock()
+_last_ms = -1
+_last_random = 0
+
+def _encode(value: int, length: int) -> str:
+    chars = []
+    for _ in range(length):
+        value, remainder = divmod(value, 32)
+        chars.append(_CROCKFORD[remainder])
+    return "".join(reversed(chars))
+
+def generate_id() -> str:
+    """
+    生成ULID：48位毫秒时间戳 + 80位随机数，共26个字符
+
+    字典序即生成时间顺序。同一毫秒内随机部分递增，保证本进程生成的ID严格单调；
+    不同进程之间依靠80位随机数避免冲突
+    """
+    global _last_ms, _last_random
+    with _lock:
+        now_ms = time.time_ns() // 1_000_000
+        if now_ms > _last_ms:
+            _last_ms = now_ms
+            _last_random = secrets.randbits(_RANDOM_BITS)
+        else:
+            _last_random += 1
+            if _last_random >= 1 << _RANDOM_BITS:
+                # 同一毫秒内随机部分溢出（几乎不可能），借用下一毫秒
+                _last_ms += 1
+                _last_random = secrets.randbits(_RANDOM_BITS)
+        return _encode((_last_ms << _RANDOM_BITS) | _last_random, 26)
+
+def is_ulid(object_id: str) -> bool:
+    """是否为ULID格式的ID"""
+    return bool(_ULID_PATTERN.match(object_id))
+
+def is_legacy_id(object_id: str) -> bool:
+    """是否为旧的时间戳格式ID"""
+    return bool(_LEGACY_PATTERN.match(object_id))
+
+def id_timestamp(object_id: str) -> Optional[datetime]:
+    """获取ID中记录的生成时间，格式无效时返回None"""
+    if is_ulid(object_id):
+        value = 0
+        for char in object_id[:10]:
+            value = value * 32 + _CROCKFORD.index(char)
+        return datetime.fromtimestamp(value / 1000)
+    if is_legacy_id(object_id):
+        date_part, time_part = object_id.split("T")
+        return datetime.fromisoformat(f"{date_part}T{time_part.replace('-', ':')}")
+    return None
+
+def shard_parts(object_id: str, depth: int = 2) -> List[str]:
+    """
+    对象所在的分片子目录（ID哈希的前缀，每级两位十六进制即256个子目录）
+
+    使用哈希而不是ID本身的前缀：ULID前缀是时间戳，同一时期的对象会集中在同一目录
+    """
+    digest = hashlib.md5(object_id.encode("utf-8")).hexdigest()
+    return [digest[i * 2:i * 2 + 2] for i in range(depth)]
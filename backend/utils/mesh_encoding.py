@@ -0,0 +1,219 @@
+"""
+紧凑网格编码
+将 tessellate_group 生成的网格实例压缩为更小的表示，用于慢速网络下传输:
+
+    位置（vertices、edges、obj_vertices）  相对实例包围盒量化为16位无符号整数
+        {"codec": "quantized16", "min": [x, y, z], "scale": [sx, sy, sz], "data": uint16数组}
+        还原: 坐标 = min + data * scale
+    法向量（normals）                       八面体映射后每个分量量化为8位
+        {"codec": "oct8", "data": uint8数组（每个法向量2字节）}
+    三角形索引（triangles）                 相邻索引差值经 zigzag 后以 LEB128 变长整数编码
+        {"codec": "delta_varint", "count": 索引数量, "data": uint8数组}
+
+其余整数数组（face_types 等）保持原样。编码后的实例带有 "encoding": "compact" 标记；
+不需要的属性数组（例如只着色面时的 edges、face_types、edge_types）可以按请求丢弃
+"""
+
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+MESH_ENCODINGS = ("raw", "compact")
+DEFAULT_MESH_ENCODING = "raw"
+
+# 网格实例中的属性数组
+MESH_ATTRIBUTES = (
+    "vertices", "triangles", "normals", "edges", "obj_vertices",
+    "face_types", "edge_types", "triangles_per_face", "segments_per_edge",
+)
+_POSITION_ATTRIBUTES = ("vertices", "edges", "obj_vertices")
+
+_QUANTIZE_MAX = 65535
+_OCT_MAX = 255
+
+def quantize_positions(positions: np.ndarray, minimum: np.ndarray, extent: np.ndarray) -> Dict[str, Any]:
+    """将扁平的xyz坐标数组相对包围盒量化为16位整数"""
+    points = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+    scale = extent / _QUANTIZE_MAX
+    safe_extent = np.where(extent > 0, extent, 1.0)
+    quantized = np.rint((points - minimum) / safe_extent * _QUANTIZE_MAX)
+    return {
+        "codec": "quantized16",
+        "min": minimum.tolist(),
+        "scale": scale.tolist(),
+        "data": np.clip(quantized, 0, _QUANTIZE_MAX).astype(np.uint16).reshape(-1),
+    }
+
+def dequantize_positions(encoded: Dict[str, Any]) -> np.ndarray:
+    """还原 quantize_positions 的结果为扁平的float32坐标数组"""
+    quantized = np.asarray(encoded["data"], dtype=np.float64).reshape(-1, 3)
+    points = np.asarray(encoded["min"]) + quantized * np.asarray(encoded["scale"])
+    return points.astype(np.float32).reshape(-1)
+
+def oct_encode_normals(normals: np.ndarray) -> Dict[str, Any]:
+    """将扁平的法向量数组以八面体映射编码，每个法向量2字节"""
+    vectors = np.asarray(normals, dtype=np.float64).reshape(-1, 3)
+    l1 = np.abs(vectors).sum(axis=1, keepdims=True)
+    l1[l1 == 0] = 1.0
+    vectors = vectors / l1
+    xy = vectors[:, :2]
+    # 下半球折叠到八面体展开图的四个角上
+    folded = (1.0 - np.abs(xy[:, ::-1])) * np.where(xy >= 0, 1.0, -1.0)
+    xy = np.where(vectors[:, 2:3] < 0, folded, xy)
+    encoded = np.rint((xy * 0.5 + 0.5) * _OCT_MAX)
+    return {"codec": "oct8", "data": np.clip(encoded, 0, _OCT_MAX).astype(np.uint8).reshape(-1)}
+
+def oct_decode_normals(encoded: Dict[str, Any]) -> np.ndarray:
+    """还原 oct_encode_normals 的结果为扁平的单位法向量float32数组"""
+    xy = np.asarray(encoded["data"], dtype=np.float64).reshape(-1, 2) / _OCT_MAX * 2.0 - 1.0
+    z = 1.0 - np.abs(xy).sum(axis=1)
+    t = np.clip(-z, 0.0, None)[:, None]
+    xy = xy - np.where(xy >= 0, t, -t)
+    vectors = np.column_stack([xy, z])
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32).reshape(-1)
+
+def encode_varint(values: np.ndarray) -> np.ndarray:
+    """将无符号整数数组以 LEB128 变长整数编码（每字节7位，最高位为继续标记）"""
+    values = np.asarray(values, dtype=np.uint64)
+    byte_counts = np.ones(len(values), dtype=np.int64)
+    for shift in (7, 14, 21, 28, 35, 42, 49, 56, 63):
+        byte_counts += values >= (np.uint64(1) << np.uint64(shift))
+
+    offsets = np.concatenate(([0], np.cumsum(byte_counts)[:-1]))
+    output = np.zeros(int(byte_counts.sum()), dtype=np.uint8)
+    for position in range(int(byte_counts.max(initial=0))):
+        mask = byte_counts > position
+        chunk = (values[mask] >> np.uint64(7 * position)) & np.uint64(0x7F)
+        more = (byte_counts[mask] > position + 1).astype(np.uint64) << np.uint64(7)
+        output[offsets[mask] + position] = (chunk | more).astype(np.uint8)
+    return output
+
+def decode_varint(data: np.ndarray) -> np.ndarray:
+    """还原 encode_varint 的结果为uint64数组"""
+    data = np.asarray(data, dtype=np.uint8)
+    if len(data) == 0:
+        return np.zeros(0, dtype=np.uint64)
+    ends = np.flatnonzero((data & 0x80) == 0)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    value_index = np.repeat(np.arange(len(ends)), ends - starts + 1)
+    position = np.arange(len(data)) - starts[value_index]
+    parts = (data & 0x7F).astype(np.uint64) << (np.uint64(7) * position.astype(np.uint64))
+    return np.bitwise_or.reduceat(parts, starts)
+
+def encode_indices(indices: np.ndarray) -> Dict[str, Any]:
+    """三角形索引的差值编码：相邻索引差值经 zigzag 映射为无符号数后以变长整数编码"""
+    indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+    deltas = np.diff(indices, prepend=0)
+    zigzag = ((deltas << 1) ^ (deltas >> 63)).astype(np.uint64)
+    return {"codec": "delta_varint", "count": len(indices), "data": encode_varint(zigzag)}
+
+def decode_indices(encoded: Dict[str, Any]) -> np.ndarray:
+    """还原 encode_indices 的结果为int32索引数组"""
+    zigzag = decode_varint(encoded["data"]).astype(np.int64)
+    deltas = (zigzag >> 1) ^ -(zigzag & 1)
+    return np.cumsum(deltas).astype(np.int32)
+
+def _bounding_box(mesh: Dict[str, Any]):
+    """实例所有位置属性的包围盒 (最小点, 尺寸)"""
+    points = [
+        np.asarray(mesh[name], dtype=np.float64).reshape(-1, 3)
+        for name in _POSITION_ATTRIBUTES
+        if name in mesh and len(mesh[name])
+    ]
+    if not points:
+        return np.zeros(3), np.zeros(3)
+    stacked = np.concatenate(points)
+    minimum = stacked.min(axis=0)
+    return minimum, stacked.max(axis=0) - minimum
+
+def encode_mesh_instance(mesh: Dict[str, Any], encoding: str = DEFAULT_MESH_ENCODING,
+                         attributes: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """
+    按编码方式和属性列表转换单个网格实例
+
+    Args:
+        mesh: tessellate_group 生成的网格实例
+        encoding: "raw"（保持原样）或 "compact"（量化与变长整数编码）
+        attributes: 保留的属性数组（None 表示全部保留），不在 MESH_ATTRIBUTES 中的字段总是保留
+
+    Returns:
+        新的网格实例字典
+    """
+    keep = set(MESH_ATTRIBUTES if attributes is None else attributes)
+    selected = {key: value for key, value in mesh.items() if key in keep or key not in MESH_ATTRIBUTES}
+    if encoding != "compact":
+        return selected
+
+    minimum, extent = _bounding_box(mesh)
+    encoded = dict(selected, encoding="compact")
+    for name in _POSITION_ATTRIBUTES:
+        if name in selected:
+            encoded[name] = quantize_positions(selected[name], minimum, extent)
+    if "normals" in selected:
+        encoded["normals"] = oct_encode_normals(selected["normals"])
+    if "triangles" in selected:
+        encoded["triangles"] = encode_indices(selected["triangles"])
+    return encoded
+
+def decode_mesh_instance(mesh: Dict[str, Any]) -> Dict[str, Any]:
+    """还原紧凑编码的网格实例（未编码的实例原样返回）"""
+    if mesh.get("encoding") != "compact":
+        return mesh
+    decoded = {key: value for key, value in mesh.items() if key != "encoding"}
+    for name in _POSITION_ATTRIBUTES:
+        if name in decoded:
+            decoded[name] = dequantize_positions(decoded[name])
+    if "normals" in decoded:
+        decoded["normals"] = oct_decode_normals(decoded["normals"])
+    if "triangles" in decoded:
+        decoded["triangles"] = decode_indices(decoded["triangles"])
+    return decoded
+
+def _is_mesh(data: Any) -> bool:
+    return isinstance(data, dict) and "vertices" in data and "triangles" in data
+
+def _encode_shapes(data: Any, encode) -> Any:
+    """递归地编码 resolved 负载模式下内嵌在 shapes 中的网格"""
+    if isinstance(data, dict):
+        result = {key: _encode_shapes(value, encode) for key, value in data.items() if key != "shape"}
+        if "shape" in data:
+            result["shape"] = encode(data["shape"]) if _is_mesh(data["shape"]) else data["shape"]
+        return result
+    if isinstance(data, list):
+        return [_encode_shapes(item, encode) for item in data]
+    return data
+
+def encode_result_meshes(result: Dict[str, Any], encoding: str = DEFAULT_MESH_ENCODING,
+                         attributes: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    按编码方式转换3D结果中的全部网格（result["shapes"] 为 [shapes, meshed_instances]）
+
+    不修改传入的结果，返回新的结果字典
+
+    Args:
+        result: 服务层返回的结果字典
+        encoding: 见 MESH_ENCODINGS
+        attributes: 保留的属性数组（None 表示全部保留）
+    """
+    shapes_payload = result.get("shapes")
+    if (encoding == "raw" and attributes is None) or not isinstance(shapes_payload, list) or len(shapes_payload) != 2:
+        return result
+
+    encoded_meshes: Dict[Any, Dict[str, Any]] = {}
+
+    def encode(mesh: Dict[str, Any]) -> Dict[str, Any]:
+        # resolved 模式下多个部件引用同一网格时内嵌的是同一组数组
+        key = (id(mesh.get("vertices")), tuple(sorted(mesh)))
+        if key not in encoded_meshes:
+            encoded_meshes[key] = encode_mesh_instance(mesh, encoding, attributes)
+        return encoded_meshes[key]
+
+    shapes, meshed_instances = shapes_payload
+    encoded_instances = [encode(mesh) if _is_mesh(mesh) else mesh for mesh in meshed_instances]
+    encoded_shapes = _encode_shapes(shapes, encode)
+
+    encoded_result = dict(result)
+    encoded_result["shapes"] = [encoded_shapes, encoded_instances]
+    encoded_result["mesh_encoding"] = encoding
+    return encoded_result
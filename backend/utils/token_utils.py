@@ -0,0 +1,32 @@
+"""
+token估算工具
+不依赖模型分词器，按字符类别估算文本的token数，用于控制提示词长度
+"""
+
+import re
+
+# CJK字符（含全角标点）大约每个字符一个token，其余文本大约每4个字符一个token
+_CJK_PATTERN = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]")
+
+# 每条消息的格式开销（角色标记等）
+MESSAGE_OVERHEAD_TOKENS = 4
+
+def estimate_tokens(text: str) -> int:
+    """
+    估算文本的token数
+
+    Args:
+        text: 文本内容
+
+    Returns:
+        估算的token数
+    """
+    if not text:
+        return 0
+    cjk_count = len(_CJK_PATTERN.findall(text))
+    other_count = len(text) - cjk_count
+    return cjk_count + (other_count + 3) // 4
+
+def estimate_message_tokens(content: str) -> int:
+    """估算一条对话消息（含格式开销）的token数"""
+    return estimate_tokens(content) + MESSAGE_OVERHEAD_TOKENS
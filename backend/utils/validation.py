@@ -6,6 +6,10 @@
 import re
 from typing import Any, Dict, List, Optional, Union
 
+from app.config import AIConfig, TessellationConfig
+from .id_utils import is_ulid, is_legacy_id
+from .mesh_encoding import MESH_ATTRIBUTES, MESH_ENCODINGS
+
 def validate_object_id(object_id: str) -> bool:
     """
     验证对象ID格式是否正确
@@ -19,9 +23,8 @@ def validate_object_id(object_id: str) -> bool:
     if not object_id or not isinstance(object_id, str):
         return False
     
-    # 检查是否符合ISO 8601时间戳格式（去除冒号）
-    pattern = r'^\d{4}-\d{2}-\d{2}T\d{2}-\d{2}-\d{2}\.\d{6}$'
-    return bool(re.match(pattern, object_id))
+    # ULID格式，或旧的ISO 8601时间戳格式（去除冒号）
+    return is_ulid(object_id) or is_legacy_id(object_id)
 
 def validate_conversation_id(conversation_id: str) -> bool:
     """
@@ -48,6 +51,19 @@ def validate_render_mode(render_mode: str) -> bool:
     valid_modes = {'2d', '3d'}
     return render_mode in valid_modes
 
+def validate_mesh_payload(mesh_payload: str) -> bool:
+    """
+    验证3D网格负载模式是否有效
+    
+    Args:
+        mesh_payload: 负载模式字符串
+    
+    Returns:
+        验证是否通过
+    """
+    valid_modes = {'resolved', 'ref'}
+    return mesh_payload in valid_modes
+
 def validate_user_query(query: str) -> Dict[str, Any]:
     """
     验证用户查询内容
@@ -95,6 +111,42 @@ def validate_user_query(query: str) -> Dict[str, Any]:
     
     return result
 
+def validate_mesh_encoding(mesh_encoding: str) -> bool:
+    """
+    验证网格编码方式是否有效
+    
+    Args:
+        mesh_encoding: 编码方式字符串
+    
+    Returns:
+        验证是否通过
+    """
+    return mesh_encoding in MESH_ENCODINGS
+
+def validate_mesh_attributes(attributes: List[str]) -> bool:
+    """
+    验证要保留的网格属性列表是否有效（非空且都是已知属性）
+    
+    Args:
+        attributes: 属性名称列表
+    
+    Returns:
+        验证是否通过
+    """
+    return bool(attributes) and all(attribute in MESH_ATTRIBUTES for attribute in attributes)
+
+def validate_quality(quality: str) -> bool:
+    """
+    验证细分质量等级是否有效
+    
+    Args:
+        quality: 质量等级字符串
+    
+    Returns:
+        验证是否通过
+    """
+    return quality in TessellationConfig.QUALITY_LEVELS
+
 def validate_api_request_data(data: Dict[str, Any]) -> Dict[str, Any]:
     """
     验证API请求数据
@@ -125,6 +177,33 @@ def validate_api_request_data(data: Dict[str, Any]) -> Dict[str, Any]:
             result["valid"] = False
             result["errors"].append("无效的渲染模式，必须是 '2d' 或 '3d'")
     
+    if "mesh_payload" in data:
+        if not validate_mesh_payload(data["mesh_payload"]):
+            result["valid"] = False
+            result["errors"].append("无效的网格负载模式，必须是 'resolved' 或 'ref'")
+    
+    if "reuse_similar" in data and data["reuse_similar"] is not None:
+        if not isinstance(data["reuse_similar"], bool):
+            result["valid"] = False
+            result["errors"].append("reuse_similar 必须是布尔值")
+    
+    if "candidates" in data and data["candidates"] is not None:
+        candidates = data["candidates"]
+        max_candidates = AIConfig.MAX_SPECULATIVE_CANDIDATES
+        if not isinstance(candidates, int) or isinstance(candidates, bool) or not 1 <= candidates <= max_candidates:
+            result["valid"] = False
+            result["errors"].append(f"candidates 必须是 1 到 {max_candidates} 之间的整数")
+    
+    if "quality" in data and data["quality"] is not None:
+        if not validate_quality(data["quality"]):
+            result["valid"] = False
+            result["errors"].append(f"无效的细分质量，必须是 {', '.join(TessellationConfig.QUALITY_LEVELS)} 之一")
+    
+    if "progressive" in data and data["progressive"] is not None:
+        if not isinstance(data["progressive"], bool):
+            result["valid"] = False
+            result["errors"].append("progressive 必须是布尔值")
+    
     if "conversation_id" in data and data["conversation_id"]:
         if not validate_conversation_id(data["conversation_id"]):
             result["valid"] = False
@@ -1,36 +1,135 @@
 import axios from "axios"
-import {downloadAxiosResponse} from "../utils"
+import {downloadAxiosResponse, decodeResultResponse} from "../utils"
 
 const BASE_URL = "http://127.0.0.1:5001"
+// 网格以紧凑编码传输（量化坐标、八面体法向量、变长整数索引），由 decodeMeshInstance 还原
+const MESH_ENCODING = "compact"
+
+// 错误响应同样以ArrayBuffer返回，解码成对象以便读取 error 字段
+function decodeErrorResponse(error: any) {
+  if (error.response && error.response.data instanceof ArrayBuffer) {
+    try {
+      error.response.data = decodeResultResponse(error.response)
+    } catch (decodeError) {
+      console.error("Failed to decode error response:", decodeError)
+    }
+  }
+  return error
+}
 
 export function getCadShapes(query: string, conversationId: string | null = null, renderMode: string = "3d") {
   let config = {
     method: 'post',
     maxBodyLength: Infinity,
     url: `${BASE_URL}/cad`,
+    responseType: 'arraybuffer' as const,
     headers: {
       'Content-Type': 'application/json',
     },
+    params: {
+      transport: 'binary',
+      mesh_encoding: MESH_ENCODING,
+    },
     data: {
       query,
       conversation_id: conversationId,
       render_mode: renderMode,
+      mesh_payload: 'ref',
     },
   }
 
   return axios.request(config)
     .then(async (response) => {
-      if (response.data.error) {
-        throw new Error(response.data.error);
+      const data = decodeResultResponse(response)
+      if (data.error) {
+        throw new Error(data.error);
       }
-      return response.data;
+      return data;
     })
     .catch((error) => {
       console.error("API Error:", error);
-      throw error; // 将错误传递给调用者
+      throw decodeErrorResponse(error); // 将错误传递给调用者
     });
 }
 
+// 通过 /cad/stream 流式获取生成进度，onEvent 接收除最终结果外的所有事件
+export async function streamCadShapes(
+  query: string,
+  conversationId: string | null = null,
+  renderMode: string = "3d",
+  onEvent: (event: string, data: any) => void = () => {},
+) {
+  const response = await fetch(`${BASE_URL}/cad/stream?transport=binary&mesh_encoding=${MESH_ENCODING}`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+    },
+    body: JSON.stringify({
+      query,
+      conversation_id: conversationId,
+      render_mode: renderMode,
+      mesh_payload: 'ref',
+    }),
+  })
+
+  if (!response.ok || !response.body) {
+    const data = await response.json().catch(() => ({}))
+    const error: any = new Error(data.error || `HTTP ${response.status}`)
+    error.response = { data }
+    throw error
+  }
+
+  const reader = response.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ""
+  let result: any = null
+
+  while (true) {
+    const { done, value } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true })
+
+    let separator
+    while ((separator = buffer.indexOf("\n\n")) >= 0) {
+      const frame = buffer.slice(0, separator)
+      buffer = buffer.slice(separator + 2)
+
+      let event = "message"
+      let data = ""
+      frame.split("\n").forEach((line) => {
+        if (line.startsWith("event: ")) event = line.slice(7)
+        else if (line.startsWith("data: ")) data += line.slice(6)
+      })
+      if (!data) continue // keepalive 注释帧
+
+      const payload = JSON.parse(data)
+      if (event === "result") {
+        result = payload
+      } else {
+        onEvent(event, payload)
+      }
+    }
+  }
+
+  if (!result) {
+    throw new Error("生成连接意外中断")
+  }
+  if (!result.success) {
+    const error: any = new Error(result.error || "生成失败")
+    error.response = { data: result }
+    throw error
+  }
+
+  // 二进制传输时最终结果只给出网格地址，单独获取网格产物
+  if (result.mesh_url) {
+    const meshResponse = await axios.get(`${BASE_URL}${result.mesh_url}`, { responseType: 'arraybuffer' })
+    const mesh = decodeResultResponse(meshResponse)
+    result.shapes = mesh.shapes
+    result.mesh_payload = mesh.mesh_payload
+  }
+  return result
+}
+
 export function getCadInfo(objectId: string) {
   return axios.get(`${BASE_URL}/cad/${objectId}/info`)
     .then(response => response.data)
@@ -64,8 +163,8 @@ export function getCadDownload(id: string, file_type: "stl"|"step"|"amf"|"svg"|"
     })
 }
 
-export function getConversations() {
-  return axios.get(`${BASE_URL}/conversations`)
+export function getConversations(cursor?: string | null) {
+  return axios.get(`${BASE_URL}/conversations`, { params: cursor ? { cursor } : undefined })
     .then(response => response.data)
     .catch(error => {
       console.error("Error getting conversations:", error)
@@ -73,6 +172,15 @@ export function getConversations() {
     })
 }
 
+export function searchConversations(query: string, offset = 0) {
+  return axios.get(`${BASE_URL}/conversations/search`, { params: { q: query, offset } })
+    .then(response => response.data)
+    .catch(error => {
+      console.error("Error searching conversations:", error)
+      throw error
+    })
+}
+
 export function getConversationDetail(conversationId: string) {
   return axios.get(`${BASE_URL}/conversation/${conversationId}`)
     .then(response => response.data)
@@ -92,10 +200,14 @@ export function getConversationResults(conversationId: string) {
 }
 
 export function getMessageResult(conversationId: string, messageIndex: number) {
-  return axios.get(`${BASE_URL}/conversation/${conversationId}/message/${messageIndex}`)
-    .then(response => response.data)
+  return axios.get(`${BASE_URL}/conversation/${conversationId}/message/${messageIndex}`, {
+    responseType: 'arraybuffer',
+    params: { transport: 'binary', mesh_payload: 'ref', mesh_encoding: MESH_ENCODING },
+  })
+    // 直接返回的网格产物不含 conversation_id，这里补上
+    .then(response => ({ conversation_id: conversationId, ...decodeResultResponse(response) }))
     .catch(error => {
       console.error("Error getting message result:", error);
-      throw error;
+      throw decodeErrorResponse(error);
     })
 }
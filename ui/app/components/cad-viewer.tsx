@@ -3,6 +3,7 @@
 import { useEffect, useRef } from 'react'
 import "../../dist/three-cad-viewer/three-cad-viewer.css"
 import { Viewer } from "../../dist/three-cad-viewer/three-cad-viewer.esm.js"
+import { decodeMeshInstance, resolveShapeReferences } from "../utils"
 
 function nc(change: any) {}
 
@@ -61,13 +62,19 @@ export default function CadViewer({ cadShapes }: CadViewerProps) {
                 const viewer = new Viewer(container, viewerOptions, nc)
                 
                 // cadShapes 是一个包含 [shapes, meshed_instances] 的数组
-                const [shapes, meshed_instances] = cadShapes
+                const [rawShapes, encodedInstances] = cadShapes
                 
                 // 检查数据是否有效
-                if (!shapes || !meshed_instances) {
-                    console.error("Invalid shapes or meshed_instances data:", { shapes, meshed_instances })
+                if (!rawShapes || !encodedInstances) {
+                    console.error("Invalid shapes or meshed_instances data:", { shapes: rawShapes, meshed_instances: encodedInstances })
                     return
                 }
+
+                // 紧凑编码的网格先还原为原始数组
+                const meshed_instances = encodedInstances.map(decodeMeshInstance)
+
+                // ref 负载模式下网格只在 meshed_instances 中出现一次，这里按引用解析
+                const shapes = resolveShapeReferences(rawShapes, meshed_instances)
                 
                 console.log("Rendering with shapes:", shapes)
                 console.log("Rendering with meshed_instances:", meshed_instances)
@@ -1,10 +1,10 @@
 "use client"
 
 import { useState, useEffect } from 'react'
-import { Menu, Dropdown, Space, Button, Spin } from 'antd'
+import { Menu, Dropdown, Space, Button, Spin, Input } from 'antd'
 import type { MenuProps } from 'antd'
 import { DownOutlined, MessageOutlined, HistoryOutlined } from '@ant-design/icons'
-import { getConversations, getConversationDetail, getMessageResult } from '../api/cad'
+import { getConversations, searchConversations, getConversationDetail, getMessageResult } from '../api/cad'
 
 interface ConversationSummary {
   id: string
@@ -40,6 +40,10 @@ interface ConversationHistoryProps {
 export default function ConversationHistory({ onSelectResult, currentConversationId }: ConversationHistoryProps) {
   const [conversations, setConversations] = useState<ConversationSummary[]>([])
   const [loading, setLoading] = useState(false)
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
+  const [searchInput, setSearchInput] = useState('')
+  const [searchQuery, setSearchQuery] = useState('')
+  const [nextOffset, setNextOffset] = useState<number | null>(null)
   const [selectedConversation, setSelectedConversation] = useState<string | null>(null)
   const [conversationDetails, setConversationDetails] = useState<{ [key: string]: ConversationDetail }>({})
 
@@ -51,8 +55,54 @@ export default function ConversationHistory({ onSelectResult, currentConversatio
   const loadConversations = async () => {
     try {
       setLoading(true)
+      setSearchInput('')
+      setSearchQuery('')
+      setNextOffset(null)
       const response = await getConversations()
       setConversations(response.conversations || [])
+      setNextCursor(response.next_cursor || null)
+    } catch (error) {
+      console.error('Failed to load conversations:', error)
+    } finally {
+      setLoading(false)
+    }
+  }
+
+  // 搜索对话（用户需求与生成的代码），清空搜索内容时恢复最近对话列表
+  const runSearch = async (value: string) => {
+    const query = value.trim()
+    if (!query) {
+      loadConversations()
+      return
+    }
+
+    try {
+      setLoading(true)
+      setSearchQuery(query)
+      setNextCursor(null)
+      const response = await searchConversations(query)
+      setConversations(response.conversations || [])
+      setNextOffset(response.next_offset ?? null)
+    } catch (error) {
+      console.error('Failed to search conversations:', error)
+    } finally {
+      setLoading(false)
+    }
+  }
+
+  // 加载下一页对话（搜索结果或最近对话）
+  const loadMoreConversations = async () => {
+    try {
+      setLoading(true)
+      if (searchQuery && nextOffset !== null) {
+        const response = await searchConversations(searchQuery, nextOffset)
+        setConversations(prev => [...prev, ...(response.conversations || [])])
+        setNextOffset(response.next_offset ?? null)
+      } else if (nextCursor) {
+        const response = await getConversations(nextCursor)
+        setConversations(prev => [...prev, ...(response.conversations || [])])
+        setNextCursor(response.next_cursor || null)
+      }
     } catch (error) {
       console.error('Failed to load conversations:', error)
     } finally {
@@ -153,6 +203,15 @@ export default function ConversationHistory({ onSelectResult, currentConversatio
             刷新
           </Button>
         </div>
+        <Input.Search
+          size="small"
+          placeholder="搜索历史对话"
+          allowClear
+          value={searchInput}
+          onChange={(e) => setSearchInput(e.target.value)}
+          onSearch={runSearch}
+          style={{ marginTop: '12px' }}
+        />
       </div>
 
       {/* 对话列表 */}
@@ -163,7 +222,7 @@ export default function ConversationHistory({ onSelectResult, currentConversatio
           </div>
         ) : conversations.length === 0 ? (
           <div style={{ textAlign: 'center', padding: '20px', color: '#999' }}>
-            暂无历史对话
+            {searchQuery ? '没有匹配的对话' : '暂无历史对话'}
           </div>
         ) : (
           conversations.map(conv => (
@@ -231,6 +290,16 @@ export default function ConversationHistory({ onSelectResult, currentConversatio
             </div>
           ))
         )}
+
+        {(searchQuery ? nextOffset !== null : nextCursor) && (
+          <Button
+            block
+            onClick={loadMoreConversations}
+            loading={loading}
+          >
+            加载更多
+          </Button>
+        )}
       </div>
     </div>
   )
@@ -4,7 +4,7 @@
 import { Alert, Layout, Select, Space, theme, Radio } from 'antd'
 import Search from 'antd/es/input/Search'
 import { useState } from 'react'
-import { getCadDownload as downloadCadFile, getCadShapes as getCadObject } from './api/cad'
+import { getCadDownload as downloadCadFile, streamCadShapes } from './api/cad'
 import CadViewer from './components/cad-viewer'
 import ConversationHistory from './components/conversation-history'
 import WelcomeScreen from './components/welcome-screen'
@@ -24,6 +24,7 @@ export default function Home() {
   const [conversationId, setConversationId] = useState<string | null>(null)
   const [isLoading, setIsLoading] = useState(false)
   const [cadData, setCadData] = useState<any>(null)
+  const [progressLines, setProgressLines] = useState<string[]>([])
 
   // --- 状态重构 ---
   // activeMode: 当前UI和请求所使用的渲染模式。
@@ -32,6 +33,24 @@ export default function Home() {
   const [isModeLocked, setIsModeLocked] = useState<boolean>(false);
   // --- 状态重构结束 ---
 
+  // 将流式生成事件转换为进度提示
+  const onProgressEvent = (event: string, data: any) => {
+    let line = ""
+    if (event === "plan") line = data.line
+    else if (event === "cache_hit") line = "⚡ 命中缓存，复用已生成的代码"
+    else if (event === "patch_applied") line = `✏️ 已在当前代码上应用${data.edits}处修改`
+    else if (event === "patch_failed") line = "✏️ 修改无法应用，重新生成完整代码..."
+    else if (event === "reused") line = `♻️ 复用相似需求的结果：${data.query}`
+    else if (event === "executing") line = "⚙️ 正在执行代码..."
+    else if (event === "tessellating") line = "🔺 正在生成网格..."
+    else if (event === "rendering") line = "🖼️ 正在渲染电路图..."
+    else if (event === "retry") line = `🔁 第${data.attempt}次尝试：${data.error || ""}`
+    else if (event === "analyzing_errors") line = "🔍 正在分析错误原因..."
+    if (line) {
+      setProgressLines((lines) => [...lines, line])
+    }
+  }
+
   const onSearch = async (value: string) => {
     if (!value.trim()) return
     
@@ -39,9 +58,10 @@ export default function Home() {
       setIsLoading(true)
       setIsError(false)
       setErrorMessage("")
+      setProgressLines([])
       
       // 请求总是使用 activeMode
-      const cadObject = await getCadObject(value, conversationId, activeMode)
+      const cadObject = await streamCadShapes(value, conversationId, activeMode, onProgressEvent)
       
       // 请求成功后，更新所有状态
       setCadData(cadObject)
@@ -309,6 +329,12 @@ export default function Home() {
               ) : null
             }
 
+            {isLoading && progressLines.length > 0 && (
+              <div style={{ color: '#666', fontSize: '12px', marginBottom: '8px', whiteSpace: 'pre-line' }}>
+                {progressLines.slice(-6).join("\n")}
+              </div>
+            )}
+
             <Search 
               placeholder={conversationId ? "继续对话..." : `输入CAD设计需求... (当前: ${activeMode === '3d' ? '3D模型' : '2D图形'})`} 
               size="large" 
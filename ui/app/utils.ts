@@ -17,3 +17,158 @@ export function downloadAxiosResponse(fileName: string, response: AxiosResponse)
     document.body.removeChild(downloadLink)
 }
 
+
+export const MESH_MIMETYPE = "application/vnd.cqask.mesh"
+
+const MESH_MAGIC = "CQMB"
+const MESH_PREFIX_SIZE = 16
+
+const TYPED_ARRAYS: { [dtype: string]: any } = {
+    float32: Float32Array,
+    int32: Int32Array,
+    uint32: Uint32Array,
+    uint16: Uint16Array,
+    uint8: Uint8Array,
+}
+
+// 解码后端的二进制网格格式：JSON头 + 小端序缓冲区
+// 缓冲区直接包装为类型化数组视图，不做任何拷贝
+export function decodeMeshPayload(buffer: ArrayBuffer): any {
+    const view = new DataView(buffer)
+    const magic = String.fromCharCode(...Array.from(new Uint8Array(buffer, 0, 4)))
+    if (magic !== MESH_MAGIC) {
+        throw new Error("Invalid mesh payload")
+    }
+    const headerLength = view.getUint32(8, true)
+    const headerText = new TextDecoder().decode(new Uint8Array(buffer, MESH_PREFIX_SIZE, headerLength))
+    const header = JSON.parse(headerText)
+    const dataStart = MESH_PREFIX_SIZE + headerLength
+
+    const buffers = header.buffers.map((spec: any) => {
+        const ArrayType = TYPED_ARRAYS[spec.dtype]
+        return new ArrayType(buffer, dataStart + spec.offset, spec.length / ArrayType.BYTES_PER_ELEMENT)
+    })
+
+    const resolve = (node: any): any => {
+        if (Array.isArray(node)) {
+            return node.map(resolve)
+        }
+        if (node && typeof node === "object") {
+            if (typeof node.__buffer__ === "number") {
+                return buffers[node.__buffer__]
+            }
+            const result: { [key: string]: any } = {}
+            Object.keys(node).forEach((key) => {
+                result[key] = resolve(node[key])
+            })
+            return result
+        }
+        return node
+    }
+
+    return resolve(header.data)
+}
+
+// 根据响应的Content-Type解码二进制网格或JSON响应体
+export function decodeResultResponse(response: AxiosResponse): any {
+    const contentType = response.headers?.["content-type"] || ""
+    if (contentType.includes(MESH_MIMETYPE)) {
+        return decodeMeshPayload(response.data)
+    }
+    return JSON.parse(new TextDecoder().decode(response.data))
+}
+
+// 还原后端紧凑编码（mesh_encoding=compact）的网格实例，与 utils/mesh_encoding.py 对应
+function dequantizePositions(encoded: any): Float32Array {
+    const data = encoded.data
+    const result = new Float32Array(data.length)
+    for (let i = 0; i < data.length; i++) {
+        const axis = i % 3
+        result[i] = encoded.min[axis] + data[i] * encoded.scale[axis]
+    }
+    return result
+}
+
+function octDecodeNormals(encoded: any): Float32Array {
+    const data = encoded.data
+    const result = new Float32Array(data.length / 2 * 3)
+    for (let i = 0, j = 0; i < data.length; i += 2, j += 3) {
+        let x = data[i] / 255 * 2 - 1
+        let y = data[i + 1] / 255 * 2 - 1
+        const z = 1 - Math.abs(x) - Math.abs(y)
+        const t = Math.max(-z, 0)
+        x += x >= 0 ? -t : t
+        y += y >= 0 ? -t : t
+        const length = Math.hypot(x, y, z) || 1
+        result[j] = x / length
+        result[j + 1] = y / length
+        result[j + 2] = z / length
+    }
+    return result
+}
+
+function decodeIndices(encoded: any): Int32Array {
+    const data = encoded.data
+    const result = new Int32Array(encoded.count)
+    let previous = 0
+    let offset = 0
+    for (let i = 0; i < encoded.count; i++) {
+        // LEB128 变长整数，delta 经过 zigzag 映射（索引差值不超过 32 位）
+        let value = 0
+        let shift = 0
+        let byte: number
+        do {
+            byte = data[offset++]
+            value += (byte & 0x7f) * Math.pow(2, shift)
+            shift += 7
+        } while (byte & 0x80)
+        const delta = value % 2 === 0 ? value / 2 : -(value + 1) / 2
+        previous += delta
+        result[i] = previous
+    }
+    return result
+}
+
+export function decodeMeshInstance(mesh: any): any {
+    if (!mesh || mesh.encoding !== "compact") {
+        return mesh
+    }
+    const result = { ...mesh }
+    delete result.encoding
+    for (const name of ["vertices", "edges", "obj_vertices"]) {
+        if (result[name]) result[name] = dequantizePositions(result[name])
+    }
+    if (result.normals) result.normals = octDecodeNormals(result.normals)
+    if (result.triangles) result.triangles = decodeIndices(result.triangles)
+    return result
+}
+
+// 将 shapes 中的 {ref: i} 替换为 meshed_instances[i] 的几何数据
+// 与后端 resolve_shape_references 对应；多个部件引用同一网格时共享同一组数组
+export function resolveShapeReferences(shapes: any, meshedInstances: any[]): any {
+    if (Array.isArray(shapes)) {
+        return shapes.map((item) => resolveShapeReferences(item, meshedInstances))
+    }
+    if (!shapes || typeof shapes !== "object") {
+        return shapes
+    }
+
+    const result = { ...shapes }
+    if (Array.isArray(result.parts)) {
+        result.parts = result.parts.map((part: any) => resolveShapeReferences(part, meshedInstances))
+    }
+    if (result.shape && typeof result.shape.ref === "number") {
+        const mesh = meshedInstances[result.shape.ref]
+        if (mesh) {
+            result.shape = {
+                vertices: mesh.vertices,
+                triangles: mesh.triangles,
+                normals: mesh.normals,
+                edges: mesh.edges,
+                face_types: mesh.face_types,
+                edge_types: mesh.edge_types,
+            }
+        }
+    }
+    return result
+}